@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Parallel, dependency-aware runner for the API test suites.
+
+Runs the checks of HealthMateAPITester and LabBookingAPITester as a
+dependency graph: a check starts as soon as every check it depends on has
+passed, and checks whose dependencies failed are reported as skipped.
+Stateless checks (page loads, public APIs) each get a tester of their own
+and run in parallel. The other checks of a suite share one tester, so
+logged-in sessions and created records carry over to the checks that
+follow; since a requests.Session is not thread-safe and those checks read
+what earlier ones stored, they run one at a time, in an order that
+respects their dependencies. Results are written as JUnit XML and/or JSON
+with per-check timing.
+
+Usage:
+    python api_test_runner.py [--base-url URL] [--lab-base-url URL] [--suites healthmate lab] [--junit out.xml] [--json out.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from xml.etree import ElementTree
+
+from backend_test import HealthMateAPITester
+from lab_booking_backend_test import LabBookingAPITester
+
+# suite -> [(check name, tester method, dependencies)]
+SUITES = {
+    "healthmate": [
+        ("home_page", "test_home_page", []),
+        ("auth_pages", "test_auth_pages", ["home_page"]),
+        ("dashboard_access", "test_dashboard_access", ["home_page"]),
+        ("api_routes_exist", "test_api_routes_exist", ["home_page"]),
+        ("patient_registration", "test_patient_registration", ["home_page"]),
+        ("pharmacy_registration", "test_pharmacy_registration", ["home_page"]),
+        ("nextauth_signin", "test_nextauth_signin", ["patient_registration"]),
+    ],
+    "lab": [
+        ("app_connectivity", "test_app_connectivity", []),
+        ("patient_login", "test_patient_login", ["app_connectivity"]),
+        ("laboratory_login", "test_laboratory_login", ["app_connectivity"]),
+        ("get_laboratories", "test_get_laboratories_api", ["app_connectivity"]),
+        ("get_lab_tests", "test_get_lab_tests_api", ["app_connectivity"]),
+        ("get_lab_bookings", "test_get_lab_bookings", ["patient_login", "laboratory_login"]),
+        ("create_lab_booking", "test_create_lab_booking", ["patient_login", "get_laboratories"]),
+        ("update_booking_status", "test_update_booking_status", ["create_lab_booking", "laboratory_login"]),
+        ("api_error_handling", "test_api_error_handling", ["app_connectivity"]),
+    ],
+}
+
+# Checks that neither read nor store tester state; each runs on a fresh tester
+STATELESS = {
+    "healthmate": {"home_page", "auth_pages", "dashboard_access", "api_routes_exist"},
+    "lab": {"get_laboratories", "get_lab_tests", "api_error_handling"},
+}
+
+
+def capture_log(tester, local):
+    """Route tester.log_test into the result of whichever check is running on this thread"""
+    lock = threading.Lock()
+
+    def log_test(name, success, details=""):
+        with lock:
+            tester.tests_run += 1
+            if success:
+                tester.tests_passed += 1
+        local.entries.append({"name": name, "passed": bool(success), "details": details})
+
+    tester.log_test = log_test
+
+
+def run_check(tester, method, local):
+    local.entries = []
+    started = time.perf_counter()
+    try:
+        passed = bool(getattr(tester, method)())
+        error = None
+    except Exception as e:
+        passed, error = False, f"{type(e).__name__}: {e}"
+    return {
+        "status": "passed" if passed else "failed",
+        "seconds": round(time.perf_counter() - started, 3),
+        "error": error,
+        "assertions": local.entries,
+    }
+
+
+def run_suites(factories, workers):
+    """
+    Run all checks of the given {suite: tester factory}; returns results in
+    declaration order.
+    """
+    local = threading.local()
+
+    def new_tester(factory):
+        tester = factory()
+        capture_log(tester, local)
+        return tester
+
+    checks = {}
+    for suite, factory in factories.items():
+        shared = new_tester(factory)
+        names = {name for name, _, _ in SUITES[suite]}
+        for name, method, depends in SUITES[suite]:
+            unknown = [dep for dep in depends if dep not in names]
+            if unknown:
+                raise ValueError(f"{suite}.{name} depends on unknown checks: {', '.join(unknown)}")
+            tester = new_tester(factory) if name in STATELESS[suite] else shared
+            checks[(suite, name)] = {"tester": tester, "method": method, "depends": [(suite, dep) for dep in depends]}
+
+    results = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while len(results) < len(checks):
+            resolved = len(results)
+            for key, check in checks.items():
+                if key in results or key in running.values():
+                    continue
+                states = [results.get(dep, {}).get("status") for dep in check["depends"]]
+                if any(state in ("failed", "skipped") for state in states):
+                    failed = [dep[1] for dep, state in zip(check["depends"], states) if state in ("failed", "skipped")]
+                    results[key] = {"status": "skipped", "seconds": 0.0, "error": f"dependency failed: {', '.join(failed)}", "assertions": []}
+                elif all(state == "passed" for state in states):
+                    # Checks sharing a tester share its session and state
+                    if any(checks[other]["tester"] is check["tester"] for other in running.values()):
+                        continue
+                    future = pool.submit(run_check, check["tester"], check["method"], local)
+                    running[future] = key
+            if not running:
+                if len(results) == resolved:
+                    waiting = [name for (suite, name) in checks if (suite, name) not in results]
+                    raise ValueError(f"dependency cycle among: {', '.join(waiting)}")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+    return [dict(suite=suite, check=name, **results[(suite, name)]) for suite, name in checks]
+
+
+def write_junit(path, results, elapsed):
+    root = ElementTree.Element("testsuites", time=f"{elapsed:.3f}")
+    for suite in dict.fromkeys(result["suite"] for result in results):
+        cases = [result for result in results if result["suite"] == suite]
+        element = ElementTree.SubElement(
+            root, "testsuite", name=suite, tests=str(len(cases)),
+            failures=str(sum(case["status"] == "failed" for case in cases)),
+            skipped=str(sum(case["status"] == "skipped" for case in cases)),
+            time=f"{sum(case['seconds'] for case in cases):.3f}",
+        )
+        for case in cases:
+            testcase = ElementTree.SubElement(element, "testcase", classname=suite, name=case["check"], time=f"{case['seconds']:.3f}")
+            messages = [f"{a['name']}: {a['details']}" for a in case["assertions"] if not a["passed"]]
+            if case["error"]:
+                messages.insert(0, case["error"])
+            if case["status"] == "failed":
+                ElementTree.SubElement(testcase, "failure", message=messages[0] if messages else "check failed").text = "\n".join(messages)
+            elif case["status"] == "skipped":
+                ElementTree.SubElement(testcase, "skipped", message=case["error"])
+    ElementTree.ElementTree(root).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the HealthMate API test suites in parallel")
+    parser.add_argument("--base-url", default=os.getenv("HEALTHMATE_BASE_URL", "http://localhost:3001"))
+    parser.add_argument("--lab-base-url", default=os.getenv("HEALTHMATE_LAB_BASE_URL"), help="Defaults to --base-url")
+    parser.add_argument("--suites", nargs="+", choices=sorted(SUITES), default=list(SUITES))
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--junit", help="Write JUnit XML results to this path")
+    parser.add_argument("--json", help="Write JSON results to this path")
+    args = parser.parse_args()
+
+    factories = {}
+    if "healthmate" in args.suites:
+        factories["healthmate"] = lambda: HealthMateAPITester(args.base_url, verbose=False)
+    if "lab" in args.suites:
+        factories["lab"] = lambda: LabBookingAPITester(args.lab_base_url or args.base_url)
+
+    print(f"🚀 Running {', '.join(factories)} checks against {args.base_url}")
+    started = time.perf_counter()
+    results = run_suites(factories, args.workers)
+    elapsed = time.perf_counter() - started
+
+    icons = {"passed": "✅", "failed": "❌", "skipped": "⏭️ "}
+    for result in results:
+        line = f"{icons[result['status']]} {result['suite']}.{result['check']} ({result['seconds']:.2f}s)"
+        failures = [a for a in result["assertions"] if not a["passed"]]
+        if result["error"]:
+            line += f" - {result['error']}"
+        elif failures:
+            line += f" - {failures[0]['name']}: {failures[0]['details']}"
+        print(line)
+
+    counts = {status: sum(r["status"] == status for r in results) for status in icons}
+    print("=" * 60)
+    print(f"📊 {counts['passed']} passed, {counts['failed']} failed, {counts['skipped']} skipped in {elapsed:.2f}s")
+
+    if args.junit:
+        write_junit(args.junit, results, elapsed)
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump({"elapsedSeconds": round(elapsed, 3), "summary": counts, "checks": results}, out, indent=2)
+
+    return 0 if counts["failed"] == 0 and counts["skipped"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,62 +3,12 @@ import { getServerSession } from 'next-auth'
 import { authOptions } from '@/lib/auth'
 import { prisma } from '@/lib/db'
 import { join } from 'path'
-import { spawn } from 'child_process'
-
-// Real OCR implementation using Emergent LLM
-async function extractMedicinesFromPrescription(filePath: string, mimeType: string) {
-  return new Promise((resolve) => {
-    try {
-      const pythonPath = 'python3' // Use system python since we installed globally
-      const scriptPath = '/app/ocr_processor.py'
-      
-      const pythonProcess = spawn(pythonPath, [scriptPath, filePath, mimeType])
-      
-      let outputData = ''
-      let errorData = ''
-      
-      pythonProcess.stdout.on('data', (data) => {
-        outputData += data.toString()
-      })
-      
-      pythonProcess.stderr.on('data', (data) => {
-        errorData += data.toString()
-      })
-      
-      pythonProcess.on('close', (code) => {
-        if (code === 0) {
-          try {
-            const result = JSON.parse(outputData)
-            resolve(result)
-          } catch (parseError) {
-            resolve({
-              success: false,
-              error: `Failed to parse OCR result: ${parseError.message}`
-            })
-          }
-        } else {
-          resolve({
-            success: false,
-            error: `OCR process failed with code ${code}: ${errorData}`
-          })
-        }
-      })
-      
-      pythonProcess.on('error', (error) => {
-        resolve({
-          success: false,
-          error: `Failed to start OCR process: ${error.message}`
-        })
-      })
-      
-    } catch (error) {
-      resolve({
-        success: false,
-        error: `OCR processing error: ${error.message}`
-      })
-    }
-  })
-}
+import { runOcrJob } from '@/lib/ocr-worker'
+import { emitPrescriptionOcrEvent } from '@/lib/socket'
+
+// Longer than the worker's per-job timeout, so the queue never reclaims a
+// prescription this route is still processing
+const INLINE_LEASE_MS = 15 * 60 * 1000
 
 export async function POST(request: NextRequest) {
   try {
@@ -114,21 +64,46 @@ export async function POST(request: NextRequest) {
       )
     }
 
-    // Update status to processing
+    // With the durable queue (ocr_queue.py) the worker pool claims UPLOADED
+    // prescriptions itself; the request only confirms the job is queued
+    if (process.env.OCR_QUEUE_MODE === '1') {
+      return NextResponse.json(
+        {
+          message: 'Prescription queued for processing',
+          prescription: { id: prescription.id, status: prescription.status }
+        },
+        { status: 202 }
+      )
+    }
+
+    // Update status to processing; the lease tells ocr_queue.py when this
+    // inline run counts as abandoned
     await prisma.prescription.update({
       where: { id: prescriptionId },
-      data: { status: 'PROCESSING' }
+      data: {
+        status: 'PROCESSING',
+        ocrLeaseOwner: 'inline',
+        ocrLeaseExpiresAt: new Date(Date.now() + INLINE_LEASE_MS)
+      }
     })
 
     // Process the prescription with OCR
     const filePath = join(process.cwd(), prescription.filePath)
-    const ocrResult = await extractMedicinesFromPrescription(filePath, prescription.mimeType)
+    // Stream partial results (progress, medicines as parsed) to the patient,
+    // once Socket.IO is attached (see emitPrescriptionOcrEvent); the worker
+    // also matches the medicines against pharmacy stock
+    const ocrResult = await runOcrJob(
+      filePath,
+      prescription.mimeType,
+      (event) => emitPrescriptionOcrEvent(patient.id, prescriptionId, event),
+      { matchPharmacies: true }
+    )
 
     if (!ocrResult.success) {
       // Update status to rejected
       await prisma.prescription.update({
         where: { id: prescriptionId },
-        data: { status: 'REJECTED' }
+        data: { status: 'REJECTED', ocrLeaseOwner: null, ocrLeaseExpiresAt: null }
       })
 
       return NextResponse.json(
@@ -137,37 +112,17 @@ export async function POST(request: NextRequest) {
       )
     }
 
-    // Find matching pharmacies for the extracted medicines
-    let matchingPharmacies = []
-    if (ocrResult.medicines && ocrResult.medicines.length > 0) {
-      // Call our medicine search API internally (no location needed)
-      const medicineNames = ocrResult.medicines.map(med => med.name || med.medicine_name).filter(Boolean)
-      
-      if (medicineNames.length > 0) {
-        // Search for matching medicines across pharmacies
-        const searchResponse = await fetch(`${process.env.NEXTAUTH_URL}/api/search/medicines`, {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-            'Cookie': request.headers.get('Cookie') || ''
-          },
-          body: JSON.stringify({
-            medicineNames
-          })
-        })
-        
-        if (searchResponse.ok) {
-          const searchData = await searchResponse.json()
-          matchingPharmacies = searchData.results || []
-        }
-      }
-    }
+    // Approved pharmacies stocking the extracted medicines, grouped with
+    // coverage and total price by the OCR worker (pharmacy_match.py)
+    const matchingPharmacies = ocrResult.matchingPharmacies || []
 
     // Update prescription with OCR data and matching pharmacies
     const updatedPrescription = await prisma.prescription.update({
       where: { id: prescriptionId },
       data: {
         status: 'PROCESSED',
+        ocrLeaseOwner: null,
+        ocrLeaseExpiresAt: null,
         ocrData: JSON.stringify({
           medicines: ocrResult.medicines,
           extractedText: ocrResult.extractedText,
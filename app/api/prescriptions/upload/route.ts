@@ -2,7 +2,11 @@ import { NextRequest, NextResponse } from 'next/server'
 import { getServerSession } from 'next-auth'
 import { authOptions } from '@/lib/auth'
 import { prisma } from '@/lib/db'
-import { writeFile, mkdir } from 'fs/promises'
+import { mkdir } from 'fs/promises'
+import { createWriteStream } from 'fs'
+import { Readable } from 'stream'
+import { pipeline } from 'stream/promises'
+import type { ReadableStream as NodeReadableStream } from 'stream/web'
 import { join } from 'path'
 import { v4 as uuidv4 } from 'uuid'
 
@@ -70,10 +74,11 @@ export async function POST(request: NextRequest) {
     const filePath = join(uploadDir, uniqueFilename)
     const relativePath = `uploads/prescriptions/${uniqueFilename}`
 
-    // Save file to disk
-    const bytes = await file.arrayBuffer()
-    const buffer = Buffer.from(bytes)
-    await writeFile(filePath, buffer)
+    // Stream the file to disk instead of copying it into another buffer
+    await pipeline(
+      Readable.fromWeb(file.stream() as unknown as NodeReadableStream<Uint8Array>),
+      createWriteStream(filePath)
+    )
 
     // Save to database
     const prescription = await prisma.prescription.create({
@@ -2,6 +2,7 @@ import { NextRequest, NextResponse } from 'next/server'
 import { getServerSession } from 'next-auth'
 import { authOptions } from '@/lib/auth'
 import { prisma } from '@/lib/db'
+import { MEDICINE_SEARCH_LIMIT, searchMedicineIds } from '@/lib/medicine-search'
 
 // Removed distance calculation - pharmacies sorted by availability only
 
@@ -29,10 +30,19 @@ export async function GET(request: NextRequest) {
 
     let medicineWhere: any = { 
       isActive: true,
-      stock: { gt: 0 } // Only show medicines in stock
+      stock: { gt: 0 }, // Only show medicines in stock
+      pharmacy: { isApproved: true }
     }
 
-    if (query) {
+    // The FTS index turns the substring search into an id lookup; without
+    // it, fall back to scanning name and description
+    const indexedIds = query ? searchMedicineIds(query) : null
+
+    if (indexedIds) {
+      medicineWhere.id = {
+        in: indexedIds
+      }
+    } else if (query) {
       medicineWhere.OR = [
         {
           name: {
@@ -56,8 +66,10 @@ export async function GET(request: NextRequest) {
     // Find all medicines matching the criteria
     console.log('🔍 Medicine search where clause:', JSON.stringify(medicineWhere))
     
+    // Both the index and the fallback return at most MEDICINE_SEARCH_LIMIT medicines
     const foundMedicines = await prisma.medicine.findMany({
       where: medicineWhere,
+      take: MEDICINE_SEARCH_LIMIT,
       include: {
         pharmacy: {
           select: {
@@ -1,14 +1,18 @@
 #!/usr/bin/env python3
 
+import os
 import requests
 import sys
 import json
 from datetime import datetime
 
 class HealthMateAPITester:
-    def __init__(self, base_url="http://localhost:3001"):
+    def __init__(self, base_url="http://localhost:3001", session=None, verbose=True, user_tag=""):
         self.base_url = base_url
-        self.session = requests.Session()
+        self.session = session or requests.Session()
+        self.verbose = verbose
+        # Appended to test account emails so concurrent runs don't collide
+        self.user_tag = user_tag
         self.tests_run = 0
         self.tests_passed = 0
         self.patient_credentials = None
@@ -19,6 +23,10 @@ class HealthMateAPITester:
         self.tests_run += 1
         if success:
             self.tests_passed += 1
+        if not self.verbose:
+            return
+
+        if success:
             print(f"✅ {name} - PASSED")
         else:
             print(f"❌ {name} - FAILED: {details}")
@@ -67,7 +75,7 @@ class HealthMateAPITester:
         """Test patient registration"""
         patient_data = {
             "name": "Test Patient",
-            "email": "patient@test.com",
+            "email": f"patient{self.user_tag}@test.com",
             "password": "test123",
             "confirmPassword": "test123",
             "role": "PATIENT"
@@ -107,7 +115,7 @@ class HealthMateAPITester:
         """Test pharmacy registration"""
         pharmacy_data = {
             "name": "John Smith",
-            "email": "pharmacy@test.com",
+            "email": f"pharmacy{self.user_tag}@test.com",
             "password": "test123",
             "confirmPassword": "test123",
             "role": "PHARMACY",
@@ -253,7 +261,7 @@ class HealthMateAPITester:
         
         # Test basic connectivity
         if not self.test_home_page():
-            print("❌ Cannot connect to application. Is it running on localhost:3001?")
+            print(f"❌ Cannot connect to application. Is it running on {self.base_url}?")
             return False
         
         # Test page accessibility
@@ -284,7 +292,8 @@ class HealthMateAPITester:
 
 def main():
     """Main test runner"""
-    tester = HealthMateAPITester()
+    base_url = sys.argv[1] if len(sys.argv) > 1 else os.getenv("HEALTHMATE_BASE_URL", "http://localhost:3001")
+    tester = HealthMateAPITester(base_url)
     success = tester.run_all_tests()
     return 0 if success else 1
 
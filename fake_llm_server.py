@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Local fake LLM server for benchmarking the OCR LLM client.
+
+Serves an OpenAI-style POST /v1/chat/completions endpoint that answers with a
+canned prescription JSON after a configurable latency, with a slow tail and
+injected 429/500 errors. With --bench it also drives ResilientLlmClient
+against the server and reports latency percentiles.
+
+The server speaks HTTP/1.1 keep-alive and streams when asked to
+("stream": true). --handshake-latency is charged once per new connection,
+standing in for the TCP + TLS setup a pooled client avoids. Prompt tokens
+are counted from the request (~4 characters per token, 765 per image) and
+cost --prefill-per-1k seconds per thousand before the first token, except
+for a system prompt of at least --cache-min-tokens seen before under the
+same prompt_cache_key, which is reported as cached_tokens and is free.
+
+Usage:
+    python fake_llm_server.py [--port 8765] [--latency 0.2] [--tail-rate 0.05] ...
+    python fake_llm_server.py --bench [--requests 500] [--concurrency 50] [--hedge]
+"""
+import sys
+import json
+import hashlib
+import time
+import random
+import asyncio
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_client import ResilientLlmClient, LlmCallError
+
+CANNED_CONTENT = json.dumps({
+    "medicines": [
+        {"name": "Paracetamol", "dosage": "500mg", "frequency": "Twice daily", "duration": "5 days", "instructions": "Take after meals"},
+        {"name": "Amoxicillin", "dosage": "250mg", "frequency": "Three times daily", "duration": "7 days", "instructions": "Complete the course"}
+    ],
+    "extractedText": "Paracetamol 500mg twice daily for 5 days. Amoxicillin 250mg three times daily for 7 days."
+})
+
+
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 765
+FIRST_CHUNK_CHARS = 16
+
+
+def count_prompt_tokens(messages):
+    """Returns (total prompt tokens, system prompt tokens)"""
+    total = system = 0
+    for message in messages:
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        tokens = sum(len(part.get("text", "")) // CHARS_PER_TOKEN if part.get("type") == "text" else IMAGE_TOKENS for part in parts)
+        total += tokens
+        if message.get("role") == "system":
+            system += tokens
+    return total, system
+
+
+class FakeLlmHandler(BaseHTTPRequestHandler):
+    config = None
+    protocol_version = "HTTP/1.1"
+    prompt_cache = set()
+    prompt_cache_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        # Once per connection: what keep-alive saves
+        if self.config.handshake_latency:
+            time.sleep(self.config.handshake_latency)
+
+    def log_message(self, format, *args):
+        pass
+
+    def cached_tokens(self, request, system_tokens):
+        if system_tokens < self.config.cache_min_tokens:
+            return 0
+        system = "".join(m.get("content") or "" for m in request.get("messages", []) if m.get("role") == "system")
+        key = hashlib.sha256(f"{request.get('prompt_cache_key', '')}\0{system}".encode()).hexdigest()
+        with self.prompt_cache_lock:
+            if key in self.prompt_cache:
+                return system_tokens
+            self.prompt_cache.add(key)
+        return 0
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, first_token_delay, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(first_token_delay)
+        events = [CANNED_CONTENT[:FIRST_CHUNK_CHARS], CANNED_CONTENT[FIRST_CHUNK_CHARS:]]
+        for i, text in enumerate(events):
+            if i:
+                time.sleep(self.config.decode_latency)
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": text}}]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        self._write_chunk(f"data: {json.dumps({'id': 'chatcmpl-fake', 'choices': [], 'usage': usage})}\n\n".encode())
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        config = self.config
+        length = int(self.headers.get("Content-Length", "0"))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        roll = random.random()
+        if roll < config.throttle_rate:
+            self._send_json(429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit"}})
+            return
+        if roll < config.throttle_rate + config.error_rate:
+            self._send_json(500, {"error": {"message": "Internal server error"}})
+            return
+
+        latency = config.tail_latency if random.random() < config.tail_rate else random.uniform(config.latency * 0.5, config.latency * 1.5)
+        prompt_tokens, system_tokens = count_prompt_tokens(request.get("messages", []))
+        cached = self.cached_tokens(request, system_tokens)
+        completion_tokens = len(CANNED_CONTENT) // CHARS_PER_TOKEN
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+        first_token_delay = latency + (prompt_tokens - cached) / 1000 * config.prefill_per_1k
+        if request.get("stream"):
+            self._stream(first_token_delay, usage)
+            return
+
+        time.sleep(first_token_delay + config.decode_latency)
+        self._send_json(200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "model": "fake-gpt-4o",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": CANNED_CONTENT}, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+
+def start_server(config, port=0):
+    """Start the fake server in a background thread and return it"""
+    handler = type("ConfiguredFakeLlmHandler", (FakeLlmHandler,), {"config": config, "prompt_cache": set()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class HttpStatusError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(f"HTTP {status_code}: {message}")
+        self.status_code = status_code
+
+
+def post_completion(url, timeout):
+    """Blocking OpenAI-style chat completion request"""
+    body = json.dumps({"model": "gpt-4o", "messages": [{"role": "user", "content": "prescription"}]}).encode()
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())["choices"][0]["message"]["content"]
+    except urllib.error.HTTPError as e:
+        raise HttpStatusError(e.code, e.reason) from e
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_bench(url, requests, concurrency, hedge, attempt_timeout):
+    client = ResilientLlmClient(
+        attempt_timeout=attempt_timeout,
+        deadline=attempt_timeout * 4,
+        base_delay=0.05,
+        max_delay=1.0,
+        rate_per_second=1000,
+        burst=concurrency,
+        max_concurrency=concurrency,
+        hedge=hedge,
+    )
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with gate:
+            started = time.monotonic()
+            try:
+                await client.call(lambda: asyncio.to_thread(post_completion, url, attempt_timeout))
+                latencies.append(time.monotonic() - started)
+            except LlmCallError:
+                failures += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.monotonic() - started
+
+    ordered = sorted(latencies)
+    return {
+        "hedge": hedge,
+        "requests": requests,
+        "succeeded": len(latencies),
+        "failed": failures,
+        "throughputPerSecond": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50Ms": round(percentile(ordered, 50) * 1000, 1) if ordered else None,
+        "p95Ms": round(percentile(ordered, 95) * 1000, 1) if ordered else None,
+        "p99Ms": round(percentile(ordered, 99) * 1000, 1) if ordered else None,
+        "client": client.stats,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Fake LLM server for OCR client benchmarks")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean response latency in seconds")
+    parser.add_argument("--tail-rate", type=float, default=0.05, help="Fraction of responses that are slow")
+    parser.add_argument("--tail-latency", type=float, default=2.0, help="Latency of slow responses in seconds")
+    parser.add_argument("--throttle-rate", type=float, default=0.02, help="Fraction of 429 responses")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Fraction of 500 responses")
+    parser.add_argument("--handshake-latency", type=float, default=0.0, help="Seconds charged per new connection")
+    parser.add_argument("--prefill-per-1k", type=float, default=0.0, help="Seconds per 1000 uncached prompt tokens before the first token")
+    parser.add_argument("--decode-latency", type=float, default=0.0, help="Seconds from the first token to the end of the response")
+    parser.add_argument("--cache-min-tokens", type=int, default=1024, help="Smallest system prompt the fake prompt cache keeps")
+    parser.add_argument("--bench", action="store_true", help="Run a client benchmark against an in-process server")
+    parser.add_argument("--url", help="Benchmark an already running server instead")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--hedge", action="store_true", help="Only run the hedged configuration")
+    parser.add_argument("--attempt-timeout", type=float, default=5.0)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    if not args.bench:
+        server = start_server(args, args.port)
+        print(f"Fake LLM server listening on http://127.0.0.1:{server.server_address[1]}/v1/chat/completions")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    server = None
+    url = args.url
+    if not url:
+        server = start_server(args, 0)
+        url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+    modes = [True] if args.hedge else [False, True]
+    for hedge in modes:
+        result = asyncio.run(run_bench(url, args.requests, args.concurrency, hedge, args.attempt_timeout))
+        print(json.dumps(result))
+
+    if server:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Image pre-processing for prescription OCR.
+
+Shrinks phone photos before they are sent to the model: applies and strips
+EXIF orientation/metadata, converts to grayscale, crops to the paper region,
+deskews, downscales to a target resolution and re-encodes as compact
+JPEG/WebP. All pixel analysis uses vectorized NumPy operations.
+
+Requires Pillow and NumPy; when they are missing preprocess_image() returns
+the original file untouched.
+
+Usage:
+    python image_preprocess.py <image_path> [preset]
+"""
+import os
+import sys
+import json
+import tempfile
+
+try:
+    import numpy as np
+    from PIL import Image, ImageOps
+except ImportError:
+    np = None
+    Image = None
+
+PRESETS = {
+    # Smallest payload, still legible for clearly printed prescriptions
+    "fast": {"max_side": 1280, "quality": 60, "format": "WEBP", "deskew": False},
+    "balanced": {"max_side": 1600, "quality": 75, "format": "JPEG", "deskew": True},
+    # Handwritten or low-contrast prescriptions
+    "quality": {"max_side": 2200, "quality": 85, "format": "JPEG", "deskew": True},
+}
+
+PREPROCESSABLE_MIME_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/webp"}
+
+FORMAT_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.5
+ANALYSIS_SIDE = 800
+
+
+def is_available():
+    return Image is not None
+
+
+def otsu_threshold(pixels):
+    """Otsu's threshold over a uint8 grayscale array"""
+    hist = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = total - weight_bg
+    sum_bg = np.cumsum(hist * levels)
+    mean_bg = np.divide(sum_bg, weight_bg, out=np.zeros(256), where=weight_bg > 0)
+    mean_fg = np.divide(sum_bg[-1] - sum_bg, weight_fg, out=np.zeros(256), where=weight_fg > 0)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+
+def document_bbox(pixels, threshold):
+    """
+    Bounding box (left, top, right, bottom) of the bright paper region, or
+    None when the paper fills (or cannot be told apart from) the frame.
+    """
+    bright = pixels > threshold
+    rows = np.flatnonzero(bright.mean(axis=1) > 0.5)
+    cols = np.flatnonzero(bright.mean(axis=0) > 0.5)
+    if rows.size == 0 or cols.size == 0:
+        return None
+
+    height, width = pixels.shape
+    top, bottom = rows[0], rows[-1] + 1
+    left, right = cols[0], cols[-1] + 1
+    area = (bottom - top) * (right - left)
+    if area < 0.2 * height * width or area > 0.95 * height * width:
+        return None
+
+    # Keep a small margin so text near the paper edge is not clipped
+    margin_y, margin_x = int(0.01 * height), int(0.01 * width)
+    return (
+        int(max(0, left - margin_x)),
+        int(max(0, top - margin_y)),
+        int(min(width, right + margin_x)),
+        int(min(height, bottom + margin_y)),
+    )
+
+
+def estimate_skew(image):
+    """
+    Estimate the skew angle in degrees with a projection profile: text lines
+    are horizontal when the variance of dark-pixel row sums peaks.
+    """
+    small = image.copy()
+    small.thumbnail((ANALYSIS_SIDE, ANALYSIS_SIDE))
+    pixels = np.asarray(small)
+    ink = (pixels < otsu_threshold(pixels)).astype(np.uint8) * 255
+    ink_image = Image.fromarray(ink)
+
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_STEP / 2, DESKEW_STEP):
+        rotated = np.asarray(ink_image.rotate(float(angle), resample=Image.NEAREST))
+        score = float(np.var(rotated.sum(axis=1, dtype=np.int64)))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def preprocess_image(file_path, mime_type, preset="balanced"):
+    """
+    Pre-process an image for OCR.
+
+    Returns (path, mime_type, info). path is a new temporary file the caller
+    must delete when info["temporary"] is True; otherwise it is the original
+    file, e.g. for PDFs, unknown presets, missing dependencies, or when
+    re-encoding would not make the payload smaller.
+    """
+    original_bytes = os.path.getsize(file_path)
+    info = {"preset": preset, "originalBytes": original_bytes, "processedBytes": original_bytes, "temporary": False}
+
+    settings = PRESETS.get(preset)
+    if settings is None or mime_type not in PREPROCESSABLE_MIME_TYPES:
+        return file_path, mime_type, info
+    if not is_available():
+        info["skipped"] = "Pillow/NumPy not installed"
+        return file_path, mime_type, info
+
+    with Image.open(file_path) as source:
+        # Apply EXIF orientation; metadata is dropped when re-encoding below
+        image = ImageOps.exif_transpose(source).convert("L")
+    info["originalSize"] = list(image.size)
+
+    pixels = np.asarray(image)
+    bbox = document_bbox(pixels, otsu_threshold(pixels))
+    if bbox:
+        image = image.crop(bbox)
+        info["cropped"] = list(bbox)
+
+    if settings["deskew"]:
+        angle = estimate_skew(image)
+        if angle:
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+            info["deskewAngle"] = angle
+
+    image.thumbnail((settings["max_side"], settings["max_side"]), Image.LANCZOS)
+    info["processedSize"] = list(image.size)
+
+    suffix = "." + settings["format"].lower()
+    fd, out_path = tempfile.mkstemp(prefix="ocr_", suffix=suffix)
+    with os.fdopen(fd, "wb") as out:
+        image.save(out, format=settings["format"], quality=settings["quality"], optimize=True)
+
+    processed_bytes = os.path.getsize(out_path)
+    if processed_bytes >= original_bytes:
+        os.remove(out_path)
+        info["skipped"] = "Re-encoded image was not smaller"
+        return file_path, mime_type, info
+
+    info["processedBytes"] = processed_bytes
+    info["temporary"] = True
+    return out_path, FORMAT_MIME_TYPES[settings["format"]], info
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print(json.dumps({"success": False, "error": "Usage: python image_preprocess.py <image_path> [preset]"}))
+        return 1
+
+    file_path = sys.argv[1]
+    preset = sys.argv[2] if len(sys.argv) == 3 else "balanced"
+    mime_type = "image/png" if file_path.lower().endswith(".png") else "image/jpeg"
+    out_path, out_mime, info = preprocess_image(file_path, mime_type, preset)
+    print(json.dumps({"success": True, "path": out_path, "mimeType": out_mime, **info}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
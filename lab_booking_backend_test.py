@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import os
 import requests
 import sys
 import json
@@ -423,7 +424,7 @@ class LabBookingAPITester:
         
         # Test basic connectivity
         if not self.test_app_connectivity():
-            print("❌ Cannot connect to application. Is it running on localhost:3000?")
+            print(f"❌ Cannot connect to application. Is it running on {self.base_url}?")
             return False
         
         # Test authentication (optional - may not work without proper session handling)
@@ -461,7 +462,8 @@ class LabBookingAPITester:
 
 def main():
     """Main test runner"""
-    tester = LabBookingAPITester()
+    base_url = sys.argv[1] if len(sys.argv) > 1 else os.getenv("HEALTHMATE_LAB_BASE_URL", "http://localhost:3000")
+    tester = LabBookingAPITester(base_url)
     success = tester.run_all_tests()
     return 0 if success else 1
 
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Concurrent stress test for the lab-booking workflow.
+
+Many patient sessions book the same laboratory/test slot at once while
+laboratory sessions concurrently flip the status of those bookings. Each
+concurrency level reports request latency and throughput and checks for:
+
+- double bookings: more bookings for one slot than --slot-capacity
+- lost inserts: acknowledged bookings missing from the database
+- lost updates: a booking's final status coming from a write that another
+  acknowledged write strictly followed
+- SQLite lock errors: 5xx responses, plus "database is locked"/SQLITE_BUSY
+  lines appended to the server log during the run (--server-log)
+
+The contention ceiling is the highest level whose error rate stays under
+--max-error-rate.
+
+Usage:
+    python lab_booking_stress_test.py --levels 5,10,25,50 [--lab-workers 4] [--server-log dev.log]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from load_test import LatencyRecorder, RecordingSession
+import prisma_db
+
+LAB_STATUSES = ["BOOKED", "SAMPLE_COLLECTED", "IN_PROGRESS", "COMPLETED", "REPORT_READY"]
+LOCK_MARKERS = ("database is locked", "SQLITE_BUSY", "SocketTimeout", "Timed out during query execution")
+
+
+def login(session, base_url, email, password):
+    """Sign in through the NextAuth credentials callback, like LabBookingAPITester"""
+    csrf = session.get(f"{base_url}/api/auth/csrf").json().get("csrfToken", "")
+    response = session.post(
+        f"{base_url}/api/auth/callback/credentials",
+        data={"email": email, "password": password, "csrfToken": csrf, "redirect": "false", "json": "true"},
+        allow_redirects=False,
+    )
+    return response.status_code in [200, 302] and any("session-token" in cookie.name for cookie in session.cookies)
+
+
+def register_patient(base_url, tag):
+    email = f"stress-patient-{tag}@test.com"
+    requests.post(
+        f"{base_url}/api/auth/register",
+        json={"name": f"Stress Patient {tag}", "email": email, "password": "test123", "confirmPassword": "test123", "role": "PATIENT"},
+        timeout=30,
+    )
+    return email, "test123"
+
+
+class LogTail:
+    """Counts lock-error lines appended to a server log since creation"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = os.path.getsize(path) if path and os.path.exists(path) else 0
+
+    def lock_errors(self):
+        if not self.path or not os.path.exists(self.path):
+            return None
+        with open(self.path, errors="replace") as log:
+            log.seek(self.offset)
+            count = sum(1 for line in log if any(marker in line for marker in LOCK_MARKERS))
+            self.offset = log.tell()
+        return count
+
+
+def find_lost_updates(writes, final_statuses):
+    """
+    writes: {booking_id: [(start, end, status)]} of acknowledged updates.
+    A final status is valid only if it was written by an update that no
+    other acknowledged update strictly followed (started after it ended).
+    """
+    lost = []
+    for booking_id, booking_writes in writes.items():
+        final = final_statuses.get(booking_id)
+        if final is None:
+            continue
+        candidates = {
+            status for start, end, status in booking_writes
+            if not any(other_start > end for other_start, _, _ in booking_writes)
+        }
+        if final not in candidates:
+            lost.append({"bookingId": booking_id, "finalStatus": final, "expectedOneOf": sorted(candidates)})
+    return lost
+
+
+def final_statuses_from_db(db_path, booking_ids):
+    conn = prisma_db.connect(db_path, readonly=True)
+    try:
+        statuses = {}
+        ids = list(booking_ids)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            statuses.update(conn.execute(f"SELECT id, status FROM lab_bookings WHERE id IN ({placeholders})", chunk).fetchall())
+        return statuses
+    finally:
+        conn.close()
+
+
+def slot_count_from_db(db_path, laboratory_id, lab_test_id, scheduled):
+    conn = prisma_db.connect(db_path, readonly=True)
+    try:
+        scheduled_ms = int(scheduled.timestamp() * 1000)
+        return conn.execute(
+            'SELECT COUNT(*) FROM lab_bookings WHERE "laboratoryId" = ? AND "labTestId" = ? AND "scheduledDate" = ?',
+            (laboratory_id, lab_test_id, scheduled_ms),
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run_level(level, args, patients, lab_sessions, laboratory_id, lab_test_id, log_tail):
+    recorder = LatencyRecorder()
+    for session in patients + lab_sessions:
+        session.recorder = recorder
+
+    # Every level contends for its own, identical-for-all-patients slot
+    scheduled = (datetime.now(timezone.utc) + timedelta(days=7)).replace(minute=0, second=0, microsecond=0) + timedelta(hours=level)
+    booking_data = {"laboratoryId": laboratory_id, "labTestId": lab_test_id, "scheduledDate": scheduled.isoformat()}
+
+    created = []
+    created_lock = threading.Lock()
+    writes = {}
+    status_codes = {"book": {}, "update": {}}
+    barrier = threading.Barrier(level)
+    booking_done = threading.Event()
+
+    def count(kind, status):
+        with created_lock:
+            status_codes[kind][status] = status_codes[kind].get(status, 0) + 1
+
+    def patient_worker(index):
+        session = patients[index % len(patients)]
+        barrier.wait()
+        for _ in range(args.bookings_per_patient):
+            try:
+                response = session.post(f"{args.base_url}/api/lab-bookings", json=booking_data)
+            except requests.RequestException:
+                count("book", "error")
+                continue
+            count("book", response.status_code)
+            if response.status_code in [200, 201]:
+                booking_id = response.json().get("id")
+                if booking_id:
+                    with created_lock:
+                        created.append(booking_id)
+
+    def lab_worker(index):
+        session = lab_sessions[index % len(lab_sessions)]
+        rng = random.Random(args.seed * 1000 + level * 10 + index)
+        updates = 0
+        while updates < args.updates_per_worker:
+            with created_lock:
+                booking_id = rng.choice(created) if created else None
+            if booking_id is None:
+                if booking_done.is_set():
+                    return
+                time.sleep(0.01)
+                continue
+            status = rng.choice(LAB_STATUSES)
+            started = time.monotonic()
+            try:
+                response = session.put(f"{args.base_url}/api/lab-bookings/{booking_id}", json={"status": status})
+            except requests.RequestException:
+                count("update", "error")
+                updates += 1
+                continue
+            ended = time.monotonic()
+            count("update", response.status_code)
+            if response.status_code == 200:
+                with created_lock:
+                    writes.setdefault(booking_id, []).append((started, ended, status))
+            updates += 1
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=level + args.lab_workers) as pool:
+        lab_futures = [pool.submit(lab_worker, i) for i in range(args.lab_workers)]
+        patient_futures = [pool.submit(patient_worker, i) for i in range(level)]
+        for future in patient_futures:
+            future.result()
+        booking_done.set()
+        for future in lab_futures:
+            future.result()
+    elapsed = time.monotonic() - started
+
+    endpoints = recorder.report(elapsed)
+    requests_total = sum(stats["requests"] for stats in endpoints.values())
+    errors = sum(n for kind in status_codes.values() for status, n in kind.items() if status == "error" or status >= 500)
+
+    result = {
+        "level": level,
+        "elapsedSeconds": round(elapsed, 2),
+        "throughputPerSecond": round(requests_total / elapsed, 2) if elapsed else None,
+        "errorRate": round(errors / requests_total, 4) if requests_total else None,
+        "statusCodes": {kind: {str(k): v for k, v in codes.items()} for kind, codes in status_codes.items()},
+        "endpoints": {name: {k: stats[k] for k in ("requests", "p50Ms", "p95Ms", "p99Ms", "errorRate")} for name, stats in endpoints.items()},
+        "acknowledgedBookings": len(created),
+        "serverLockErrors": log_tail.lock_errors(),
+    }
+
+    db_path = args.db or prisma_db.database_path()
+    if os.path.exists(db_path):
+        slot_count = slot_count_from_db(db_path, laboratory_id, lab_test_id, scheduled)
+        result["slotBookings"] = slot_count
+        result["doubleBookings"] = max(0, slot_count - args.slot_capacity)
+        result["lostInserts"] = max(0, len(created) - slot_count)
+        lost_updates = find_lost_updates(writes, final_statuses_from_db(db_path, writes.keys()))
+        result["lostUpdates"] = len(lost_updates)
+        result["lostUpdateExamples"] = lost_updates[:3]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lab booking contention stress test")
+    parser.add_argument("--base-url", default="http://localhost:3000")
+    parser.add_argument("--levels", default="5,10,25,50", help="Comma-separated concurrent patient counts")
+    parser.add_argument("--patients", type=int, default=0, help="Distinct patient accounts to register (default: max level)")
+    parser.add_argument("--bookings-per-patient", type=int, default=1)
+    parser.add_argument("--lab-workers", type=int, default=4)
+    parser.add_argument("--updates-per-worker", type=int, default=25)
+    parser.add_argument("--lab-email", default="central@lab.com")
+    parser.add_argument("--lab-password", default="lab123")
+    parser.add_argument("--slot-capacity", type=int, default=1, help="Bookings one slot may hold")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--db", help="SQLite path for consistency checks (defaults to DATABASE_URL / prisma/dev.db)")
+    parser.add_argument("--server-log", help="Next.js server log to scan for SQLite lock errors")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    placeholder = LatencyRecorder()
+
+    print(f"🧪 Lab booking stress test against {args.base_url}, levels {levels}")
+
+    # One logged-in session per distinct patient, pooled for its level
+    patient_count = args.patients or max(levels)
+    patients = []
+    for _ in range(patient_count):
+        email, password = register_patient(args.base_url, uuid.uuid4().hex[:10])
+        session = RecordingSession(placeholder, pool_size=args.bookings_per_patient + 1, timeout=args.timeout)
+        if login(session, args.base_url, email, password):
+            patients.append(session)
+    if not patients:
+        print("❌ Could not sign in any patient session")
+        return 1
+
+    lab_sessions = []
+    for _ in range(args.lab_workers):
+        session = RecordingSession(placeholder, pool_size=2, timeout=args.timeout)
+        if login(session, args.base_url, args.lab_email, args.lab_password):
+            lab_sessions.append(session)
+    if not lab_sessions:
+        print("❌ Could not sign in the laboratory account")
+        return 1
+
+    # Book the signed-in laboratory's own tests so its status updates are authorised
+    own_lab = (lab_sessions[0].get(f"{args.base_url}/api/auth/session").json().get("user") or {}).get("laboratory") or {}
+    laboratories = patients[0].get(f"{args.base_url}/api/laboratories").json()
+    laboratory = next((lab for lab in laboratories if lab["id"] == own_lab.get("id") and lab.get("labTests")), None)
+    if not laboratory:
+        print(f"❌ No tests available for the laboratory of {args.lab_email}")
+        return 1
+    lab_test_id = laboratory["labTests"][0]["id"]
+
+    log_tail = LogTail(args.server_log)
+    results = []
+    for level in levels:
+        result = run_level(level, args, patients, lab_sessions, laboratory["id"], lab_test_id, log_tail)
+        results.append(result)
+        print(json.dumps(result))
+
+    healthy = [r["level"] for r in results if r["errorRate"] is not None and r["errorRate"] <= args.max_error_rate]
+    print(json.dumps({
+        "contentionCeiling": max(healthy) if healthy else None,
+        "doubleBookings": sum(r.get("doubleBookings", 0) for r in results),
+        "lostUpdates": sum(r.get("lostUpdates", 0) for r in results),
+        "lostInserts": sum(r.get("lostInserts", 0) for r in results),
+    }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import Database from 'better-sqlite3'
+import { existsSync } from 'fs'
+import path from 'path'
+
+// FTS5 sidecar index maintained by medicine_search.py --sync
+const indexPath = process.env.MEDICINE_SEARCH_DB || path.join(process.cwd(), 'prisma', 'search.db')
+
+// Medicines returned by a search, with or without the index
+export const MEDICINE_SEARCH_LIMIT = 500
+// Ids read from the index; extra headroom for rows the route filters out
+// (unapproved pharmacies, changes since the last sync)
+const MEDICINE_SEARCH_CANDIDATES = MEDICINE_SEARCH_LIMIT * 4
+const MIN_TRIGRAM_LENGTH = 3
+// An index not synced for this long is ignored, e.g. once --watch stopped
+const maxAgeMs = (Number(process.env.MEDICINE_SEARCH_MAX_AGE_SECONDS) || 300) * 1000
+
+const globalForSearch = globalThis as unknown as {
+  medicineSearchDb: Database.Database | undefined
+}
+
+function openIndex(): Database.Database | null {
+  if (globalForSearch.medicineSearchDb) return globalForSearch.medicineSearchDb
+  if (!existsSync(indexPath)) return null
+
+  const db = new Database(indexPath, { readonly: true, fileMustExist: true })
+  // An index that was never synced has no watermark yet
+  const built = db.prepare("SELECT 1 FROM search_state WHERE key = 'watermark'").get()
+  if (!built) {
+    db.close()
+    return null
+  }
+  globalForSearch.medicineSearchDb = db
+  return db
+}
+
+// Same rules as match_query() in medicine_search.py
+function matchQuery(query: string): { table: string; expression: string } | null {
+  const normalized = query.split(/\s+/).filter(Boolean).join(' ')
+  if (normalized.length >= MIN_TRIGRAM_LENGTH) {
+    return { table: 'medicine_trigram', expression: `"${normalized.replace(/"/g, '""')}"` }
+  }
+  const words = normalized.split(/[^\p{L}\p{N}]+/u).filter(Boolean)
+  if (words.length === 0) return null
+  return { table: 'medicine_prefix', expression: words.map(word => `"${word}"*`).join(' ') }
+}
+
+function isFresh(db: Database.Database): boolean {
+  const row = db.prepare("SELECT value FROM search_state WHERE key = 'syncedAt'").get() as { value: number } | undefined
+  return !!row && Date.now() - row.value <= maxAgeMs
+}
+
+// Ids of medicines whose name or description matches query, or null when
+// the index is unavailable or stale and callers should fall back to a LIKE
+// scan. The index may lag the database, so callers must still filter on
+// isActive, stock and pharmacy approval, and cap the result at
+// MEDICINE_SEARCH_LIMIT like the fallback.
+export function searchMedicineIds(query: string, limit = MEDICINE_SEARCH_CANDIDATES): string[] | null {
+  const match = matchQuery(query)
+  if (!match) return null
+
+  try {
+    const db = openIndex()
+    if (!db || !isFresh(db)) return null
+    const rows = db
+      .prepare(`SELECT r.id FROM ${match.table} JOIN search_rows r ON r.rowid = ${match.table}.rowid WHERE ${match.table} MATCH ? LIMIT ?`)
+      .all(match.expression, limit) as { id: string }[]
+    return rows.map(row => row.id)
+  } catch (error) {
+    console.error('Medicine search index unavailable, falling back to LIKE:', error)
+    return null
+  }
+}
@@ -0,0 +1,134 @@
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process'
+import { createInterface } from 'readline'
+import { randomUUID } from 'crypto'
+
+export interface OcrResult {
+  success: boolean
+  medicines?: any[]
+  extractedText?: string
+  error?: string
+  [key: string]: any
+}
+
+export interface OcrEvent {
+  event: 'progress' | 'page' | 'medicine' | 'text'
+  [key: string]: any
+}
+
+interface PendingJob {
+  resolve: (result: OcrResult) => void
+  onEvent?: (event: OcrEvent) => void
+}
+
+interface OcrWorker {
+  process: ChildProcessWithoutNullStreams
+  pending: Map<string, PendingJob>
+}
+
+const pythonPath = 'python3' // Use system python since we installed globally
+const scriptPath = process.env.OCR_PROCESSOR_PATH || '/app/ocr_processor.py'
+
+// A job that produces no result by then resolves as failed, so a stuck
+// worker never leaves a request hanging
+const jobTimeoutMs = Number(process.env.OCR_JOB_TIMEOUT_MS) || 10 * 60 * 1000
+
+const globalForOcr = globalThis as unknown as {
+  ocrWorker: OcrWorker | undefined
+}
+
+// Spawn a long-lived `ocr_processor.py --serve` process that handles many jobs
+function startWorker(): OcrWorker {
+  const child = spawn(pythonPath, [scriptPath, '--serve'])
+  const worker: OcrWorker = { process: child, pending: new Map() }
+
+  const lines = createInterface({ input: child.stdout })
+  lines.on('line', (line) => {
+    let message: any
+    try {
+      message = JSON.parse(line)
+    } catch {
+      console.error('OCR worker emitted invalid output:', line)
+      return
+    }
+
+    // Skip lifecycle events such as { event: 'ready' }
+    if (!message.id) return
+
+    const job = worker.pending.get(message.id)
+    if (!job) return
+
+    const { id, ...payload } = message
+    if (payload.event) {
+      // Incremental event of a streaming job; the final result has no event
+      job.onEvent?.(payload)
+      return
+    }
+
+    worker.pending.delete(message.id)
+    job.resolve(payload)
+  })
+
+  child.stderr.on('data', (data) => {
+    console.error('OCR worker:', data.toString())
+  })
+
+  const fail = (error: string) => {
+    if (globalForOcr.ocrWorker === worker) globalForOcr.ocrWorker = undefined
+    worker.pending.forEach((job) => job.resolve({ success: false, error }))
+    worker.pending.clear()
+  }
+
+  child.on('exit', (code) => fail(`OCR worker exited with code ${code}`))
+  child.on('error', (error) => fail(`Failed to start OCR worker: ${error.message}`))
+  // Writing to a worker that just died raises EPIPE here; unhandled it would
+  // crash the server. The next job spawns a fresh worker.
+  child.stdin.on('error', (error) => fail(`OCR worker input closed: ${error.message}`))
+
+  return worker
+}
+
+function getWorker(): OcrWorker {
+  if (!globalForOcr.ocrWorker) {
+    globalForOcr.ocrWorker = startWorker()
+  }
+  return globalForOcr.ocrWorker
+}
+
+export interface OcrJobOptions {
+  // Have the worker add matchingPharmacies, queried from the database directly
+  matchPharmacies?: boolean
+}
+
+/**
+ * Run OCR on a prescription file through the shared OCR worker process.
+ * When onEvent is given, incremental progress/medicine/text events are
+ * delivered to it before the promise resolves with the final result.
+ */
+export function runOcrJob(
+  filePath: string,
+  mimeType: string,
+  onEvent?: (event: OcrEvent) => void,
+  options: OcrJobOptions = {}
+): Promise<OcrResult> {
+  return new Promise((resolve) => {
+    try {
+      const worker = getWorker()
+      const id = randomUUID()
+      const timer = setTimeout(() => {
+        worker.pending.delete(id)
+        resolve({ success: false, error: `OCR job timed out after ${jobTimeoutMs}ms` })
+      }, jobTimeoutMs)
+      const settle = (result: OcrResult) => {
+        clearTimeout(timer)
+        resolve(result)
+      }
+      worker.pending.set(id, { resolve: settle, onEvent })
+      worker.process.stdin.write(JSON.stringify({ id, filePath, mimeType, stream: !!onEvent, matchPharmacies: !!options.matchPharmacies }) + '\n')
+    } catch (error: any) {
+      resolve({
+        success: false,
+        error: `OCR processing error: ${error.message}`
+      })
+    }
+  })
+}
@@ -97,6 +97,14 @@ export const initSocketIO = (server: HTTPServer) => {
         }
       })
 
+      // Load testing only (socket_fanout_bench.py): broadcast a delivery
+      // request without an order in the database
+      if (process.env.SOCKET_BENCH === '1') {
+        socket.on('bench-broadcast', (deliveryRequest: DeliveryRequest) => {
+          broadcastDeliveryRequest(deliveryRequest)
+        })
+      }
+
       socket.on('disconnect', () => {
         console.log('Client disconnected:', socket.id)
       })
@@ -120,6 +128,16 @@ export const updateDeliveryStatus = (deliveryId: string, status: string, additio
   }
 }
 
+// Function to push incremental prescription OCR results to the patient.
+// Like the delivery broadcasts it is a no-op until something calls
+// initSocketIO: `next dev` / `next start` never do, so the events only reach
+// patients once the app runs behind a custom server that attaches Socket.IO.
+export const emitPrescriptionOcrEvent = (patientId: string, prescriptionId: string, event: any) => {
+  if (io) {
+    io.to(`patient-${patientId}`).emit('prescription-ocr-event', { prescriptionId, ...event })
+  }
+}
+
 // Mock function to update delivery partner (replace with actual database call)
 async function updateDeliveryPartner(deliveryId: string, deliveryPartnerId: string) {
   // This would be replaced with actual Prisma call
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Resilient wrapper around LLM calls used by the OCR processor.
+
+Adds per-attempt and overall deadlines, exponential backoff with full jitter
+on retryable errors, a token-bucket rate limiter that halves its rate on 429
+responses and recovers on success, a concurrency cap, and optional request
+hedging once an attempt has been in flight past the observed p95 latency.
+Latencies and the hedge clock exclude time spent waiting for a rate-limit
+token or concurrency slot, and no hedge is sent while either is exhausted.
+"""
+import os
+import time
+import random
+import asyncio
+from collections import deque
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+RETRYABLE_MARKERS = ("rate limit", "ratelimit", "timeout", "timed out", "overloaded", "temporarily unavailable", "connection")
+
+
+class LlmCallError(Exception):
+    """Raised when an LLM call fails after all retries or exceeds its deadline"""
+
+
+def error_status(error):
+    """Best-effort extraction of an HTTP status code from a client exception"""
+    for attr in ("status_code", "status", "http_status"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_rate_limited(error):
+    status = error_status(error)
+    if status is not None:
+        return status == 429
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "ratelimit" in message
+
+
+def is_retryable(error):
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    message = str(error).lower()
+    return any(marker in message for marker in RETRYABLE_MARKERS) or any(str(code) in message for code in RETRYABLE_STATUS_CODES)
+
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket whose refill rate backs off multiplicatively on throttling
+    and recovers additively on success (AIMD).
+    """
+
+    def __init__(self, rate, capacity, min_rate=0.1):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def has_token(self):
+        self._refill()
+        return self.tokens >= 1
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_throttled(self):
+        self._refill()
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+
+    def on_success(self):
+        if self.rate < self.max_rate:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class LatencyTracker:
+    """Rolling window of successful attempt latencies"""
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, pct):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class ResilientLlmClient:
+    def __init__(
+        self,
+        attempt_timeout=60.0,
+        deadline=180.0,
+        max_retries=3,
+        base_delay=0.5,
+        max_delay=20.0,
+        rate_per_second=5.0,
+        burst=10,
+        max_concurrency=8,
+        hedge=False,
+        hedge_min_samples=20,
+    ):
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.bucket = AdaptiveTokenBucket(rate_per_second, burst)
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyTracker()
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "throttled": 0, "hedged": 0, "hedgeWins": 0, "failures": 0}
+
+    @classmethod
+    def from_env(cls):
+        """Create a client configured from OCR_LLM_* environment variables"""
+        return cls(
+            attempt_timeout=float(os.getenv("OCR_LLM_ATTEMPT_TIMEOUT_SECONDS", "60")),
+            deadline=float(os.getenv("OCR_LLM_DEADLINE_SECONDS", "180")),
+            max_retries=int(os.getenv("OCR_LLM_MAX_RETRIES", "3")),
+            rate_per_second=float(os.getenv("OCR_LLM_RATE_PER_SECOND", "5")),
+            burst=int(os.getenv("OCR_LLM_BURST", "10")),
+            max_concurrency=int(os.getenv("OCR_LLM_MAX_CONCURRENCY", "8")),
+            hedge=os.getenv("OCR_LLM_HEDGE", "").lower() in ("1", "true", "yes"),
+        )
+
+    def backoff_delay(self, attempt):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def _attempt(self, send, sending=None):
+        await self.bucket.acquire()
+        self.stats["attempts"] += 1
+        async with self.semaphore:
+            if sending is not None:
+                sending.set()
+            # Only the request itself is timed, not the wait for a token or slot
+            started = time.monotonic()
+            result = await asyncio.wait_for(send(), timeout=self.attempt_timeout)
+            self.latency.record(time.monotonic() - started)
+        self.bucket.on_success()
+        return result
+
+    async def _hedged_attempt(self, send):
+        hedge_after = self.latency.percentile(95) if len(self.latency.samples) >= self.hedge_min_samples else None
+        if not self.hedge or hedge_after is None:
+            return await self._attempt(send)
+
+        sending = asyncio.Event()
+        primary = asyncio.create_task(self._attempt(send, sending))
+        waiting = asyncio.create_task(sending.wait())
+        tasks = {primary}
+        try:
+            # The hedge clock starts once the primary holds its token and slot
+            await asyncio.wait({primary, waiting}, return_when=asyncio.FIRST_COMPLETED)
+            if not primary.done():
+                await asyncio.wait({primary}, timeout=hedge_after)
+            if primary.done():
+                return primary.result()
+            # Without a free token and slot a hedge would only queue behind
+            # other work and spend budget when it finally runs
+            if not self.bucket.has_token() or self.semaphore.locked():
+                return await primary
+
+            self.stats["hedged"] += 1
+            backup = asyncio.create_task(self._attempt(send))
+            tasks = {primary, backup}
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.stats["hedgeWins"] += 1
+                        return task.result()
+            # Both attempts failed; surface the primary error
+            return primary.result()
+        finally:
+            waiting.cancel()
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, send):
+        """
+        Run send() - a zero-argument coroutine function making one independent
+        request - with rate limiting, retries, hedging and an overall deadline.
+        """
+        self.stats["calls"] += 1
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + self.deadline
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            remaining = give_up_at - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                return await asyncio.wait_for(self._hedged_attempt(send), timeout=remaining)
+            except Exception as e:
+                last_error = e
+                if is_rate_limited(e):
+                    self.stats["throttled"] += 1
+                    self.bucket.on_throttled()
+                if not is_retryable(e) or attempt == self.max_retries:
+                    break
+                self.stats["retries"] += 1
+                await asyncio.sleep(min(self.backoff_delay(attempt), max(0, give_up_at - loop.time())))
+
+        self.stats["failures"] += 1
+        if isinstance(last_error, asyncio.TimeoutError) or last_error is None:
+            raise LlmCallError(f"LLM call timed out (attempt timeout {self.attempt_timeout}s, deadline {self.deadline}s)")
+        raise LlmCallError(f"LLM call failed: {str(last_error)}") from last_error
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Robust extraction of the OCR JSON object from LLM responses.
+
+The model is asked for bare JSON but regularly wraps it in markdown fences
+or prose, leaves trailing commas, or gets cut off mid-object. parse_ocr_response()
+finds the object anywhere in the response, repairs trailing commas and
+truncation (rolling back to the last complete value), and validates it
+against the expected {"medicines": [...], "extractedText": "..."} shape.
+IncrementalMedicineParser does the same scanning over streamed chunks and
+yields each medicine object as soon as it is complete; the OCR processor
+feeds it the deltas from llm_transport to emit medicines while the model is
+still writing.
+
+The common case (well-formed JSON somewhere in the text) is decoded in place
+with json.JSONDecoder.raw_decode, without copying the response.
+
+Usage:
+    python llm_json.py --fuzz [--cases 20000]
+    python llm_json.py --bench [--iterations 20000]
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+MEDICINE_FIELDS = ("name", "dosage", "frequency", "duration", "instructions")
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class JsonScanner:
+    """
+    Incremental scanner over a JSON object embedded in text.
+
+    Tracks string/escape state, the open container stack, object keys, the
+    last position where a complete value ended (a safe truncation point) and
+    trailing commas, so a broken object can be repaired with a single slice.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.start = -1           # index of the opening brace
+        self.done = False         # root object closed
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.stack = []           # [(bracket, expecting_key)]
+        self.last_key = None
+        self.safe_end = -1        # text[start:safe_end] + closers is valid JSON
+        self.safe_stack = ()
+        self.trailing_commas = []
+        self.pending_comma = -1
+        self.medicines_depth = -1
+        self.element_start = -1
+        self.completed_elements = []
+
+    def feed(self, chunk):
+        self.text += chunk
+        self._scan()
+
+    def _find_start(self):
+        # A JSON object opens with '{' followed by '"' or '}'
+        text = self.text
+        index = text.find("{", self.pos)
+        while index != -1:
+            probe = index + 1
+            while probe < len(text) and text[probe] in _WHITESPACE:
+                probe += 1
+            if probe >= len(text):
+                self.pos = index
+                return False
+            if text[probe] in "\"}":
+                self.start = index
+                self.pos = index
+                return True
+            index = text.find("{", index + 1)
+        self.pos = len(text)
+        return False
+
+    def _value_done(self, end):
+        self.safe_end = end
+        self.safe_stack = tuple(bracket for bracket, _ in self.stack)
+
+    def _scan(self):
+        if self.start < 0 and not self._find_start():
+            return
+
+        text = self.text
+        pos = self.pos
+        length = len(text)
+        while pos < length and not self.done:
+            char = text[pos]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                    pos += 1
+                    continue
+                # Jump straight to the next quote or backslash
+                match = _STRING_SPECIAL.search(text, pos)
+                if match is None:
+                    pos = length
+                    break
+                pos = match.start()
+                if text[pos] == "\\":
+                    self.escape = True
+                else:
+                    self.in_string = False
+                    bracket, expecting_key = self.stack[-1]
+                    if bracket == "{" and expecting_key:
+                        self.last_key = text[self.string_start:pos]
+                    else:
+                        self._value_done(pos + 1)
+                pos += 1
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = pos + 1
+                self.pending_comma = -1
+            elif char in "{[":
+                self.pending_comma = -1
+                if (char == "[" and self.last_key == "medicines" and len(self.stack) == 1
+                        and self.medicines_depth < 0):
+                    self.medicines_depth = len(self.stack) + 1
+                elif char == "{" and len(self.stack) == self.medicines_depth:
+                    self.element_start = pos
+                self.stack.append((char, char == "{"))
+            elif char in "}]":
+                if self.pending_comma >= 0:
+                    self.trailing_commas.append(self.pending_comma)
+                    self.pending_comma = -1
+                if not self.stack:
+                    pos += 1
+                    continue
+                self.stack.pop()
+                if char == "}" and len(self.stack) == self.medicines_depth and self.element_start >= 0:
+                    self.completed_elements.append((self.element_start, pos + 1, list(self.trailing_commas)))
+                    self.element_start = -1
+                elif char == "]" and len(self.stack) + 1 == self.medicines_depth:
+                    self.medicines_depth = -2
+                self._value_done(pos + 1)
+                if not self.stack:
+                    self.done = True
+            elif char == ":":
+                if self.stack and self.stack[-1][0] == "{":
+                    self.stack[-1] = ("{", False)
+            elif char == ",":
+                if self.stack and self.stack[-1][0] == "{":
+                    self.stack[-1] = ("{", True)
+                self.pending_comma = pos
+                # Literals and numbers end at the comma
+                if text[pos - 1] not in "\"}]":
+                    self._value_done(pos)
+            elif char not in _WHITESPACE:
+                # Numbers and literals; they count as complete at the next ','
+                self.pending_comma = -1
+            pos += 1
+        self.pos = pos
+
+    def repaired(self):
+        """
+        Return repaired JSON text for the object, or None if no object start
+        was found. Truncated input is cut back to the last complete value.
+        """
+        if self.start < 0:
+            return None
+
+        if self.done:
+            end, closers = self.pos, ""
+        else:
+            if self.safe_end < 0:
+                return "{}"
+            end = self.safe_end
+            closers = "".join("}" if bracket == "{" else "]" for bracket in reversed(self.safe_stack))
+
+        return _strip_commas(self.text, self.start, end, self.trailing_commas) + closers
+
+    @property
+    def truncated(self):
+        return self.start >= 0 and not self.done
+
+
+def _strip_commas(text, start, end, commas):
+    """text[start:end] without the given comma positions"""
+    pieces = []
+    cursor = start
+    for comma in commas:
+        if start <= comma < end:
+            pieces.append(text[cursor:comma])
+            cursor = comma + 1
+    pieces.append(text[cursor:end])
+    # A dangling comma before the synthetic closers is also a trailing comma
+    result = "".join(pieces).rstrip()
+    return result[:-1] if result.endswith(",") else result
+
+
+def _fast_decode(text):
+    """
+    Decode the first well-formed JSON object with OCR keys in text, in
+    place, without copying the response
+    """
+    index = text.find("{")
+    while index != -1:
+        try:
+            value, end = _decoder.raw_decode(text, index)
+        except ValueError:
+            index = text.find("{", index + 1)
+            continue
+        if isinstance(value, dict) and ("medicines" in value or "extractedText" in value):
+            return value
+        index = text.find("{", end if end > index else index + 1)
+    return None
+
+
+def validate_ocr_data(data):
+    """
+    Check data against the OCR schema. Returns (medicines, extractedText,
+    warnings); medicines without a usable name are dropped.
+    """
+    warnings = []
+    medicines = []
+    raw_medicines = data.get("medicines", [])
+    if not isinstance(raw_medicines, list):
+        warnings.append("medicines is not a list")
+        raw_medicines = []
+
+    for item in raw_medicines:
+        if not isinstance(item, dict):
+            warnings.append("dropped non-object medicine entry")
+            continue
+        name = item.get("name") or item.get("medicine_name")
+        if not isinstance(name, str) or not name.strip():
+            warnings.append("dropped medicine without a name")
+            continue
+        medicine = dict(item)
+        medicine["name"] = name.strip()
+        for field in MEDICINE_FIELDS[1:]:
+            value = medicine.get(field)
+            if value is not None and not isinstance(value, str):
+                medicine[field] = str(value)
+        medicines.append(medicine)
+
+    extracted_text = data.get("extractedText")
+    if extracted_text is not None and not isinstance(extracted_text, str):
+        warnings.append("extractedText is not a string")
+        extracted_text = None
+    return medicines, extracted_text, warnings
+
+
+def parse_ocr_response(response):
+    """
+    Extract and validate the OCR object from an LLM response.
+
+    Returns {"medicines", "extractedText", "warnings", "repaired",
+    "truncated"} or None when no JSON object can be recovered.
+    extractedText is None when the object has none.
+    """
+    if not isinstance(response, str):
+        return None
+
+    data = _fast_decode(response)
+    repaired = truncated = False
+    if data is None:
+        scanner = JsonScanner()
+        scanner.feed(response)
+        text = scanner.repaired()
+        if text is None:
+            return None
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        repaired = True
+        truncated = scanner.truncated
+
+    medicines, extracted_text, warnings = validate_ocr_data(data)
+    if not data and truncated:
+        return None
+    return {
+        "medicines": medicines,
+        "extractedText": extracted_text,
+        "warnings": warnings,
+        "repaired": repaired,
+        "truncated": truncated,
+    }
+
+
+class IncrementalMedicineParser:
+    """
+    Feed streamed response chunks; feed() returns the medicines whose
+    objects completed in that chunk. finish() returns the full parse.
+    """
+
+    def __init__(self):
+        self.scanner = JsonScanner()
+        self.emitted = 0
+
+    def feed(self, chunk):
+        scanner = self.scanner
+        scanner.feed(chunk)
+        medicines = []
+        while self.emitted < len(scanner.completed_elements):
+            start, end, commas = scanner.completed_elements[self.emitted]
+            self.emitted += 1
+            try:
+                item = json.loads(_strip_commas(scanner.text, start, end, commas))
+            except ValueError:
+                continue
+            valid, _, _ = validate_ocr_data({"medicines": [item]})
+            medicines.extend(valid)
+        return medicines
+
+    def finish(self):
+        return parse_ocr_response(self.scanner.text)
+
+
+def legacy_parse(response):
+    """The original fence-stripping parser, kept for benchmark comparison"""
+    clean_response = response.strip()
+    if clean_response.startswith('```json'):
+        clean_response = clean_response[7:]
+    if clean_response.endswith('```'):
+        clean_response = clean_response[:-3]
+    return json.loads(clean_response.strip())
+
+
+WORDS = ["Paracetamol", "Amoxicillin", "Metformin", "Atorvastatin", "Omeprazole", "Cetirizine", "tablet", "after", "meals",
+         "twice", "daily", "days", "\"quoted\"", "back\\slash", "{brace}", "[bracket]", "comma,", "ünïcödé", "\n"]
+
+
+def random_ocr_object(rng):
+    medicines = [
+        {
+            "name": " ".join(rng.choice(WORDS[:6]) for _ in range(rng.randint(1, 2))),
+            "dosage": f"{rng.choice([5, 10, 250, 500])}mg",
+            "frequency": rng.choice(["Once daily", "Twice daily", "Three times daily"]),
+            "duration": f"{rng.randint(1, 14)} days",
+            "instructions": " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 6))),
+        }
+        for _ in range(rng.randint(0, 6))
+    ]
+    return {"medicines": medicines, "extractedText": " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 40)))}
+
+
+def dumps_trailing_commas(value, ensure_ascii):
+    """json.dumps with a trailing comma after the last member of every container"""
+    if isinstance(value, dict):
+        if not value:
+            return "{}"
+        members = "".join(f"{json.dumps(key, ensure_ascii=ensure_ascii)}: {dumps_trailing_commas(item, ensure_ascii)}, " for key, item in value.items())
+        return "{" + members + "}"
+    if isinstance(value, list):
+        if not value:
+            return "[]"
+        return "[" + "".join(f"{dumps_trailing_commas(item, ensure_ascii)}, " for item in value) + "]"
+    return json.dumps(value, ensure_ascii=ensure_ascii)
+
+
+def render_response(data, rng):
+    """Render data the way models do: fences, prose, indentation, trailing commas"""
+    ensure_ascii = rng.random() < 0.5
+    if rng.random() < 0.3:
+        body = dumps_trailing_commas(data, ensure_ascii)
+    else:
+        body = json.dumps(data, indent=rng.choice([None, 2]), ensure_ascii=ensure_ascii)
+    prefix = rng.choice(["", "```json\n", "Here is the extracted data:\n```json\n", "Sure! {not json} "])
+    suffix = rng.choice(["", "\n```", "\n```\nLet me know if you need anything else.", "\nNote: handwriting was unclear."])
+    return prefix + body + suffix
+
+
+def run_fuzz(cases, seed):
+    """
+    Random well-formed, decorated and truncated responses: parsing must never
+    raise, must round-trip intact objects, must only return complete
+    medicines from truncated ones, and must agree with incremental parsing.
+    """
+    rng = random.Random(seed)
+    counts = {"cases": cases, "roundTrips": 0, "truncated": 0, "recovered": 0, "failures": 0}
+    failures = []
+
+    for case in range(cases):
+        data = random_ocr_object(rng)
+        response = render_response(data, rng)
+        truncate = rng.random() < 0.4
+        if truncate:
+            response = response[:rng.randint(0, len(response))]
+            counts["truncated"] += 1
+
+        try:
+            parsed = parse_ocr_response(response)
+            incremental = IncrementalMedicineParser()
+            streamed = []
+            cursor = 0
+            while cursor < len(response):
+                step = rng.randint(1, 64)
+                streamed.extend(incremental.feed(response[cursor:cursor + step]))
+                cursor += step
+        except Exception as e:
+            failures.append({"case": case, "error": repr(e), "response": response[:200]})
+            continue
+
+        expected = validate_ocr_data(data)[0]
+        if not truncate:
+            if parsed is None or parsed["medicines"] != expected or parsed["extractedText"] != data["extractedText"]:
+                failures.append({"case": case, "error": "round trip mismatch", "response": response[:200]})
+            elif streamed != expected:
+                failures.append({"case": case, "error": "incremental mismatch", "response": response[:200]})
+            else:
+                counts["roundTrips"] += 1
+        elif parsed is not None:
+            counts["recovered"] += 1
+            # Streamed medicines are always complete, so they must be a prefix
+            if streamed != expected[:len(streamed)]:
+                failures.append({"case": case, "error": "partial medicine streamed", "response": response[:200]})
+
+    counts["failures"] = len(failures)
+    return counts, failures[:5]
+
+
+def run_bench(iterations, seed):
+    """Time the original parser against parse_ocr_response on clean and fenced responses"""
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(200):
+        data = random_ocr_object(rng)
+        samples.append("```json\n" + json.dumps(data, indent=2) + "\n```")
+
+    results = {}
+    for label, parser in (("legacy", legacy_parse), ("parse_ocr_response", parse_ocr_response)):
+        started = time.perf_counter()
+        for i in range(iterations):
+            parser(samples[i % len(samples)])
+        results[f"{label}Us"] = round((time.perf_counter() - started) / iterations * 1e6, 2)
+
+    prose = [f"Here is the result:\n{sample}\nHope this helps." for sample in samples]
+    started = time.perf_counter()
+    for i in range(iterations):
+        parse_ocr_response(prose[i % len(prose)])
+    results["withProseUs"] = round((time.perf_counter() - started) / iterations * 1e6, 2)
+
+    truncated = [sample[:len(sample) * 2 // 3] for sample in samples]
+    started = time.perf_counter()
+    for i in range(iterations):
+        parse_ocr_response(truncated[i % len(truncated)])
+    results["truncatedRepairUs"] = round((time.perf_counter() - started) / iterations * 1e6, 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz and benchmark the LLM JSON parser")
+    parser.add_argument("--fuzz", action="store_true")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--cases", type=int, default=20000)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if not args.fuzz and not args.bench:
+        parser.error("choose --fuzz and/or --bench")
+
+    status = 0
+    if args.fuzz:
+        counts, failures = run_fuzz(args.cases, args.seed)
+        print(json.dumps({"fuzz": counts, "examples": failures}))
+        status = 1 if failures else 0
+    if args.bench:
+        print(json.dumps({"bench": run_bench(args.iterations, args.seed)}))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
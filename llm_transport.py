@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Keep-alive transport for OpenAI-compatible chat completion endpoints.
+
+LlmChat builds a new client, and so a new TCP + TLS connection, for every
+call. When OCR_LLM_BASE_URL points at an OpenAI-compatible endpoint (the
+provider itself or a gateway), the OCR processor sends requests through one
+OpenAiChatClient per worker process instead: a most-recently-used pool of
+persistent HTTP/1.1 connections sized to the LLM concurrency cap. Responses
+are streamed so time-to-first-token is measured, the constant system
+prompt goes first with a constant prompt_cache_key so providers can serve
+it from their prompt cache, and token usage (including cached tokens) comes
+back from the provider instead of being estimated. complete() can hand each
+content delta to a callback as it arrives.
+
+--bench runs the same prescription through fake_llm_server three ways (a
+fresh connection and the verbose prompts per call as before, pooled
+connections with the verbose prompts, pooled with the compact prompts) and
+reports time-to-first-token and input tokens per prescription.
+
+Usage:
+    python llm_transport.py --bench [--requests 200] [--concurrency 8] [--handshake-latency 0.05] [--image <path>]
+"""
+import os
+import ssl
+import sys
+import json
+import time
+import socket
+import base64
+import asyncio
+import argparse
+import tempfile
+import threading
+import http.client
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+DEFAULT_TIMEOUT = 60.0
+
+# Errors a kept-alive connection raises when the server already closed it
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class LlmHttpError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(f"HTTP {status_code}: {message}")
+        self.status_code = status_code
+
+
+class ConnectionPool:
+    """Persistent HTTP(S) connections to one origin, most recently used first"""
+
+    def __init__(self, base_url, size=8, timeout=DEFAULT_TIMEOUT, keep_alive=True):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.path = parts.path.rstrip("/")
+        self.size = size
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self._context = ssl.create_default_context() if self.https else None
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "reused": 0}
+
+    def acquire(self):
+        """Returns (connection, reused)"""
+        with self._lock:
+            if self._idle:
+                self.stats["reused"] += 1
+                return self._idle.pop(), True
+            self.stats["opened"] += 1
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self._context), False
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+
+    def release(self, conn, reusable=True):
+        if reusable and self.keep_alive:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(conn)
+                    return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
+
+def usage_of(usage):
+    if not usage:
+        return None
+    return {
+        "promptTokens": usage.get("prompt_tokens", 0),
+        "cachedPromptTokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+        "completionTokens": usage.get("completion_tokens", 0),
+    }
+
+
+class AbortHandle:
+    """
+    Lets the event loop abort a complete() call blocked in a socket read.
+    Cancelling the awaiting task does not stop the executor thread, so an
+    abandoned attempt would otherwise keep its thread and connection until
+    the response finished.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self.aborted = False
+
+    def attach(self, conn):
+        with self._lock:
+            if self.aborted:
+                raise ConnectionError("LLM request aborted")
+            self._conn = conn
+
+    def abort(self):
+        with self._lock:
+            self.aborted = True
+            conn = self._conn
+        if conn is not None and conn.sock is not None:
+            try:
+                # Wakes the blocked read; close() alone would not
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class OpenAiChatClient:
+    def __init__(self, base_url, api_key, model, pool_size=8, timeout=DEFAULT_TIMEOUT, prompt_cache_key=None, keep_alive=True):
+        self.pool = ConnectionPool(base_url, pool_size, timeout, keep_alive)
+        self.api_key = api_key
+        self.model = model
+        self.prompt_cache_key = prompt_cache_key
+        # One thread per pooled connection, independent of the default executor's size
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="llm-transport")
+
+    @classmethod
+    def from_env(cls, model, pool_size, prompt_cache_key=None):
+        """Create a client from OCR_LLM_BASE_URL / OCR_LLM_API_KEY, or None when no endpoint is set"""
+        base_url = os.getenv("OCR_LLM_BASE_URL")
+        if not base_url:
+            return None
+        return cls(
+            base_url,
+            api_key=os.getenv("OCR_LLM_API_KEY") or os.getenv("EMERGENT_LLM_KEY", ""),
+            model=os.getenv("OCR_LLM_MODEL", model),
+            pool_size=pool_size,
+            timeout=float(os.getenv("OCR_LLM_ATTEMPT_TIMEOUT_SECONDS", str(DEFAULT_TIMEOUT))),
+            prompt_cache_key=prompt_cache_key,
+        )
+
+    def build_body(self, system_prompt, user_prompt, file_path, mime_type):
+        with open(file_path, "rb") as f:
+            data_url = f"data:{mime_type};base64,{base64.b64encode(f.read()).decode('ascii')}"
+        if mime_type.startswith("image/"):
+            attachment = {"type": "image_url", "image_url": {"url": data_url, "detail": "high"}}
+        else:
+            attachment = {"type": "file", "file": {"filename": os.path.basename(file_path), "file_data": data_url}}
+        body = {
+            "model": self.model,
+            # Constant prefix first, the per-prescription attachment last
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": [{"type": "text", "text": user_prompt}, attachment]},
+            ],
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        if self.prompt_cache_key:
+            body["prompt_cache_key"] = self.prompt_cache_key
+        return json.dumps(body, separators=(",", ":")).encode()
+
+    def complete(self, system_prompt, user_prompt, file_path, mime_type, on_delta=None, abort=None):
+        """
+        Blocking chat completion. Returns {"content", "usage", "ttftSeconds"};
+        raises LlmHttpError on error statuses and ConnectionError when the
+        endpoint cannot be reached. on_delta, when given, is called on this
+        thread with each piece of content as it streams in; an AbortHandle
+        lets another thread shut the connection down mid-request.
+        """
+        body = self.build_body(system_prompt, user_prompt, file_path, mime_type)
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+            "Authorization": f"Bearer {self.api_key}",
+        }
+        if not self.pool.keep_alive:
+            headers["Connection"] = "close"
+
+        while True:
+            conn, reused = self.pool.acquire()
+            started = time.perf_counter()
+            try:
+                if abort is not None:
+                    # Connected up front so an abort always has a socket to shut down
+                    if conn.sock is None:
+                        conn.connect()
+                    abort.attach(conn)
+                conn.request("POST", self.pool.path + "/chat/completions", body=body, headers=headers)
+                response = conn.getresponse()
+            except STALE_CONNECTION_ERRORS as e:
+                conn.close()
+                if reused:
+                    continue
+                raise ConnectionError(f"LLM connection failed: {e}") from e
+            except Exception:
+                conn.close()
+                raise
+
+            try:
+                return self._read(response, started, on_delta)
+            finally:
+                # Only a fully read response leaves the connection reusable
+                aborted = abort is not None and abort.aborted
+                self.pool.release(conn, reusable=response.isclosed() and not response.will_close and not aborted)
+
+    async def acomplete(self, system_prompt, user_prompt, file_path, mime_type, on_delta=None):
+        loop = asyncio.get_running_loop()
+        abort = AbortHandle()
+        try:
+            return await loop.run_in_executor(self.executor, self.complete, system_prompt, user_prompt, file_path, mime_type,
+                                              on_delta, abort)
+        except asyncio.CancelledError:
+            # Timed-out or out-raced attempts free their thread and connection now
+            abort.abort()
+            raise
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.pool.close()
+
+    def _read(self, response, started, on_delta=None):
+        if response.status >= 400:
+            payload = response.read()
+            try:
+                message = json.loads(payload)["error"]["message"]
+            except Exception:
+                message = payload[:200].decode(errors="replace") or response.reason
+            raise LlmHttpError(response.status, message)
+
+        if "text/event-stream" not in (response.getheader("Content-Type") or ""):
+            payload = json.loads(response.read())
+            content = payload["choices"][0]["message"]["content"]
+            if on_delta is not None and content:
+                on_delta(content)
+            return {
+                "content": content,
+                "usage": usage_of(payload.get("usage")),
+                "ttftSeconds": time.perf_counter() - started,
+            }
+
+        parts = []
+        usage = None
+        ttft = None
+        for line in iter(response.readline, b""):
+            line = line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                response.read()
+                break
+            chunk = json.loads(data)
+            for choice in chunk.get("choices") or []:
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    parts.append(text)
+                    if on_delta is not None:
+                        on_delta(text)
+            if chunk.get("usage"):
+                usage = usage_of(chunk["usage"])
+        return {"content": "".join(parts), "usage": usage, "ttftSeconds": ttft}
+
+
+def percentile_ms(ordered, pct):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] * 1000, 1)
+
+
+async def run_scenario(name, url, requests, concurrency, image_path, system_prompt, user_prompt, keep_alive, prompt_cache_key):
+    client = OpenAiChatClient(url, "fake-key", "gpt-4o", pool_size=concurrency, keep_alive=keep_alive, prompt_cache_key=prompt_cache_key)
+    gate = asyncio.Semaphore(concurrency)
+    ttfts, totals, prompt_tokens, cached_tokens = [], [], [], []
+
+    async def one():
+        async with gate:
+            started = time.perf_counter()
+            reply = await client.acomplete(system_prompt, user_prompt, image_path, "image/jpeg")
+            totals.append(time.perf_counter() - started)
+            ttfts.append(reply["ttftSeconds"])
+            prompt_tokens.append(reply["usage"]["promptTokens"])
+            cached_tokens.append(reply["usage"]["cachedPromptTokens"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    client.close()
+
+    ttfts.sort()
+    totals.sort()
+    return {
+        "scenario": name,
+        "requests": requests,
+        "throughputPerSecond": round(requests / elapsed, 2),
+        "ttftP50Ms": percentile_ms(ttfts, 50),
+        "ttftP95Ms": percentile_ms(ttfts, 95),
+        "totalP50Ms": percentile_ms(totals, 50),
+        "promptTokensPerRequest": round(sum(prompt_tokens) / requests, 1),
+        "uncachedPromptTokensPerRequest": round((sum(prompt_tokens) - sum(cached_tokens)) / requests, 1),
+        "connections": client.pool.stats,
+    }
+
+
+def run_bench(args):
+    from fake_llm_server import build_parser, start_server
+    from ocr_prompts import SYSTEM_PROMPT, USER_PROMPT, VERBOSE_SYSTEM_PROMPT, VERBOSE_USER_PROMPT
+
+    config = build_parser().parse_args([
+        "--latency", str(args.latency), "--tail-rate", "0", "--throttle-rate", "0", "--error-rate", "0",
+        "--handshake-latency", str(args.handshake_latency), "--prefill-per-1k", str(args.prefill_per_1k),
+        "--decode-latency", str(args.decode_latency), "--cache-min-tokens", str(args.cache_min_tokens),
+    ])
+    server = start_server(config, 0)
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    image_path = args.image
+    if image_path is None:
+        # Stand-in for a preprocessed prescription photo; the fake server never decodes it
+        fd, image_path = tempfile.mkstemp(suffix=".jpg")
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(args.image_bytes))
+
+    scenarios = [
+        ("fresh-connection-verbose-prompt", VERBOSE_SYSTEM_PROMPT, VERBOSE_USER_PROMPT, False, None),
+        ("pooled-verbose-prompt", VERBOSE_SYSTEM_PROMPT, VERBOSE_USER_PROMPT, True, None),
+        ("pooled-compact-prompt", SYSTEM_PROMPT, USER_PROMPT, True, "prescription_ocr"),
+    ]
+    try:
+        for name, system_prompt, user_prompt, keep_alive, prompt_cache_key in scenarios:
+            result = asyncio.run(run_scenario(name, url, args.requests, args.concurrency, image_path,
+                                              system_prompt, user_prompt, keep_alive, prompt_cache_key))
+            print(json.dumps(result), flush=True)
+    finally:
+        server.shutdown()
+        if args.image is None:
+            os.remove(image_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the keep-alive LLM transport against fake_llm_server")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--image", help="Image sent with every request (default: random bytes)")
+    parser.add_argument("--image-bytes", type=int, default=220_000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake model latency before prefill")
+    parser.add_argument("--handshake-latency", type=float, default=0.05, help="Per-connection setup cost (TCP + TLS)")
+    parser.add_argument("--prefill-per-1k", type=float, default=0.1, help="Seconds per 1000 uncached prompt tokens")
+    parser.add_argument("--decode-latency", type=float, default=0.05)
+    parser.add_argument("--cache-min-tokens", type=int, default=1024, help="Provider prompt-cache minimum prefix")
+    args = parser.parse_args()
+
+    if not args.bench:
+        parser.error("only --bench is supported from the command line")
+    run_bench(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Load generator built on the HealthMateAPITester scenarios.
+
+Runs N virtual users concurrently on a thread pool. Each virtual user owns a
+pooled keep-alive requests.Session and one test account, and loops over the
+tester scenarios (home page, auth pages, registration, NextAuth sign-in,
+dashboards) until the test duration ends; registration runs until it first
+succeeds. Users start according to a ramp-up profile. Every HTTP call is
+timed per endpoint and reported as throughput, p50/p95/p99 and a latency
+histogram.
+
+Usage:
+    python load_test.py --users 50 --ramp-up 30 --duration 120 [--profile linear]
+"""
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend_test import HealthMateAPITester
+
+SCENARIOS = {
+    "home": lambda tester: tester.test_home_page(),
+    "auth_pages": lambda tester: tester.test_auth_pages(),
+    "register": lambda tester: tester.test_patient_registration(),
+    "signin": lambda tester: tester.test_nextauth_signin(),
+    "dashboards": lambda tester: tester.test_dashboard_access(),
+    "api_routes": lambda tester: tester.test_api_routes_exist(),
+}
+
+# Upper bounds in milliseconds; the last bucket is +Inf
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class LatencyRecorder:
+    """Thread-safe per-endpoint latency and status collection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, endpoint, seconds, status):
+        with self._lock:
+            entry = self.endpoints.setdefault(endpoint, {"latencies": [], "statuses": {}, "errors": 0})
+            entry["latencies"].append(seconds)
+            entry["statuses"][status] = entry["statuses"].get(status, 0) + 1
+            if status == "error" or (isinstance(status, int) and status >= 500):
+                entry["errors"] += 1
+
+    def report(self, elapsed):
+        with self._lock:
+            endpoints = {name: dict(entry, latencies=sorted(entry["latencies"])) for name, entry in self.endpoints.items()}
+
+        report = {}
+        for name, entry in sorted(endpoints.items()):
+            latencies = entry["latencies"]
+            count = len(latencies)
+            percentile = lambda pct: round(latencies[min(count - 1, int(pct / 100 * count))] * 1000, 1)
+            histogram = {}
+            index = 0
+            for bound in HISTOGRAM_BUCKETS_MS:
+                while index < count and latencies[index] * 1000 <= bound:
+                    index += 1
+                histogram[f"le_{bound}ms"] = index
+            histogram["le_inf"] = count
+            report[name] = {
+                "requests": count,
+                "throughputPerSecond": round(count / elapsed, 2) if elapsed else None,
+                "errorRate": round(entry["errors"] / count, 4),
+                "p50Ms": percentile(50),
+                "p95Ms": percentile(95),
+                "p99Ms": percentile(99),
+                "maxMs": round(latencies[-1] * 1000, 1),
+                "statuses": {str(status): n for status, n in entry["statuses"].items()},
+                "histogram": histogram,
+            }
+        return report
+
+
+class RecordingSession(requests.Session):
+    """requests.Session that times every request into a LatencyRecorder"""
+
+    def __init__(self, recorder, pool_size, timeout):
+        super().__init__()
+        self.recorder = recorder
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = f"{method.upper()} {urlsplit(url).path}"
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        except Exception:
+            self.recorder.record(endpoint, time.perf_counter() - started, "error")
+            raise
+        self.recorder.record(endpoint, time.perf_counter() - started, response.status_code)
+        return response
+
+
+def start_delay(user_index, users, ramp_up, profile):
+    """Seconds after test start at which a virtual user begins"""
+    if ramp_up <= 0 or users <= 1:
+        return 0.0
+    if profile == "step":
+        # Start users in five equal batches across the ramp-up window
+        steps = 5
+        return (user_index * steps // users) * ramp_up / steps
+    return user_index * ramp_up / users
+
+
+def virtual_user(user_index, args, recorder, stop_at, started_at):
+    delay = start_delay(user_index, args.users, args.ramp_up, args.profile)
+    time.sleep(max(0, started_at + delay - time.monotonic()))
+
+    rng = random.Random(args.seed + user_index)
+    # One session and account per virtual user, so connections stay alive
+    # across iterations
+    session = RecordingSession(recorder, args.pool_size, args.timeout)
+    tester = HealthMateAPITester(args.base_url, session=session, verbose=False, user_tag=f"-load-{uuid.uuid4().hex[:10]}")
+    iterations = 0
+    try:
+        while time.monotonic() < stop_at:
+            for scenario in args.scenarios:
+                if time.monotonic() >= stop_at:
+                    break
+                # The account is registered once; later iterations sign in with it
+                if scenario == "register" and tester.patient_credentials:
+                    continue
+                try:
+                    SCENARIOS[scenario](tester)
+                except Exception:
+                    # Failures are already recorded per request
+                    pass
+                if args.think_time:
+                    time.sleep(rng.uniform(0, args.think_time))
+            iterations += 1
+    finally:
+        session.close()
+    return iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HealthMate load test")
+    parser.add_argument("--base-url", default="http://localhost:3001")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="Seconds until all users are running")
+    parser.add_argument("--profile", choices=["linear", "step", "constant"], default="linear")
+    parser.add_argument("--duration", type=float, default=60.0, help="Total test duration in seconds")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Max random pause between scenarios")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--pool-size", type=int, default=4, help="Keep-alive connections per virtual user")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON only")
+    args = parser.parse_args()
+    if args.profile == "constant":
+        args.ramp_up = 0
+
+    recorder = LatencyRecorder()
+    started_at = time.monotonic()
+    stop_at = started_at + args.duration
+
+    if not args.json:
+        print(f"🚀 Load test: {args.users} users, {args.profile} ramp-up {args.ramp_up}s, {args.duration}s against {args.base_url}")
+
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        futures = [pool.submit(virtual_user, i, args, recorder, stop_at, started_at) for i in range(args.users)]
+        iterations = sum(future.result() for future in futures)
+
+    elapsed = time.monotonic() - started_at
+    report = recorder.report(elapsed)
+
+    if args.json:
+        print(json.dumps({"elapsedSeconds": round(elapsed, 2), "iterations": iterations, "endpoints": report}))
+        return 0
+
+    print("=" * 96)
+    print(f"{'Endpoint':40} {'Reqs':>7} {'Req/s':>8} {'Err%':>6} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8}")
+    for name, stats in report.items():
+        print(f"{name:40} {stats['requests']:>7} {stats['throughputPerSecond']:>8} {stats['errorRate'] * 100:>6.1f} "
+              f"{stats['p50Ms']:>8} {stats['p95Ms']:>8} {stats['p99Ms']:>8}")
+    print("=" * 96)
+    print(f"📊 {iterations} scenario iterations in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
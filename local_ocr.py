@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Offline OCR engine and rule-based medicine extractor.
+
+recognize() reads a prescription on the CPU: the text layer of digital PDFs
+when there is one, otherwise Tesseract over the image (or the rasterized PDF
+pages), returning the text with Tesseract's mean word confidence.
+extract_medicines_from_text() pulls name / dosage / frequency / duration /
+instructions out of each line with regular expressions, checks names against
+the catalogue index and scores every medicine, so the router can decide
+whether the local result is good enough or the LLM is needed.
+
+Requires pytesseract with the tesseract binary, and Pillow; PDFs need
+PyMuPDF or pypdf. is_available() reports whether images can be read.
+
+Usage:
+    python local_ocr.py <file_path> <mime_type>
+    python local_ocr.py --text <text_file>
+"""
+import os
+import re
+import sys
+import json
+import shutil
+
+try:
+    import pytesseract
+    from PIL import Image, ImageOps
+except ImportError:
+    pytesseract = None
+    Image = None
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+IMAGE_MIME_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/webp"}
+RASTER_DPI = 300
+# A PDF page with at least this much extractable text is treated as digital
+MIN_TEXT_LAYER_CHARS = 40
+TEXT_LAYER_CONFIDENCE = 0.99
+# Lookup score from which a parsed name counts as a catalogue medicine
+CATALOGUE_MIN_SCORE = 0.75
+# Longest name tried against the catalogue on lines without a dosage
+MAX_NAME_WORDS = 4
+
+DOSAGE_PATTERN = re.compile(r"\b(\d+(?:\.\d+)?\s*(?:mg|mcg|µg|g|ml|iu|units?|%)(?:\s*/\s*\d*\s*(?:ml|g))?)(?![a-z])", re.I)
+FORM_WORDS = r"(?:tab|tabs|tablet|cap|caps|capsule|syp|syrup|susp|inj|injection|oint|cream|drops?|inh|inhaler)"
+FORM_PREFIX = re.compile(r"^" + FORM_WORDS + r"\b\.?\s*", re.I)
+FORM_SUFFIX = re.compile(r"\s+" + FORM_WORDS + r"\.?$", re.I)
+LIST_PREFIX = re.compile(r"^\s*(?:\d+\s*[.)]|[-•*]|rx\s*:?)\s*", re.I)
+
+# Matched against the lowercased line with dots removed, so "b.d." reads as "bd"
+FREQUENCY_PATTERNS = [
+    (re.compile(r"\b(?:qid|qds|four times (?:a|per) day)\b"), "Four times daily"),
+    (re.compile(r"\b(?:tds|tid|thrice daily|three times (?:a|per) day)\b"), "Three times daily"),
+    (re.compile(r"\b(?:bd|bid|twice (?:a )?daily|twice a day|two times (?:a|per) day)\b"), "Twice daily"),
+    (re.compile(r"\b(?:od|qd|once (?:a )?daily|once a day|daily|mane)\b"), "Once daily"),
+    (re.compile(r"\b(?:hs|nocte|at bedtime|at night)\b"), "At bedtime"),
+    (re.compile(r"\b(?:sos|prn|as needed|when required)\b"), "As needed"),
+]
+EVERY_HOURS_PATTERN = re.compile(r"\b(?:every\s*(\d+)\s*(?:hours|hrs|hr|h)|q(\d+)h)\b")
+DOSE_GRID_PATTERN = re.compile(r"(?<![\d/])([01])\s*-\s*([01])\s*-\s*([01])(?![\d/])")
+TIMES_PER_DAY = {1: "Once daily", 2: "Twice daily", 3: "Three times daily", 4: "Four times daily"}
+
+DURATION_PATTERN = re.compile(r"\b(?:for\s*|x\s*)?(\d+)\s*(days?|d|weeks?|wks?|w|months?|mo)\b", re.I)
+DURATION_FRACTION_PATTERN = re.compile(r"\b(\d+)\s*/\s*(7|52|12)\b")
+DURATION_UNITS = {"d": "days", "w": "weeks", "wk": "weeks", "m": "months"}
+FRACTION_UNITS = {"7": "days", "52": "weeks", "12": "months"}
+
+INSTRUCTION_PATTERNS = [
+    (re.compile(r"\b(?:after (?:meals|food)|pc)\b"), "Take after meals"),
+    (re.compile(r"\b(?:before (?:meals|food)|ac)\b"), "Take before meals"),
+    (re.compile(r"\bwith (?:meals|food)\b"), "Take with food"),
+    (re.compile(r"\bempty stomach\b"), "Take on an empty stomach"),
+]
+
+
+def is_available():
+    """Whether images can be read locally (pytesseract, Pillow and the tesseract binary)"""
+    return pytesseract is not None and shutil.which(getattr(pytesseract.pytesseract, "tesseract_cmd", "tesseract")) is not None
+
+
+def supports(mime_type):
+    if mime_type == "application/pdf":
+        return fitz is not None or PdfReader is not None
+    return mime_type in IMAGE_MIME_TYPES and is_available()
+
+
+def tesseract_image(image):
+    """Run Tesseract on a PIL image; returns (text, mean word confidence 0..1)"""
+    image = ImageOps.exif_transpose(image).convert("L")
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        confidence = float(data["conf"][i])
+        if not word.strip() or confidence < 0:
+            continue
+        confidences.append(confidence)
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+    text = "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+    confidence = sum(confidences) / len(confidences) / 100 if confidences else 0.0
+    return text, confidence
+
+
+def recognize(file_path, mime_type):
+    """
+    Read a prescription locally. Returns {"text", "confidence", "engine"};
+    raises RuntimeError when the file type cannot be read here.
+    """
+    if mime_type == "application/pdf":
+        return recognize_pdf(file_path)
+    if not supports(mime_type):
+        raise RuntimeError(f"Local OCR cannot read {mime_type}")
+    with Image.open(file_path) as image:
+        text, confidence = tesseract_image(image)
+    return {"text": text, "confidence": confidence, "engine": "tesseract"}
+
+
+def recognize_pdf(file_path):
+    """Use each page's text layer when present, else OCR the rasterized page"""
+    texts = []
+    confidences = []
+    engines = set()
+    if fitz is not None:
+        with fitz.open(file_path) as doc:
+            for page in doc:
+                text = page.get_text()
+                if len(text.strip()) >= MIN_TEXT_LAYER_CHARS:
+                    texts.append(text)
+                    confidences.append(TEXT_LAYER_CONFIDENCE)
+                    engines.add("text-layer")
+                elif is_available():
+                    pixmap = page.get_pixmap(dpi=RASTER_DPI)
+                    image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+                    text, confidence = tesseract_image(image)
+                    texts.append(text)
+                    confidences.append(confidence)
+                    engines.add("tesseract")
+                else:
+                    raise RuntimeError("Scanned PDF pages need pytesseract for local OCR")
+    elif PdfReader is not None:
+        for page in PdfReader(file_path).pages:
+            text = page.extract_text() or ""
+            if len(text.strip()) < MIN_TEXT_LAYER_CHARS:
+                raise RuntimeError("Scanned PDF pages need PyMuPDF and pytesseract for local OCR")
+            texts.append(text)
+            confidences.append(TEXT_LAYER_CONFIDENCE)
+            engines.add("text-layer")
+    else:
+        raise RuntimeError("Local PDF reading needs PyMuPDF or pypdf")
+
+    return {
+        "text": "\n".join(texts),
+        # The weakest page bounds the document
+        "confidence": min(confidences) if confidences else 0.0,
+        "engine": "+".join(sorted(engines)),
+    }
+
+
+def find_frequency(plain):
+    grid = DOSE_GRID_PATTERN.search(plain)
+    if grid:
+        doses = sum(int(part) for part in grid.groups())
+        if doses in TIMES_PER_DAY:
+            return TIMES_PER_DAY[doses]
+    every = EVERY_HOURS_PATTERN.search(plain)
+    if every:
+        return f"Every {every.group(1) or every.group(2)} hours"
+    for pattern, frequency in FREQUENCY_PATTERNS:
+        if pattern.search(plain):
+            return frequency
+    return None
+
+
+def find_duration(line):
+    fraction = DURATION_FRACTION_PATTERN.search(line)
+    if fraction:
+        return f"{fraction.group(1)} {FRACTION_UNITS[fraction.group(2)]}"
+    match = DURATION_PATTERN.search(line)
+    if not match:
+        return None
+    unit = match.group(2).lower().rstrip("s")
+    unit = DURATION_UNITS.get(unit, DURATION_UNITS.get(unit[:1], unit + "s"))
+    return f"{match.group(1)} {unit}"
+
+
+def catalogue_hit(name, index):
+    if index is None:
+        return False
+    matches = index.lookup(name, limit=1)
+    return bool(matches) and matches[0]["score"] >= CATALOGUE_MIN_SCORE
+
+
+def name_like(name):
+    return len(re.sub(r"[^A-Za-z]", "", name)) >= 3
+
+
+def parse_line(line, index=None):
+    """
+    Parse one prescription line into a medicine dict, or None. A line needs a
+    dosage, or a name found in the catalogue index, to count as a medicine:
+    a frequency word alone ("Call ... daily") is not enough.
+    """
+    plain = re.sub(r"(?<=[a-z])\.", "", line.lower())
+    dosage = DOSAGE_PATTERN.search(line)
+    frequency = find_frequency(plain)
+    if not dosage and not frequency:
+        return None
+
+    # The name is whatever precedes the dosage (or the frequency)
+    name_part = line[:dosage.start()] if dosage else line
+    name_part = LIST_PREFIX.sub("", name_part).strip()
+    form_prefixed = FORM_PREFIX.match(name_part) is not None
+    name_part = FORM_PREFIX.sub("", name_part)
+    name = re.split(r"\s{2,}|[,;:(]|\b\d", name_part.strip())[0].strip(" -.")
+    if not dosage:
+        # Nothing marks where the name ends: take the longest leading words
+        # the catalogue knows, or give up on the line
+        words = name.split()[:MAX_NAME_WORDS]
+        name = next((" ".join(words[:n]) for n in range(len(words), 0, -1) if catalogue_hit(" ".join(words[:n]), index)), "")
+    # A trailing form word is dropped ("Paracetamol tab") unless the line
+    # already led with the form ("Syp. Cough syrup"): then it is part of the
+    # product name
+    stripped = FORM_SUFFIX.sub("", name)
+    if stripped != name and name_like(stripped) and not form_prefixed:
+        name = stripped
+    if not name_like(name):
+        return None
+
+    instructions = [text for pattern, text in INSTRUCTION_PATTERNS if pattern.search(plain)]
+    return {
+        "name": name,
+        "dosage": re.sub(r"\s+", "", dosage.group(1)) if dosage else "",
+        "frequency": frequency or "",
+        "duration": find_duration(line) or "",
+        "instructions": "; ".join(instructions),
+    }
+
+
+def score_medicine(medicine, index):
+    """0..1 confidence that a rule-parsed line is a real, complete medicine"""
+    score = 0.35 if medicine["dosage"] else 0.15
+    score += 0.2 if medicine["frequency"] else 0.0
+    score += 0.1 if medicine["duration"] else 0.0
+    if index is None:
+        # Without a catalogue the name cannot be checked
+        return round(min(1.0, score + 0.15), 3)
+    matches = index.lookup(medicine["name"], limit=1)
+    if matches and matches[0]["score"] >= CATALOGUE_MIN_SCORE:
+        score += 0.35 * matches[0]["score"]
+    return round(min(1.0, score), 3)
+
+
+def extract_medicines_from_text(text, index=None):
+    """
+    Rule-based extraction over OCR text. Returns (medicines, confidence),
+    where confidence is the mean per-medicine score (0 with no medicines).
+    """
+    medicines = []
+    seen = set()
+    for line in text.splitlines():
+        medicine = parse_line(line.strip(), index)
+        if medicine is None:
+            continue
+        key = (medicine["name"].lower(), medicine["dosage"].lower())
+        if key in seen:
+            continue
+        seen.add(key)
+        medicine["confidence"] = score_medicine(medicine, index)
+        medicines.append(medicine)
+    confidence = sum(m["confidence"] for m in medicines) / len(medicines) if medicines else 0.0
+    return medicines, confidence
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--text":
+        with open(sys.argv[2]) as f:
+            medicines, confidence = extract_medicines_from_text(f.read())
+        print(json.dumps({"medicines": medicines, "confidence": round(confidence, 3)}))
+        return 0
+
+    if len(sys.argv) != 3:
+        print(json.dumps({"success": False, "error": "Usage: python local_ocr.py <file_path> <mime_type> | --text <text_file>"}))
+        return 1
+
+    if not os.path.exists(sys.argv[1]):
+        print(json.dumps({"success": False, "error": f"File not found: {sys.argv[1]}"}))
+        return 1
+    recognized = recognize(sys.argv[1], sys.argv[2])
+    medicines, confidence = extract_medicines_from_text(recognized["text"])
+    print(json.dumps({
+        "success": True,
+        "engine": recognized["engine"],
+        "ocrConfidence": round(recognized["confidence"], 3),
+        "extractionConfidence": round(confidence, 3),
+        "medicines": medicines,
+        "extractedText": recognized["text"],
+    }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
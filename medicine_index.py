@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Fuzzy medicine-name normalizer over the pharmacy catalogue.
+
+Builds an in-memory SymSpell-style index (pre-computed deletes over a name
+prefix) of the distinct active medicine names in the `medicines` table, so
+that misspelled OCR names can be mapped to canonical catalogue names with a
+handful of dict lookups plus a bounded edit-distance check per candidate.
+The index refreshes incrementally from `updatedAt` watermarks.
+
+Usage:
+    python medicine_index.py <name> [<name> ...]
+    python medicine_index.py --bench [--skus 100000] [--distinct 20000] [--prefix-length 9]
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+
+import prisma_db
+
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 9
+MIN_SCORE = 0.6
+
+# Strengths and forms that OCR output often appends to the name
+STRENGTH_PATTERN = re.compile(r"\b\d+(\.\d+)?\s*(mg|mcg|µg|g|ml|iu|%|units?)\b")
+FORM_WORDS = {"tab", "tabs", "tablet", "tablets", "cap", "caps", "capsule", "capsules", "syrup", "susp", "suspension", "inj", "injection", "cream", "ointment", "drops"}
+
+
+def normalize_name(name):
+    """Lowercase, drop strengths/dosage forms and punctuation, collapse spaces"""
+    name = STRENGTH_PATTERN.sub(" ", str(name).lower())
+    words = re.sub(r"[^a-z0-9 ]+", " ", name).split()
+    return " ".join(word for word in words if word not in FORM_WORDS)
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal string alignment distance between a and b, or max_distance + 1
+    as soon as it is known to exceed max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if a == b:
+        return 0
+
+    # Shared prefixes and suffixes never change the distance; trimming them
+    # leaves a tiny DP for typical one- or two-character OCR slips
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if not a or not b:
+        return max(len(a), len(b))
+
+    # Only cells within max_distance of the diagonal can stay under the bound
+    too_far = max_distance + 1
+    width = len(b)
+    previous_previous = None
+    previous = [j if j <= max_distance else too_far for j in range(width + 1)]
+    for i in range(1, len(a) + 1):
+        current = [too_far] * (width + 1)
+        if i <= max_distance:
+            current[0] = i
+        row_min = too_far
+        char_a = a[i - 1]
+        for j in range(max(1, i - max_distance), min(width, i + max_distance) + 1):
+            value = previous[j - 1] if char_a == b[j - 1] else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == b[j - 1] and previous_previous[j - 2] + 1 < value:
+                value = previous_previous[j - 2] + 1
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return too_far
+        previous_previous, previous = previous, current
+    return min(previous[-1], too_far)
+
+
+def deletes(word, max_distance):
+    """All strings reachable from word by deleting up to max_distance characters"""
+    results = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for item in frontier:
+            if len(item) <= 1:
+                continue
+            for i in range(len(item)):
+                next_frontier.add(item[:i] + item[i + 1:])
+        results |= next_frontier
+        frontier = next_frontier
+    return results
+
+
+class MedicineNameIndex:
+    def __init__(self, max_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.deletes = {}        # delete variant -> set of normalized names
+        self.names = {}          # normalized name -> {display name: row count}
+        self.rows = {}           # medicine id -> (normalized name, display name)
+        self.watermark = 0
+
+    def _index_name(self, key):
+        for variant in deletes(key[:self.prefix_length], self.max_distance):
+            self.deletes.setdefault(variant, set()).add(key)
+
+    def _unindex_name(self, key):
+        for variant in deletes(key[:self.prefix_length], self.max_distance):
+            bucket = self.deletes.get(variant)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.deletes[variant]
+
+    def add(self, medicine_id, name):
+        """Add or replace a catalogue row"""
+        self.remove(medicine_id)
+        key = normalize_name(name)
+        if not key:
+            return
+        self.rows[medicine_id] = (key, name)
+        counts = self.names.get(key)
+        if counts is None:
+            counts = self.names[key] = {}
+            self._index_name(key)
+        counts[name] = counts.get(name, 0) + 1
+
+    def remove(self, medicine_id):
+        """Remove a catalogue row, dropping its name once no row uses it"""
+        row = self.rows.pop(medicine_id, None)
+        if row is None:
+            return
+        key, display = row
+        counts = self.names[key]
+        counts[display] -= 1
+        if counts[display] == 0:
+            del counts[display]
+        if not counts:
+            del self.names[key]
+            self._unindex_name(key)
+
+    def canonical(self, key):
+        counts = self.names[key]
+        return max(counts, key=counts.get)
+
+    def spellings(self, name):
+        """Every catalogue display name that normalizes to the same key as name"""
+        return sorted(self.names.get(normalize_name(name), ()))
+
+    def lookup(self, name, limit=3, min_score=MIN_SCORE):
+        """
+        Return up to `limit` catalogue matches for name as
+        [{"name", "score", "distance"}], best first.
+        """
+        query = normalize_name(name)
+        if not query:
+            return []
+
+        if query in self.names:
+            return [{"name": self.canonical(query), "score": 1.0, "distance": 0}]
+
+        candidates = set()
+        for variant in deletes(query[:self.prefix_length], self.max_distance):
+            bucket = self.deletes.get(variant)
+            if bucket:
+                candidates |= bucket
+
+        matches = []
+        query_length = len(query)
+        for key in candidates:
+            if abs(len(key) - query_length) > self.max_distance:
+                continue
+            distance = edit_distance(query, key, self.max_distance)
+            if distance > self.max_distance:
+                continue
+            score = 1 - distance / max(len(query), len(key))
+            if score >= min_score:
+                matches.append((score, -distance, key))
+
+        matches.sort(reverse=True)
+        return [
+            {"name": self.canonical(key), "score": round(score, 3), "distance": -neg_distance}
+            for score, neg_distance, key in matches[:limit]
+        ]
+
+    def load(self, conn):
+        """Full rebuild from the medicines table"""
+        self.deletes.clear()
+        self.names.clear()
+        self.rows.clear()
+        self.watermark = 0
+        rows = conn.execute('SELECT id, name, "updatedAt" FROM medicines WHERE "isActive" = 1').fetchall()
+        for medicine_id, name, updated_at in rows:
+            self.add(medicine_id, name)
+            self.watermark = max(self.watermark, updated_at or 0)
+        return len(rows)
+
+    def refresh(self, conn):
+        """
+        Apply rows changed since the last watermark. Deleted rows do not bump
+        updatedAt, so a row-count mismatch afterwards triggers a full rebuild.
+        Returns the number of rows applied.
+        """
+        changed = conn.execute(
+            'SELECT id, name, "isActive", "updatedAt" FROM medicines WHERE "updatedAt" > ? ORDER BY "updatedAt"',
+            (self.watermark,),
+        ).fetchall()
+        for medicine_id, name, is_active, updated_at in changed:
+            if is_active:
+                self.add(medicine_id, name)
+            else:
+                self.remove(medicine_id)
+            self.watermark = max(self.watermark, updated_at)
+
+        active = conn.execute('SELECT COUNT(*) FROM medicines WHERE "isActive" = 1').fetchone()[0]
+        if active != len(self.rows):
+            return self.load(conn)
+        return len(changed)
+
+    @classmethod
+    def from_database(cls, path=None):
+        index = cls()
+        conn = prisma_db.connect(path, readonly=True)
+        try:
+            index.load(conn)
+        finally:
+            conn.close()
+        return index
+
+
+ONSETS = ["", "b", "c", "d", "f", "g", "l", "m", "n", "p", "r", "s", "t", "v", "x", "z", "br", "cl", "pr", "tr", "st", "ph"]
+VOWELS = ["a", "e", "i", "o", "u", "y"]
+CODAS = ["", "", "n", "r", "l", "x", "m", "s"]
+STEMS = [onset + vowel + coda for onset in ONSETS for vowel in VOWELS for coda in CODAS]
+# Common INN stems give the catalogue realistic shared endings
+SUFFIXES = ["cillin", "mycin", "azole", "statin", "pril", "sartan", "olol", "dipine", "prazole", "floxacin", "tidine", "mab", "vir", "profen", "etamol", "formin", "zine", "pam", "oxetine", ""]
+
+
+def synthetic_name(rng):
+    return "".join(rng.choice(STEMS) for _ in range(rng.randint(2, 3))) + rng.choice(SUFFIXES)
+
+
+def misspell(name, rng):
+    """Apply one or two random OCR-like edits"""
+    chars = list(name)
+    for _ in range(rng.randint(1, 2)):
+        op = rng.choice(("sub", "del", "ins", "swap"))
+        i = rng.randrange(len(chars))
+        if op == "sub":
+            chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+        elif op == "del" and len(chars) > 4:
+            del chars[i]
+        elif op == "ins":
+            chars.insert(i, rng.choice("abcdefghijklmnopqrstuvwxyz"))
+        elif op == "swap" and i + 1 < len(chars):
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return "".join(chars)
+
+
+def run_bench(skus, distinct, queries, seed, prefix_length):
+    """
+    Build an index over a synthetic catalogue of `skus` rows drawn from
+    `distinct` product names (the same product is stocked by many
+    pharmacies) and time misspelled lookups.
+    """
+    rng = random.Random(seed)
+    products = [synthetic_name(rng) for _ in range(distinct)]
+    index = MedicineNameIndex(prefix_length=prefix_length)
+
+    started = time.perf_counter()
+    for i in range(skus):
+        index.add(f"sku{i}", rng.choice(products))
+    build_seconds = time.perf_counter() - started
+
+    names = list(index.names)
+    workload = []
+    for _ in range(queries):
+        target = rng.choice(names)
+        workload.append((target, misspell(target, rng)))
+
+    timings = []
+    hits = 0
+    for target, query in workload:
+        started = time.perf_counter()
+        matches = index.lookup(query)
+        timings.append(time.perf_counter() - started)
+        if matches and normalize_name(matches[0]["name"]) == target:
+            hits += 1
+
+    timings.sort()
+    micros = lambda pct: round(timings[min(len(timings) - 1, int(pct / 100 * len(timings)))] * 1e6, 1)
+    return {
+        "skus": skus,
+        "prefixLength": prefix_length,
+        "distinctNames": len(index.names),
+        "deleteEntries": len(index.deletes),
+        "buildSeconds": round(build_seconds, 2),
+        "queries": queries,
+        "top1Accuracy": round(hits / queries, 4),
+        "p50Us": micros(50),
+        "p95Us": micros(95),
+        "p99Us": micros(99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzzy medicine-name lookup against the catalogue")
+    parser.add_argument("names", nargs="*")
+    parser.add_argument("--db", help="SQLite database path (defaults to DATABASE_URL / prisma/dev.db)")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--skus", type=int, default=100000)
+    parser.add_argument("--distinct", type=int, default=20000, help="Distinct product names across the SKUs")
+    parser.add_argument("--prefix-length", type=int, default=PREFIX_LENGTH)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.bench:
+        print(json.dumps(run_bench(args.skus, args.distinct, args.queries, args.seed, args.prefix_length)))
+        return 0
+
+    if not args.names:
+        parser.error("give at least one name or --bench")
+
+    index = MedicineNameIndex.from_database(args.db)
+    print(json.dumps({name: index.lookup(name) for name in args.names}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Full-text search index for the medicine catalogue.
+
+The patient search (GET /api/search/medicines?q=) used to run Prisma
+`contains` on name and description, a LIKE '%q%' scan over every row of
+`medicines`. This tool keeps an SQLite FTS5 index of the active, in-stock
+medicines in a sidecar database (MEDICINE_SEARCH_DB, default
+prisma/search.db) so that `prisma db push` never sees tables missing from
+the schema. The route opens the sidecar read-only, looks up matching ids
+and loads the rows through Prisma, which still applies the isActive/stock
+and pharmacy approval filters, so a slightly stale index never returns a
+wrong medicine. Without the sidecar the route keeps using `contains`.
+
+Two FTS5 tables share one external-content table (`search_rows`, which
+also maps medicine ids to integer rowids):
+
+  medicine_trigram  trigram tokenizer: queries of 3+ characters match any
+                    substring of name or description, case-insensitively,
+                    exactly like the LIKE scan did
+  medicine_prefix   unicode61 words with 1- and 2-character prefix indexes:
+                    shorter queries match words starting with the query
+
+The first sync builds everything in one transaction. Later syncs re-read
+only rows whose updatedAt is at or after the stored watermark (minus a
+small overlap for writes that committed out of order) and apply them
+idempotently; rows that went inactive or out of stock leave the index.
+Hard deletes do not touch updatedAt, so a sync whose row count disagrees
+with the source removes indexed ids that no longer qualify. The sidecar is
+in WAL mode: readers keep their snapshot while a sync writes.
+
+Every sync records its completion time (syncedAt). The route stops using an
+index whose last sync is older than MEDICINE_SEARCH_MAX_AGE_SECONDS (default
+300) and falls back to `contains`, so a stopped --watch never hides newly
+added medicines. Both paths return at most the same number of medicines.
+
+Usage:
+    python medicine_search.py --sync [--watch 5] [--db prisma/dev.db] [--index prisma/search.db]
+    python medicine_search.py <query> [--limit 50]
+    python medicine_search.py --emit-sql <query>
+    python medicine_search.py --bench [--rows 10000,100000,1000000] [--queries 2000]
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+import prisma_db
+from medicine_index import synthetic_name
+
+DEFAULT_INDEX_PATH = os.path.join(prisma_db.PRISMA_DIR, "search.db")
+# Re-read this much history on every sync; upserts are idempotent
+WATERMARK_OVERLAP_MS = 5000
+SYNC_BATCH_SIZE = 5000
+DEFAULT_LIMIT = 500
+MIN_TRIGRAM_LENGTH = 3
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS search_state (key TEXT PRIMARY KEY, value)',
+    'CREATE TABLE IF NOT EXISTS search_rows (rowid INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, name TEXT NOT NULL, description TEXT, "updatedAt" INTEGER NOT NULL)',
+    "CREATE VIRTUAL TABLE IF NOT EXISTS medicine_trigram USING fts5(name, description, content='search_rows', content_rowid='rowid', tokenize='trigram')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS medicine_prefix USING fts5(name, description, content='search_rows', content_rowid='rowid', tokenize='unicode61', prefix='1 2')",
+]
+FTS_TABLES = ("medicine_trigram", "medicine_prefix")
+ELIGIBLE = '"isActive" = 1 AND stock > 0'
+
+
+def index_path(path=None):
+    return path or os.getenv("MEDICINE_SEARCH_DB") or DEFAULT_INDEX_PATH
+
+
+def open_index(path=None, readonly=False):
+    path = index_path(path)
+    if readonly:
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    for statement in SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+def match_query(query):
+    """
+    (FTS table, MATCH expression) for a search string, or None when it has
+    nothing to search for. Mirrored by lib/medicine-search.ts.
+    """
+    query = " ".join(str(query).split())
+    if len(query) >= MIN_TRIGRAM_LENGTH:
+        # One quoted phrase: the trigram table matches it as a substring
+        return "medicine_trigram", '"' + query.replace('"', '""') + '"'
+    words = "".join(ch if ch.isalnum() else " " for ch in query).split()
+    if not words:
+        return None
+    return "medicine_prefix", " ".join(f'"{word}"*' for word in words)
+
+
+def search_sql(query, limit=DEFAULT_LIMIT):
+    """
+    (sql, params) returning the ids of matching medicines. There is no
+    ORDER BY rank: sorting every hit of a common trigram costs more than the
+    scan it replaces, while rowid order lets FTS5 stop after `limit` hits.
+    """
+    match = match_query(query)
+    if match is None:
+        return None
+    table, expression = match
+    sql = (
+        f"SELECT r.id FROM {table} JOIN search_rows r ON r.rowid = {table}.rowid "
+        f"WHERE {table} MATCH ? LIMIT ?"
+    )
+    return sql, [expression, limit]
+
+
+def search(conn, query, limit=DEFAULT_LIMIT):
+    """Ids of indexed medicines matching query"""
+    statement = search_sql(query, limit)
+    if statement is None:
+        return []
+    return [row[0] for row in conn.execute(*statement)]
+
+
+def get_state(conn, key, default=None):
+    row = conn.execute("SELECT value FROM search_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_state(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO search_state (key, value) VALUES (?, ?)", (key, value))
+
+
+def fts_delete(conn, rowid, name, description):
+    # External-content FTS5 needs the old values to remove a row
+    for table in FTS_TABLES:
+        conn.execute(f"INSERT INTO {table} ({table}, rowid, name, description) VALUES ('delete', ?, ?, ?)", (rowid, name, description))
+
+
+def fts_insert(conn, rowid, name, description):
+    for table in FTS_TABLES:
+        conn.execute(f"INSERT INTO {table} (rowid, name, description) VALUES (?, ?, ?)", (rowid, name, description))
+
+
+def rebuild(conn, source):
+    """Replace the whole index with the qualifying rows of source in one transaction"""
+    with conn:
+        for table in FTS_TABLES:
+            conn.execute(f"INSERT INTO {table} ({table}) VALUES ('delete-all')")
+        conn.execute("DELETE FROM search_rows")
+        watermark = 0
+        rows = source.execute(f'SELECT id, name, description, "updatedAt" FROM medicines WHERE {ELIGIBLE}')
+        while True:
+            batch = rows.fetchmany(SYNC_BATCH_SIZE)
+            if not batch:
+                break
+            conn.executemany('INSERT INTO search_rows (id, name, description, "updatedAt") VALUES (?, ?, ?, ?)', batch)
+            watermark = max(watermark, max(row[3] for row in batch))
+        # Bulk-building the FTS tables from the content table beats row-by-row inserts
+        for table in FTS_TABLES:
+            conn.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+        set_state(conn, "watermark", watermark)
+        count = conn.execute("SELECT COUNT(*) FROM search_rows").fetchone()[0]
+    return count
+
+
+def apply_changes(conn, rows):
+    """Upsert or remove (id, name, description, eligible, updatedAt) rows; returns rows changed"""
+    changed = 0
+    for medicine_id, name, description, eligible, updated_at in rows:
+        current = conn.execute("SELECT rowid, name, description FROM search_rows WHERE id = ?", (medicine_id,)).fetchone()
+        if current is not None:
+            rowid, old_name, old_description = current
+            if eligible and (old_name, old_description) == (name, description):
+                conn.execute('UPDATE search_rows SET "updatedAt" = ? WHERE rowid = ?', (updated_at, rowid))
+                continue
+            fts_delete(conn, rowid, old_name, old_description)
+            if eligible:
+                conn.execute('UPDATE search_rows SET name = ?, description = ?, "updatedAt" = ? WHERE rowid = ?',
+                             (name, description, updated_at, rowid))
+                fts_insert(conn, rowid, name, description)
+            else:
+                conn.execute("DELETE FROM search_rows WHERE rowid = ?", (rowid,))
+            changed += 1
+        elif eligible:
+            rowid = conn.execute('INSERT INTO search_rows (id, name, description, "updatedAt") VALUES (?, ?, ?, ?)',
+                                 (medicine_id, name, description, updated_at)).lastrowid
+            fts_insert(conn, rowid, name, description)
+            changed += 1
+    return changed
+
+
+def remove_deleted(conn, source):
+    """Drop indexed ids that no longer qualify in source (hard deletes); returns the count"""
+    stale = []
+    ids = conn.execute("SELECT id FROM search_rows")
+    while True:
+        batch = [row[0] for row in ids.fetchmany(SYNC_BATCH_SIZE)]
+        if not batch:
+            break
+        placeholders = ", ".join("?" for _ in batch)
+        alive = {row[0] for row in source.execute(f"SELECT id FROM medicines WHERE id IN ({placeholders}) AND {ELIGIBLE}", batch)}
+        stale.extend(medicine_id for medicine_id in batch if medicine_id not in alive)
+    with conn:
+        apply_changes(conn, ((medicine_id, None, None, False, 0) for medicine_id in stale))
+    return len(stale)
+
+
+def sync(conn, source):
+    """
+    Bring the index up to date with source. Returns {"mode", "applied",
+    "removed", "rows", "watermark", "seconds"}.
+    """
+    started = time.perf_counter()
+    watermark = get_state(conn, "watermark")
+    if watermark is None:
+        rows = rebuild(conn, source)
+        with conn:
+            set_state(conn, "syncedAt", prisma_db.now_ms())
+        return {"mode": "rebuild", "applied": rows, "removed": 0, "rows": rows,
+                "watermark": get_state(conn, "watermark"), "seconds": round(time.perf_counter() - started, 3)}
+
+    applied = 0
+    cursor = source.execute(
+        f'SELECT id, name, description, ({ELIGIBLE}), "updatedAt" FROM medicines WHERE "updatedAt" >= ? ORDER BY "updatedAt"',
+        (watermark - WATERMARK_OVERLAP_MS,),
+    )
+    while True:
+        batch = cursor.fetchmany(SYNC_BATCH_SIZE)
+        if not batch:
+            break
+        with conn:
+            applied += apply_changes(conn, batch)
+            watermark = max(watermark, batch[-1][4])
+            set_state(conn, "watermark", watermark)
+
+    removed = 0
+    rows = conn.execute("SELECT COUNT(*) FROM search_rows").fetchone()[0]
+    if rows != source.execute(f"SELECT COUNT(*) FROM medicines WHERE {ELIGIBLE}").fetchone()[0]:
+        removed = remove_deleted(conn, source)
+        rows -= removed
+    with conn:
+        set_state(conn, "syncedAt", prisma_db.now_ms())
+    return {"mode": "incremental", "applied": applied, "removed": removed, "rows": rows,
+            "watermark": watermark, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def like_pattern(query):
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def fetch_sql(where):
+    # The route's query: matching active, in-stock medicines of approved pharmacies
+    return (
+        'SELECT m.id, m.name, m.description, m.price, m.unit, m.stock, p.id, p.name '
+        'FROM medicines m JOIN pharmacies p ON p.id = m."pharmacyId" '
+        f'WHERE m."isActive" = 1 AND m.stock > 0 AND p."isApproved" = 1 AND {where}'
+    )
+
+
+def like_search(source, query, limit):
+    pattern = like_pattern(query)
+    sql = fetch_sql("(m.name LIKE ? ESCAPE '\\' OR m.description LIKE ? ESCAPE '\\')") + " LIMIT ?"
+    return source.execute(sql, (pattern, pattern, limit)).fetchall()
+
+
+def indexed_search(conn, source, query, limit):
+    ids = search(conn, query, limit)
+    if not ids:
+        return []
+    placeholders = ", ".join("?" for _ in ids)
+    return source.execute(fetch_sql(f"m.id IN ({placeholders})"), ids).fetchall()
+
+
+DESCRIPTION_WORDS = ["pain relief", "antibiotic", "anti-inflammatory", "acid reducer", "antihistamine", "diabetes",
+                     "blood pressure", "cholesterol", "fever", "cough syrup", "vitamin supplement", "antifungal"]
+
+
+def create_catalogue(path, rows, seed, distinct=20000, pharmacies=200):
+    """A bare medicines/pharmacies database with `rows` synthetic products"""
+    rng = random.Random(seed)
+    products = [synthetic_name(rng).capitalize() for _ in range(distinct)]
+    source = sqlite3.connect(path)
+    source.execute('CREATE TABLE pharmacies (id TEXT PRIMARY KEY, name TEXT NOT NULL, "isApproved" BOOLEAN NOT NULL)')
+    source.execute('CREATE TABLE medicines (id TEXT PRIMARY KEY, "pharmacyId" TEXT NOT NULL, name TEXT NOT NULL, description TEXT, '
+                   'price REAL NOT NULL, unit TEXT NOT NULL, stock INTEGER NOT NULL, "isActive" BOOLEAN NOT NULL, "updatedAt" DATETIME NOT NULL)')
+    source.execute("CREATE INDEX medicines_name_idx ON medicines(name)")
+    with source:
+        source.executemany("INSERT INTO pharmacies VALUES (?, ?, ?)",
+                           ((f"ph{i}", f"Pharmacy {i}", int(rng.random() < 0.95)) for i in range(pharmacies)))
+
+        def medicines():
+            now = prisma_db.now_ms()
+            for i in range(rows):
+                name = rng.choice(products)
+                description = f"{name} {rng.choice(DESCRIPTION_WORDS)}" if rng.random() < 0.7 else None
+                yield (f"med{i}", f"ph{i % pharmacies}", name, description, round(rng.uniform(1, 100), 2), "tablet",
+                       0 if rng.random() < 0.1 else rng.randint(1, 500), int(rng.random() < 0.95), now - rng.randint(0, 365 * 86400000))
+
+        source.executemany("INSERT INTO medicines VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", medicines())
+    return source, products
+
+
+def search_workload(products, queries, rng):
+    """Mostly 3-8 character substrings of catalogue names, plus short prefixes typed so far"""
+    workload = []
+    for _ in range(queries):
+        name = rng.choice(products).lower()
+        if rng.random() < 0.2:
+            workload.append(name[:rng.randint(1, 2)])
+        else:
+            length = min(len(name), rng.randint(3, 8))
+            start = rng.randint(0, len(name) - length)
+            workload.append(name[start:start + length])
+    return workload
+
+
+def run_bench(row_counts, queries, limit, seed):
+    results = []
+    for rows in row_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            source, products = create_catalogue(os.path.join(directory, "source.db"), rows, seed)
+            conn = open_index(os.path.join(directory, "search.db"))
+            build = sync(conn, source)
+            workload = search_workload(products, queries, random.Random(seed + rows))
+
+            timings = {"like": [], "fts": []}
+            compared = agreed = 0
+            for query in workload:
+                started = time.perf_counter()
+                like_rows = like_search(source, query, limit)
+                timings["like"].append(time.perf_counter() - started)
+                started = time.perf_counter()
+                fts_rows = indexed_search(conn, source, query, limit)
+                timings["fts"].append(time.perf_counter() - started)
+                # Substring queries whose full result fits the limit must return the same medicines
+                # (index hits are counted before the approval filter, hence the margin)
+                if len(query) >= MIN_TRIGRAM_LENGTH and len(like_rows) < limit and len(fts_rows) < limit * 0.9:
+                    compared += 1
+                    agreed += {row[0] for row in like_rows} == {row[0] for row in fts_rows}
+
+            # Incremental sync after 1% of the catalogue is toggled active/inactive
+            with source:
+                source.execute('UPDATE medicines SET "isActive" = 1 - "isActive", "updatedAt" = ? WHERE rowid % 100 = 0',
+                               (prisma_db.now_ms(),))
+            incremental = sync(conn, source)
+            conn.close()
+            source.close()
+
+        report = {"rows": rows, "indexedRows": build["rows"], "buildSeconds": build["seconds"],
+                  "incrementalSeconds": incremental["seconds"], "queries": queries, "limit": limit,
+                  "comparedQueries": compared, "resultAgreement": round(agreed / compared, 4) if compared else None}
+        for kind, values in timings.items():
+            values.sort()
+            for pct in (50, 95, 99):
+                report[f"{kind}P{pct}Ms"] = round(values[min(len(values) - 1, int(pct / 100 * len(values)))] * 1000, 2)
+        report["p99Speedup"] = round(report["likeP99Ms"] / report["ftsP99Ms"], 1) if report["ftsP99Ms"] else None
+        results.append(report)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FTS5 search index over the medicine catalogue")
+    parser.add_argument("query", nargs="?")
+    parser.add_argument("--db", help="SQLite database path (defaults to DATABASE_URL / prisma/dev.db)")
+    parser.add_argument("--index", help=f"Search index path (default MEDICINE_SEARCH_DB or {DEFAULT_INDEX_PATH})")
+    parser.add_argument("--sync", action="store_true", help="Build or incrementally update the index")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from scratch")
+    parser.add_argument("--watch", type=float, help="With --sync, keep syncing every N seconds")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    parser.add_argument("--emit-sql", action="store_true", help="Print the SQL and parameters for the query instead of running it")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--rows", default="10000,100000,1000000", help="Comma-separated catalogue sizes for --bench")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.bench:
+        for report in run_bench([int(n) for n in args.rows.split(",")], args.queries, args.limit, args.seed):
+            print(json.dumps(report), flush=True)
+        return 0
+
+    if args.emit_sql:
+        if not args.query:
+            parser.error("--emit-sql needs a query")
+        statement = search_sql(args.query, args.limit)
+        print(json.dumps({"sql": statement[0], "params": statement[1]} if statement else None))
+        return 0
+
+    if args.sync or args.rebuild:
+        conn = open_index(args.index)
+        source = prisma_db.connect(args.db, readonly=True)
+        try:
+            if args.rebuild:
+                with conn:
+                    conn.execute("DELETE FROM search_state WHERE key = 'watermark'")
+            while True:
+                print(json.dumps(sync(conn, source)), flush=True)
+                if not args.watch:
+                    return 0
+                time.sleep(args.watch)
+        except KeyboardInterrupt:
+            return 0
+        finally:
+            source.close()
+            conn.close()
+
+    if not args.query:
+        parser.error("give a query, --sync, --emit-sql or --bench")
+
+    conn = open_index(args.index, readonly=True)
+    try:
+        print(json.dumps(search(conn, args.query, args.limit)))
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
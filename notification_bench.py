@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Notification and email throughput benchmark.
+
+lib/notifications.ts writes one `notifications` row per createNotification
+and sends every email inline through a single nodemailer transporter, so a
+slow mail relay stalls the request that triggered the notification. This
+harness runs a local SMTP sink (aiosmtpd) with a configurable per-message
+delay, standing in for a remote relay, and drives the order and delivery
+flows at volume (--flows):
+
+  accept       PUT /api/deliveries/[id]/accept as a delivery partner, which
+               notifies the patient and the pharmacy (two rows and two
+               emails per request)
+  order        PUT /api/orders/[id] as the pharmacy, moving PROCESSING
+               orders to READY_FOR_DELIVERY: the order-peak path. The route
+               does not call notifyOrderUpdate yet, so today this phase
+               measures the order latency without email; once it notifies,
+               the same phases show what the email adds
+
+Lab flows are not driven: no lab route sends notifications in this tree.
+
+Each --smtp-latency value is one phase per flow. Per phase it reports:
+
+  endpoint     request latency percentiles and the p50/p99 inflation over
+               the flow's first phase, i.e. what the email cost adds
+  database     notification rows written per second, mean and peak over
+               1 s windows, sampled from the table's max rowid
+  smtp         messages and connections seen by the sink, and the time from
+               EHLO to the end of DATA per message (the sender's send time,
+               minus TCP connect)
+
+A change such as batching or queueing emails should flatten the endpoint
+latency across phases while the sink still receives every message.
+
+Start the Next.js server against the sink, e.g.
+
+    SMTP_HOST=127.0.0.1 SMTP_PORT=2525 SMTP_USER=bench SMTP_PASS=bench npm run dev
+
+The sink accepts any credentials without TLS. The harness registers a
+patient, a pharmacy and --partners delivery partners through the API, then
+seeds READY_FOR_DELIVERY orders with PENDING deliveries, and PROCESSING
+orders for the order flow (ids starting with "<tag>-"), directly into the
+database; --reset removes them, the deliveries the order flow created and
+the notifications of the benchmark accounts.
+
+Needs the optional aiosmtpd package.
+
+Usage:
+    python notification_bench.py --base-url http://localhost:3000 [--smtp-latency 0,250,1000] [--flows accept,order] [--requests 200] [--concurrency 20]
+    python notification_bench.py --sink [--smtp-port 2525] [--smtp-latency 250]
+    python notification_bench.py --reset [--tag ntf]
+"""
+import sys
+import json
+import time
+import uuid
+import queue
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from load_test import LatencyRecorder, RecordingSession
+from lab_booking_stress_test import login
+from synthetic_data import bulk_insert
+import prisma_db
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+except ImportError:
+    Controller = None
+
+PASSWORD = "test123"
+SEED_BATCH_SIZE = 1000
+
+# flow -> emails each successful request sends
+EMAILS_PER_REQUEST = {"accept": 2, "order": 0}
+
+
+def is_available():
+    return Controller is not None
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(pct / 100 * len(values)))] * 1000, 1)
+
+
+class SmtpSink:
+    """aiosmtpd handler that delays every message by `latency` seconds and times it"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connections = 0
+            self.messages = 0
+            self.bytes = 0
+            self.send_times = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        session.bench_started = time.perf_counter()
+        with self._lock:
+            self.connections += 1
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        elapsed = time.perf_counter() - getattr(session, "bench_started", time.perf_counter())
+        with self._lock:
+            self.messages += 1
+            self.bytes += len(envelope.content or b"")
+            self.send_times.append(elapsed)
+        return "250 Message accepted for delivery"
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "smtpMessages": self.messages,
+                "smtpConnections": self.connections,
+                "smtpBytes": self.bytes,
+                "smtpSendP50Ms": percentile(self.send_times, 50),
+                "smtpSendP95Ms": percentile(self.send_times, 95),
+                "smtpSendP99Ms": percentile(self.send_times, 99),
+            }
+
+
+def accept_any(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+def start_sink(host, port, latency):
+    # aiosmtpd logs a deprecation warning on every successful AUTH
+    logging.getLogger("mail.log").setLevel(logging.ERROR)
+    sink = SmtpSink(latency)
+    controller = Controller(sink, hostname=host, port=port, authenticator=accept_any, auth_require_tls=False)
+    controller.start()
+    return sink, controller
+
+
+class WriteRateMonitor:
+    """Samples notifications' max rowid; rowids only grow while nothing is deleted"""
+
+    def __init__(self, db_path, interval=0.1):
+        self.db_path = db_path
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self, conn):
+        try:
+            while not self._stop.wait(self.interval):
+                self.sample(conn)
+            self.sample(conn)
+        finally:
+            conn.close()
+
+    def sample(self, conn):
+        self.samples.append((time.monotonic(), conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM notifications").fetchone()[0]))
+
+    def start(self):
+        # The baseline is taken before start() returns, so no early write is missed
+        conn = prisma_db.connect(self.db_path, readonly=True)
+        self.samples = []
+        self.sample(conn)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(conn,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        if len(self.samples) < 2:
+            return {"notificationsWritten": 0, "dbWritesPerSecond": None, "peakDbWritesPerSecond": None}
+        (first_at, first), (last_at, last) = self.samples[0], self.samples[-1]
+        peak = 0
+        start = 0
+        for end in range(len(self.samples)):
+            while self.samples[end][0] - self.samples[start][0] > 1.0:
+                start += 1
+            window = self.samples[end][0] - self.samples[start][0]
+            if window >= 0.5:
+                peak = max(peak, (self.samples[end][1] - self.samples[start][1]) / window)
+        return {
+            "notificationsWritten": last - first,
+            "dbWritesPerSecond": round((last - first) / (last_at - first_at), 1) if last_at > first_at else None,
+            "peakDbWritesPerSecond": round(peak, 1),
+        }
+
+
+def register(base_url, email, role, **fields):
+    response = requests.post(
+        f"{base_url}/api/auth/register",
+        json={"name": email.split("@")[0], "email": email, "password": PASSWORD, "confirmPassword": PASSWORD, "role": role, **fields},
+        timeout=30,
+    )
+    # 400 when the account already exists from an earlier run
+    return response.status_code in [200, 201, 400]
+
+
+def create_accounts(args):
+    """
+    Register the patient, pharmacy and partner accounts; returns
+    {flow: logged-in sessions}, partners for accept and the pharmacy for order.
+    """
+    patient_email = f"{args.tag}-patient@test.com"
+    pharmacy_email = f"{args.tag}-pharmacy@test.com"
+    register(args.base_url, patient_email, "PATIENT")
+    register(args.base_url, pharmacy_email, "PHARMACY", pharmacyName="Notification Bench Pharmacy",
+             address="1 Main St, Colombo", phone="0110000000", license=f"{args.tag}-license")
+
+    placeholder = LatencyRecorder()
+    sessions = {"accept": [], "order": []}
+    for i in range(args.partners):
+        email = f"{args.tag}-partner-{i}@test.com"
+        register(args.base_url, email, "DELIVERY_PARTNER", vehicleType="bike", licenseNumber=f"{args.tag}-{i}",
+                 phone="0770000000", address="2 Lake Rd, Kandy")
+        session = RecordingSession(placeholder, pool_size=2, timeout=args.timeout)
+        if login(session, args.base_url, email, PASSWORD):
+            sessions["accept"].append(session)
+        # As many pharmacy sessions as partner ones, so both flows spread their load alike
+        session = RecordingSession(placeholder, pool_size=2, timeout=args.timeout)
+        if login(session, args.base_url, pharmacy_email, PASSWORD):
+            sessions["order"].append(session)
+    return patient_email, pharmacy_email, sessions
+
+
+def seed_flow(conn, flow, tag, patient_email, pharmacy_email, count):
+    """
+    Insert `count` orders for one phase of a flow: READY_FOR_DELIVERY with
+    PENDING deliveries for accept (returns the delivery ids), PROCESSING for
+    order (returns the order ids).
+    """
+    patient = conn.execute('SELECT p.id, u.id FROM patients p JOIN users u ON u.id = p."userId" WHERE u.email = ?', (patient_email,)).fetchone()
+    pharmacy = conn.execute('SELECT p.id, p.address FROM pharmacies p JOIN users u ON u.id = p."userId" WHERE u.email = ?', (pharmacy_email,)).fetchone()
+    if not patient or not pharmacy:
+        raise RuntimeError("Benchmark patient or pharmacy is missing; is the server using this database?")
+    (patient_id, user_id), (pharmacy_id, pickup) = patient, pharmacy
+
+    run = uuid.uuid4().hex[:8]
+    now = prisma_db.now_ms()
+    orders = [{
+        "id": f"{tag}-order-{run}-{i}", "userId": user_id, "patientId": patient_id, "pharmacyId": pharmacy_id,
+        "orderType": "DIRECT", "status": "READY_FOR_DELIVERY" if flow == "accept" else "PROCESSING",
+        "totalAmount": 20.0, "commissionRate": 0.05,
+        "commissionAmount": 1.0, "netAmount": 19.0, "deliveryAddress": "3 Hill St, Galle", "createdAt": now, "updatedAt": now,
+    } for i in range(count)]
+    bulk_insert(conn, "orders", orders, SEED_BATCH_SIZE)
+    if flow == "order":
+        return [order["id"] for order in orders]
+
+    deliveries = [{
+        "id": f"{tag}-delivery-{run}-{i}", "orderId": order["id"], "pickupAddress": pickup, "deliveryAddress": order["deliveryAddress"],
+        "status": "PENDING", "deliveryFee": 4.99, "createdAt": now, "updatedAt": now,
+    } for i, order in enumerate(orders)]
+    bulk_insert(conn, "deliveries", deliveries, SEED_BATCH_SIZE)
+    return [delivery["id"] for delivery in deliveries]
+
+
+def reset(conn, tag):
+    with conn:
+        return {
+            "notifications": conn.execute('DELETE FROM notifications WHERE "userId" IN (SELECT id FROM users WHERE email LIKE ?)',
+                                          (f"{tag}-%@test.com",)).rowcount,
+            # The order flow's deliveries are created by the route, with generated ids
+            "deliveries": conn.execute('DELETE FROM deliveries WHERE id LIKE ? OR "orderId" LIKE ?',
+                                       (f"{tag}-%", f"{tag}-%")).rowcount,
+            "orders": conn.execute("DELETE FROM orders WHERE id LIKE ?", (f"{tag}-%",)).rowcount,
+        }
+
+
+def send(args, flow, session, target_id):
+    if flow == "accept":
+        return session.put(f"{args.base_url}/api/deliveries/{target_id}/accept")
+    return session.put(f"{args.base_url}/api/orders/{target_id}", json={"status": "READY_FOR_DELIVERY"})
+
+
+def run_phase(args, flow, latency_ms, sink, sessions, target_ids, monitor):
+    work = queue.Queue()
+    for target_id in target_ids:
+        work.put(target_id)
+    lock = threading.Lock()
+    latencies = []
+    statuses = {}
+
+    def worker(index):
+        session = sessions[index % len(sessions)]
+        while True:
+            try:
+                target_id = work.get_nowait()
+            except queue.Empty:
+                return
+            started = time.perf_counter()
+            try:
+                status = send(args, flow, session, target_id).status_code
+            except requests.RequestException:
+                status = "error"
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    sink.latency = latency_ms / 1000
+    sink.reset()
+    monitor.start()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.concurrency)))
+    elapsed = time.monotonic() - started
+    # The routes await their notifications before responding, so this only
+    # matters for a queued or batched sender still writing after the last response
+    time.sleep(args.settle)
+    writes = monitor.stop()
+
+    errors = sum(n for status, n in statuses.items() if status == "error" or status >= 500)
+    return {
+        "flow": flow,
+        "smtpLatencyMs": latency_ms,
+        "requests": len(target_ids),
+        "concurrency": args.concurrency,
+        "elapsedSeconds": round(elapsed, 2),
+        "requestsPerSecond": round(len(target_ids) / elapsed, 2) if elapsed else None,
+        "p50Ms": percentile(latencies, 50),
+        "p95Ms": percentile(latencies, 95),
+        "p99Ms": percentile(latencies, 99),
+        "maxMs": percentile(latencies, 100),
+        "errorRate": round(errors / len(latencies), 4) if latencies else None,
+        "statuses": {str(status): n for status, n in statuses.items()},
+        **writes,
+        "emailsExpected": EMAILS_PER_REQUEST[flow] * statuses.get(200, 0),
+        **sink.snapshot(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notification and email throughput benchmark")
+    parser.add_argument("--base-url", default="http://localhost:3000")
+    parser.add_argument("--db", help="SQLite database path (defaults to DATABASE_URL / prisma/dev.db)")
+    parser.add_argument("--smtp-host", default="127.0.0.1")
+    parser.add_argument("--smtp-port", type=int, default=2525)
+    parser.add_argument("--smtp-latency", default="0,250,1000", help="Comma-separated per-message SMTP delays in ms, one phase each")
+    parser.add_argument("--flows", default="accept,order", help="Comma-separated flows to drive: accept, order")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per phase")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--partners", type=int, default=20, help="Delivery partner accounts to sign in")
+    parser.add_argument("--settle", type=float, default=1.0, help="Seconds to wait for trailing writes after each phase")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--tag", default="ntf", help="Prefix of benchmark accounts and seeded rows")
+    parser.add_argument("--sink", action="store_true", help="Only run the SMTP sink and print its stats every --report-interval")
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    parser.add_argument("--reset", action="store_true", help="Delete seeded orders, deliveries and benchmark notifications and exit")
+    args = parser.parse_args()
+
+    db_path = args.db or prisma_db.database_path()
+    if args.reset:
+        conn = prisma_db.connect(db_path)
+        try:
+            print(json.dumps({"deleted": reset(conn, args.tag)}))
+        finally:
+            conn.close()
+        return 0
+
+    if not is_available():
+        parser.error("aiosmtpd is not installed (pip install aiosmtpd)")
+    latencies = [float(value) for value in args.smtp_latency.split(",")]
+    flows = args.flows.split(",")
+    if any(flow not in EMAILS_PER_REQUEST for flow in flows):
+        parser.error(f"--flows takes {', '.join(EMAILS_PER_REQUEST)}")
+    sink, controller = start_sink(args.smtp_host, args.smtp_port, latencies[0] / 1000)
+    try:
+        if args.sink:
+            print(f"📮 SMTP sink on {args.smtp_host}:{args.smtp_port}, {latencies[0]:g} ms per message", flush=True)
+            while True:
+                time.sleep(args.report_interval)
+                print(json.dumps(sink.snapshot()), flush=True)
+
+        print(f"🧪 Notification benchmark against {args.base_url}, SMTP sink on {args.smtp_host}:{args.smtp_port}", flush=True)
+        patient_email, pharmacy_email, sessions = create_accounts(args)
+        for flow in flows:
+            if not sessions[flow]:
+                print(f"❌ Could not sign in any {'delivery partner' if flow == 'accept' else 'pharmacy'} session")
+                return 1
+
+        conn = prisma_db.connect(db_path)
+        try:
+            phases = [(latency_ms, flow, seed_flow(conn, flow, args.tag, patient_email, pharmacy_email, args.requests))
+                      for latency_ms in latencies for flow in flows]
+        finally:
+            conn.close()
+
+        monitor = WriteRateMonitor(db_path)
+        baselines = {}
+        for latency_ms, flow, target_ids in phases:
+            result = run_phase(args, flow, latency_ms, sink, sessions[flow], target_ids, monitor)
+            baseline = baselines.setdefault(flow, result)
+            for pct in ("p50Ms", "p99Ms"):
+                if result[pct] is not None and baseline[pct] is not None:
+                    result[f"inflation{pct[0].upper()}{pct[1:]}"] = round(result[pct] - baseline[pct], 1)
+            if result["emailsExpected"] and not result["smtpMessages"]:
+                result["warning"] = "no email reached the sink; start the server with SMTP_HOST/SMTP_PORT/SMTP_USER/SMTP_PASS pointing at it"
+            print(json.dumps(result), flush=True)
+        return 0
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+OCR backend selection: local CPU engine first, LLM on escalation.
+
+BackendRouter runs the offline backend (local_ocr: PDF text layers or
+Tesseract plus rule-based extraction) and accepts its result when the
+combined OCR and extraction confidence reaches OCR_LOCAL_MIN_CONFIDENCE. Otherwise
+it escalates to the LLM, unless the LLM is unavailable (no API key) or its
+expected latency would blow the job's latency budget; then the local result
+is returned flagged as low confidence. A failing LLM call also falls back to
+a usable local result instead of failing the prescription.
+
+OCR_BACKEND selects the mode: "auto" (default), "local" (never call the
+LLM) or "llm" (never run the local engine).
+"""
+import os
+import time
+import asyncio
+
+import local_ocr
+
+BACKEND_MODES = ("auto", "local", "llm")
+
+
+class LocalOcrBackend:
+    name = "local"
+
+    def __init__(self, index_provider=None):
+        # Called lazily so the catalogue index is only loaded when needed
+        self.index_provider = index_provider
+
+    def supports(self, mime_type):
+        return local_ocr.supports(mime_type)
+
+    def _extract(self, file_path, mime_type):
+        recognized = local_ocr.recognize(file_path, mime_type)
+        index = None
+        if self.index_provider is not None:
+            try:
+                index = self.index_provider()
+            except Exception:
+                index = None
+        medicines, extraction_confidence = local_ocr.extract_medicines_from_text(recognized["text"], index)
+        return {
+            "medicines": medicines,
+            "extractedText": recognized["text"],
+            "engine": recognized["engine"],
+            "ocrConfidence": round(recognized["confidence"], 3),
+            "confidence": round(recognized["confidence"] * extraction_confidence, 3),
+        }
+
+    async def extract(self, file_path, mime_type):
+        # Tesseract is CPU-bound; keep the event loop free for other jobs
+        return await asyncio.to_thread(self._extract, file_path, mime_type)
+
+
+class BackendRouter:
+    def __init__(self, local, mode="auto", min_confidence=0.8, latency_budget=None, llm_latency_estimate=None):
+        if mode not in BACKEND_MODES:
+            raise ValueError(f"OCR_BACKEND must be one of {', '.join(BACKEND_MODES)}")
+        self.local = local
+        self.mode = mode
+        self.min_confidence = min_confidence
+        self.latency_budget = latency_budget
+        # Callable returning the expected LLM seconds, or None when unknown
+        self.llm_latency_estimate = llm_latency_estimate
+        self.stats = {"local": 0, "llm": 0, "escalated": 0, "lowConfidence": 0, "llmFallbacks": 0}
+
+    @classmethod
+    def from_env(cls, local, llm_latency_estimate=None):
+        budget_ms = float(os.getenv("OCR_LATENCY_BUDGET_MS", "0"))
+        return cls(
+            local,
+            mode=os.getenv("OCR_BACKEND", "auto").lower(),
+            min_confidence=float(os.getenv("OCR_LOCAL_MIN_CONFIDENCE", "0.8")),
+            latency_budget=budget_ms / 1000 if budget_ms > 0 else None,
+            llm_latency_estimate=llm_latency_estimate,
+        )
+
+    def can_run_local(self, mime_type):
+        return self.mode != "llm" and self.local.supports(mime_type)
+
+    def llm_fits_budget(self, started):
+        if self.latency_budget is None or self.llm_latency_estimate is None:
+            return True
+        expected = self.llm_latency_estimate()
+        if expected is None:
+            return True
+        return time.perf_counter() - started + expected <= self.latency_budget
+
+    async def extract(self, file_path, mime_type, llm_extract, timings):
+        """
+        Route one document. llm_extract is a zero-argument coroutine function
+        running the LLM pipeline, or None when the LLM cannot be used.
+        Returns the result dict with "backend" set to "local" or "llm".
+        """
+        started = time.perf_counter()
+        local_result = None
+        if self.can_run_local(mime_type):
+            try:
+                with timings.stage("local"):
+                    local_result = await self.local.extract(file_path, mime_type)
+            except Exception:
+                if llm_extract is None or self.mode == "local":
+                    raise
+                timings.add("localErrors", 1)
+
+        if local_result is not None:
+            accept = local_result["confidence"] >= self.min_confidence
+            if not accept and (self.mode == "local" or llm_extract is None or not self.llm_fits_budget(started)):
+                local_result["lowConfidence"] = True
+                self.stats["lowConfidence"] += 1
+                accept = True
+            if accept:
+                self.stats["local"] += 1
+                return {**local_result, "backend": "local"}
+
+        if llm_extract is None:
+            raise RuntimeError(f"No OCR backend available for {mime_type}")
+
+        if local_result is not None:
+            self.stats["escalated"] += 1
+        try:
+            result = await llm_extract()
+        except Exception as e:
+            # Keep the prescription moving with whatever the local engine found
+            if local_result is not None and local_result["medicines"]:
+                self.stats["llmFallbacks"] += 1
+                return {**local_result, "backend": "local", "lowConfidence": True, "llmError": str(e)}
+            raise
+
+        self.stats["llm"] += 1
+        result["backend"] = "llm"
+        if local_result is not None:
+            result["escalatedFrom"] = {"backend": "local", "confidence": local_result["confidence"]}
+        return result
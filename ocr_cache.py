@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache for OCR results.
+
+Entries are keyed by the SHA-256 of the prescription file bytes together with
+the mime type and the prompt/model version, so re-uploads of the same file
+skip the LLM call. Storage is a single SQLite file with LRU eviction bounded
+by total payload size and a TTL on each entry.
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import mmap
+import hashlib
+import threading
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ocr_cache", "results.db")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """Return the hex SHA-256 of a file, hashed from a memory map without copying it"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return digest.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, size, HASH_CHUNK_SIZE):
+                    digest.update(view[offset:offset + HASH_CHUNK_SIZE])
+            finally:
+                view.release()
+    return digest.hexdigest()
+
+
+def cache_key(file_hash: str, mime_type: str, version: str) -> str:
+    """Build the cache key from file content hash, mime type and prompt/model version"""
+    return hashlib.sha256(f"{file_hash}\0{mime_type}\0{version}".encode()).hexdigest()
+
+
+class OcrResultCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries(accessed_at)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @classmethod
+    def from_env(cls):
+        """Create a cache from OCR_CACHE_* environment variables, or None if disabled"""
+        if os.getenv("OCR_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+            return None
+        return cls(
+            path=os.getenv("OCR_CACHE_PATH", DEFAULT_CACHE_PATH),
+            max_bytes=int(os.getenv("OCR_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES))),
+            ttl_seconds=int(os.getenv("OCR_CACHE_TTL_SECONDS", str(DEFAULT_TTL_SECONDS))),
+        )
+
+    def _bump(self, name, amount=1):
+        self.conn.execute(
+            "INSERT INTO stats(name, value) VALUES(?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def get(self, key):
+        """Return the cached result dict for key, or None on miss/expiry"""
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT result, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._bump("misses")
+                return None
+
+            result, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._bump("expired")
+                self._bump("misses")
+                return None
+
+            self.conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._bump("hits")
+        return json.loads(result)
+
+    def put(self, key, result):
+        """Store a result dict and evict least-recently-used entries over the size bound"""
+        payload = json.dumps(result, separators=(",", ":"))
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries(key, result, size, created_at, accessed_at) VALUES(?, ?, ?, ?, ?)",
+                    (key, payload, len(payload), now, now),
+                )
+                self._evict()
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY accessed_at ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        if evicted:
+            self._bump("evictions", evicted)
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current size"""
+        with self._lock:
+            counters = dict(self.conn.execute("SELECT name, value FROM stats").fetchall())
+            entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "expired": counters.get("expired", 0),
+            "entries": entries,
+            "bytes": total,
+            "maxBytes": self.max_bytes,
+        }
+
+    def render_metrics(self):
+        """Render cache counters in Prometheus/OpenMetrics text format"""
+        s = self.stats()
+        lines = [
+            "# TYPE ocr_cache_hits counter",
+            f"ocr_cache_hits_total {s['hits']}",
+            "# TYPE ocr_cache_misses counter",
+            f"ocr_cache_misses_total {s['misses']}",
+            "# TYPE ocr_cache_evictions counter",
+            f"ocr_cache_evictions_total {s['evictions']}",
+            "# TYPE ocr_cache_expired counter",
+            f"ocr_cache_expired_total {s['expired']}",
+            "# TYPE ocr_cache_entries gauge",
+            f"ocr_cache_entries {s['entries']}",
+            "# TYPE ocr_cache_bytes gauge",
+            f"ocr_cache_bytes {s['bytes']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def main():
+    """Print cache stats as JSON, or as OpenMetrics text with --metrics"""
+    cache = OcrResultCache.from_env()
+    if cache is None:
+        print(json.dumps({"success": False, "error": "OCR cache is disabled"}))
+        return 1
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--metrics":
+        sys.stdout.write(cache.render_metrics())
+    else:
+        print(json.dumps(cache.stats()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate prescription index for OCR results.
+
+The exact-hash result cache misses the same prescription photographed twice
+at a slightly different angle, distance or exposure. This index keys OCR
+results by perceptual hashes of the paper region instead: a 64-bit pHash
+(low-frequency DCT signs) to find candidates and a 64-bit dHash (gradient
+signs) plus a 16x16 thumbnail to verify them. All image work is vectorized
+NumPy on a reduced JPEG decode, so hashing a phone photo costs a few
+milliseconds.
+
+Lookups use multi-index hashing: the pHash is split into four 16-bit
+substrings, each kept in a sorted table. By the pigeonhole principle any
+code within Hamming distance r of the query matches it in at least one
+substring to within r // 4 bits, so a lookup probes a handful of exact
+substring values per table with binary search and only computes full
+Hamming distances for those candidates. Recent additions sit in a small
+unsorted tail that is scanned linearly and merged into the tables when it
+fills up. Millions of entries stay well under a millisecond per lookup.
+
+A candidate is reused only when its pHash is within OCR_DEDUP_RADIUS, its
+dHash within twice that, its aspect ratio within 15% and its thumbnail
+correlates at OCR_DEDUP_MIN_CORRELATION or better.
+
+None of these signals resolves handwriting: two different prescriptions
+written on the same printed pad or letterhead hash and correlate almost
+like re-photographs of one sheet, and reuse is not scoped to a patient.
+The index is therefore off unless OCR_DEDUP_ENABLED=1, for deployments
+where that trade-off is acceptable; OCR_DEDUP_DISABLED=1 still forces it
+off.
+
+Requires Pillow and NumPy; from_env() returns None without them.
+
+Usage:
+    python ocr_dedup.py <image_path> [<image_path> ...]
+    python ocr_dedup.py --bench [--entries 1000000] [--radius 6]
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from itertools import combinations
+
+try:
+    import numpy as np
+    from PIL import Image, ImageOps
+except ImportError:
+    np = None
+    Image = None
+
+from image_preprocess import document_bbox, otsu_threshold, PREPROCESSABLE_MIME_TYPES
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ocr_cache", "near_duplicates.db")
+DEFAULT_RADIUS = 6
+DEFAULT_MIN_CORRELATION = 0.9
+MAX_ASPECT_DIFFERENCE = 0.15
+
+HASH_BITS = 64
+SUBSTRINGS = 4
+SUBSTRING_BITS = HASH_BITS // SUBSTRINGS
+SUBSTRING_MASK = (1 << SUBSTRING_BITS) - 1
+PENDING_LIMIT = 4096
+
+# JPEG draft decoding and paper detection work at this resolution
+DECODE_SIDE = 512
+DCT_SIZE = 32
+LOW_FREQUENCIES = 8
+THUMBNAIL_SIDE = 16
+
+
+def is_available():
+    return np is not None
+
+
+def dct_matrix(size):
+    """Orthonormal DCT-II basis, so the 2-D DCT is M @ X @ M.T"""
+    k = np.arange(size)
+    matrix = np.sqrt(2 / size) * np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * size))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.astype(np.uint8)).tobytes(), "big")
+
+
+def popcount(values):
+    """Set bits per element of a uint64 array"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return table[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def to_signed(code):
+    """SQLite integers are signed 64-bit"""
+    return code - (1 << 64) if code >= 1 << 63 else code
+
+
+def image_fingerprint(file_path):
+    """
+    Perceptual fingerprint of the paper region of an image:
+    {"phash", "dhash", "aspect", "thumbnail"} with the thumbnail as
+    THUMBNAIL_SIDE² uint8 bytes.
+    """
+    with Image.open(file_path) as source:
+        # JPEGs decode straight at a fraction of their size
+        source.draft("L", (DECODE_SIDE, DECODE_SIDE))
+        image = ImageOps.exif_transpose(source).convert("L")
+    image.thumbnail((DECODE_SIDE, DECODE_SIDE))
+
+    pixels = np.asarray(image)
+    bbox = document_bbox(pixels, otsu_threshold(pixels))
+    if bbox:
+        image = image.crop(bbox)
+
+    small = np.asarray(image.resize((DCT_SIZE, DCT_SIZE), Image.BILINEAR), dtype=np.float64)
+    basis = dct_matrix(DCT_SIZE)
+    low = (basis @ small @ basis.T)[:LOW_FREQUENCIES, :LOW_FREQUENCIES].ravel()
+    # The DC term only encodes brightness; leave it out of the median
+    phash = bits_to_int(low > np.median(low[1:]))
+
+    gradient = np.asarray(image.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    dhash = bits_to_int(gradient[:, 1:] > gradient[:, :-1])
+
+    thumbnail = np.asarray(image.resize((THUMBNAIL_SIDE, THUMBNAIL_SIDE), Image.BILINEAR), dtype=np.uint8)
+    return {
+        "phash": phash,
+        "dhash": dhash,
+        "aspect": image.width / image.height,
+        "thumbnail": thumbnail.tobytes(),
+    }
+
+
+def thumbnail_correlation(a, b):
+    x = np.frombuffer(a, dtype=np.uint8).astype(np.float64)
+    y = np.frombuffer(b, dtype=np.uint8).astype(np.float64)
+    x -= x.mean()
+    y -= y.mean()
+    denominator = np.sqrt((x * x).sum() * (y * y).sum())
+    return float((x * y).sum() / denominator) if denominator else 0.0
+
+
+class MultiIndexHash:
+    """In-memory multi-index hashing over 64-bit codes with integer ids"""
+
+    def __init__(self):
+        self.codes = np.empty(0, dtype=np.uint64)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.tables = []
+        self.pending_codes = np.empty(PENDING_LIMIT, dtype=np.uint64)
+        self.pending_ids = np.empty(PENDING_LIMIT, dtype=np.int64)
+        self.pending = 0
+        self._build()
+
+    def __len__(self):
+        return len(self.codes) + self.pending
+
+    def _build(self):
+        # One (sorted substring values, row order) pair per substring
+        self.tables = []
+        for t in range(SUBSTRINGS):
+            keys = ((self.codes >> np.uint64(t * SUBSTRING_BITS)) & np.uint64(SUBSTRING_MASK)).astype(np.uint16)
+            order = np.argsort(keys, kind="stable")
+            self.tables.append((keys[order], order))
+
+    def add_many(self, ids, codes):
+        self._merge()
+        self.codes = np.concatenate([self.codes, np.asarray(codes, dtype=np.uint64)])
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self._build()
+
+    def add(self, entry_id, code):
+        if self.pending == PENDING_LIMIT:
+            self._merge()
+        self.pending_codes[self.pending] = code
+        self.pending_ids[self.pending] = entry_id
+        self.pending += 1
+
+    def _merge(self):
+        if self.pending:
+            self.codes = np.concatenate([self.codes, self.pending_codes[:self.pending]])
+            self.ids = np.concatenate([self.ids, self.pending_ids[:self.pending]])
+            self.pending = 0
+            self._build()
+
+    def search(self, code, radius):
+        """Ids and distances of every code within `radius` bits, nearest first"""
+        query = np.uint64(code)
+        sub_radius = radius // SUBSTRINGS
+        flips = [0]
+        for r in range(1, sub_radius + 1):
+            flips += [sum(1 << bit for bit in bits) for bits in combinations(range(SUBSTRING_BITS), r)]
+        flips = np.array(flips, dtype=np.uint16)
+
+        rows = []
+        for t, (keys, order) in enumerate(self.tables):
+            probes = np.uint16((code >> (t * SUBSTRING_BITS)) & SUBSTRING_MASK) ^ flips
+            lo = np.searchsorted(keys, probes, side="left")
+            hi = np.searchsorted(keys, probes, side="right")
+            rows += [order[l:h] for l, h in zip(lo, hi) if h > l]
+
+        found_ids, found_distances = [], []
+        if rows:
+            candidates = np.unique(np.concatenate(rows))
+            distances = popcount(self.codes[candidates] ^ query)
+            near = distances <= radius
+            found_ids.append(self.ids[candidates[near]])
+            found_distances.append(distances[near])
+        if self.pending:
+            distances = popcount(self.pending_codes[:self.pending] ^ query)
+            near = distances <= radius
+            found_ids.append(self.pending_ids[:self.pending][near])
+            found_distances.append(distances[near])
+        if not found_ids:
+            return [], []
+
+        ids = np.concatenate(found_ids)
+        distances = np.concatenate(found_distances)
+        order = np.argsort(distances, kind="stable")
+        return ids[order].tolist(), distances[order].tolist()
+
+
+class NearDuplicateIndex:
+    """Perceptual-hash index of OCR results, persisted in SQLite"""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, version="", radius=DEFAULT_RADIUS, min_correlation=DEFAULT_MIN_CORRELATION):
+        self.path = path
+        self.version = version
+        self.radius = radius
+        self.min_correlation = min_correlation
+        self.stats = {"hits": 0, "misses": 0, "rejected": 0, "added": 0}
+        self._lock = threading.Lock()
+        self._index = None
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY,
+                version TEXT NOT NULL,
+                phash INTEGER NOT NULL,
+                dhash INTEGER NOT NULL,
+                aspect REAL NOT NULL,
+                thumbnail BLOB NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_version ON entries(version)")
+
+    @classmethod
+    def from_env(cls, version=""):
+        """Create the index from OCR_DEDUP_* environment variables, or None unless enabled"""
+        enabled = os.getenv("OCR_DEDUP_ENABLED", "").lower() in ("1", "true", "yes")
+        if not enabled or not is_available() or os.getenv("OCR_DEDUP_DISABLED", "").lower() in ("1", "true", "yes"):
+            return None
+        return cls(
+            path=os.getenv("OCR_DEDUP_PATH", DEFAULT_INDEX_PATH),
+            version=version,
+            radius=int(os.getenv("OCR_DEDUP_RADIUS", str(DEFAULT_RADIUS))),
+            min_correlation=float(os.getenv("OCR_DEDUP_MIN_CORRELATION", str(DEFAULT_MIN_CORRELATION))),
+        )
+
+    def supports(self, mime_type):
+        return mime_type in PREPROCESSABLE_MIME_TYPES
+
+    def _load(self):
+        # Loaded on first use so one-shot runs without images pay nothing
+        if self._index is None:
+            index = MultiIndexHash()
+            rows = self.conn.execute("SELECT id, phash FROM entries WHERE version = ?", (self.version,)).fetchall()
+            if rows:
+                data = np.array(rows, dtype=np.int64)
+                index.add_many(data[:, 0], data[:, 1].view(np.uint64))
+            self._index = index
+        return self._index
+
+    def verify(self, fingerprint, entry_id):
+        """Cheap second opinion on a pHash candidate; returns its result dict or None"""
+        row = self.conn.execute("SELECT dhash, aspect, thumbnail, result FROM entries WHERE id = ?", (entry_id,)).fetchone()
+        if row is None:
+            return None
+        dhash, aspect, thumbnail, result = row
+        if bin((dhash & (1 << 64) - 1) ^ fingerprint["dhash"]).count("1") > 2 * self.radius:
+            return None
+        if abs(aspect - fingerprint["aspect"]) > MAX_ASPECT_DIFFERENCE * max(aspect, fingerprint["aspect"]):
+            return None
+        correlation = thumbnail_correlation(thumbnail, fingerprint["thumbnail"])
+        if correlation < self.min_correlation:
+            return None
+        return {"result": json.loads(result), "correlation": round(correlation, 4)}
+
+    def lookup(self, fingerprint):
+        """
+        Return {"result", "distance", "correlation", "entryId"} for the nearest
+        verified near-duplicate, or None.
+        """
+        with self._lock:
+            ids, distances = self._load().search(fingerprint["phash"], self.radius)
+            for entry_id, distance in zip(ids, distances):
+                verified = self.verify(fingerprint, entry_id)
+                if verified is not None:
+                    self.stats["hits"] += 1
+                    return {**verified, "distance": distance, "entryId": entry_id}
+            self.stats["rejected" if ids else "misses"] += 1
+        return None
+
+    def add(self, fingerprint, result):
+        payload = json.dumps(result, separators=(",", ":"))
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO entries(version, phash, dhash, aspect, thumbnail, result, created_at) VALUES(?, ?, ?, ?, ?, ?, ?)",
+                (self.version, to_signed(fingerprint["phash"]), to_signed(fingerprint["dhash"]), fingerprint["aspect"],
+                 fingerprint["thumbnail"], payload, time.time()),
+            )
+            if self._index is not None:
+                self._index.add(cursor.lastrowid, fingerprint["phash"])
+            self.stats["added"] += 1
+
+    def render_metrics(self):
+        """Render lookup counters in Prometheus/OpenMetrics text format"""
+        lines = []
+        for name, value in self.stats.items():
+            lines += [f"# TYPE ocr_dedup_{name} counter", f"ocr_dedup_{name}_total {value}"]
+        if self._index is not None:
+            lines += ["# TYPE ocr_dedup_entries gauge", f"ocr_dedup_entries {len(self._index)}"]
+        return "\n".join(lines) + "\n"
+
+
+def run_bench(entries, radius, queries, seed):
+    """
+    Index `entries` random codes and time lookups of codes `radius` bits
+    away from indexed ones (hits) and of fresh random codes (misses).
+    """
+    rng = np.random.default_rng(seed)
+    random_codes = lambda n: rng.integers(0, np.iinfo(np.uint64).max, size=n, dtype=np.uint64, endpoint=True)
+    codes = random_codes(entries)
+    index = MultiIndexHash()
+    started = time.perf_counter()
+    index.add_many(np.arange(entries), codes)
+    build_seconds = time.perf_counter() - started
+
+    def timed(workload):
+        timings = []
+        found = 0
+        for code in workload:
+            started = time.perf_counter()
+            ids, _ = index.search(int(code), radius)
+            timings.append(time.perf_counter() - started)
+            found += bool(ids)
+        timings.sort()
+        micros = lambda pct: round(timings[min(len(timings) - 1, int(pct / 100 * len(timings)))] * 1e6, 1)
+        return {"found": found, "p50Us": micros(50), "p95Us": micros(95), "p99Us": micros(99)}
+
+    targets = rng.integers(0, entries, size=queries)
+    near = []
+    for target in targets:
+        code = int(codes[target])
+        for bit in rng.choice(HASH_BITS, size=radius, replace=False):
+            code ^= 1 << int(bit)
+        near.append(code)
+    misses = random_codes(queries)
+    return {
+        "entries": entries,
+        "radius": radius,
+        "buildSeconds": round(build_seconds, 2),
+        "queries": queries,
+        "hits": timed(near),
+        "misses": timed(misses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perceptual fingerprints and near-duplicate index benchmark")
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--radius", type=int, default=DEFAULT_RADIUS)
+    parser.add_argument("--queries", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if not is_available():
+        print(json.dumps({"success": False, "error": "Pillow/NumPy not installed"}))
+        return 1
+    if args.bench:
+        print(json.dumps(run_bench(args.entries, args.radius, args.queries, args.seed)))
+        return 0
+    if not args.images:
+        parser.error("give at least one image or --bench")
+
+    fingerprints = [image_fingerprint(path) for path in args.images]
+    base = fingerprints[0]
+    for path, fingerprint in zip(args.images, fingerprints):
+        print(json.dumps({
+            "image": path,
+            "phash": f"{fingerprint['phash']:016x}",
+            "dhash": f"{fingerprint['dhash']:016x}",
+            "aspect": round(fingerprint["aspect"], 4),
+            # Distances to the first image
+            "phashDistance": bin(base["phash"] ^ fingerprint["phash"]).count("1"),
+            "dhashDistance": bin(base["dhash"] ^ fingerprint["dhash"]).count("1"),
+            "correlation": round(thumbnail_correlation(base["thumbnail"], fingerprint["thumbnail"]), 4),
+        }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Record-and-replay fixtures for the OCR processor's LLM calls.
+
+With OCR_FIXTURES_MODE=record every live LLM response is appended to the
+fixture store (OCR_FIXTURES_PATH, gzip-compressed JSON lines) together with
+its latency, keyed by a fingerprint of the prompt/model version, the
+pre-processing preset (OCR_PREPROCESS_PRESET), the document's SHA-256 and
+its mime type. With OCR_FIXTURES_MODE=replay the processor never reaches
+the LLM: responses come from the store after an injected delay
+(OCR_FIXTURES_LATENCY), and a request without a fixture fails instead of
+silently going live. Everything around the model call (pre-processing,
+retries, parsing, matching, caching) runs as usual, so changes to those
+stages can be measured reproducibly and offline. The exception is what
+the model sees: replay cannot measure the accuracy effect of changing
+pre-processing. A different preset misses every fixture, and changing
+what a preset does replays responses recorded for the old upload bytes;
+record the corpus again for that.
+
+OCR_FIXTURES_LATENCY is "recorded" (the latency seen while recording,
+scaled by OCR_FIXTURES_LATENCY_SCALE), a fixed "<ms>" or a uniform
+"<min>-<max>" range in milliseconds. Random latencies are drawn from a
+generator seeded with OCR_FIXTURES_SEED and the fingerprint, so they do not
+depend on scheduling order.
+
+Record a corpus once, then benchmark it as often as needed:
+
+    OCR_FIXTURES_MODE=record python ocr_processor.py --batch corpus/
+    python ocr_fixtures.py bench corpus/ --expected expected.jsonl
+
+Expected results are JSON lines {"filePath": ..., "medicines": [{"name", "dosage"}, ...]}.
+
+Usage:
+    python ocr_fixtures.py bench <source> [--expected <jsonl>] [--concurrency 8] [--latency recorded] [--with-cache]
+    python ocr_fixtures.py stats
+"""
+import os
+import sys
+import json
+import time
+import gzip
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+
+DEFAULT_FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "ocr_llm.jsonl.gz")
+FIXTURE_MODES = ("record", "replay")
+
+
+class FixtureMissError(Exception):
+    """Raised in replay mode for a request that was never recorded"""
+
+    # Not worth retrying
+    status_code = 404
+
+
+def request_fingerprint(prompt_version, document_hash, mime_type):
+    return hashlib.sha256(f"{prompt_version}\0{document_hash}\0{mime_type}".encode()).hexdigest()
+
+
+class FixtureStore:
+    """Append-only gzip JSON-lines file; the last record of a fingerprint wins"""
+
+    def __init__(self, path=DEFAULT_FIXTURES_PATH):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with gzip.open(path, "rt") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["fingerprint"]] = entry
+
+    def get(self, fingerprint):
+        return self.entries.get(fingerprint)
+
+    def put(self, entry):
+        # One complete gzip member per write, so concurrent recorders never interleave
+        member = gzip.compress((json.dumps(entry, separators=(",", ":")) + "\n").encode())
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, member)
+            finally:
+                os.close(fd)
+            self.entries[entry["fingerprint"]] = entry
+
+
+class LatencyModel:
+    def __init__(self, spec="recorded", scale=1.0, seed=0):
+        self.spec = spec
+        self.scale = scale
+        self.seed = seed
+        if spec == "recorded":
+            self.bounds = None
+        elif "-" in spec:
+            low, high = spec.split("-", 1)
+            self.bounds = (float(low), float(high))
+        else:
+            self.bounds = (float(spec), float(spec))
+
+    def seconds(self, entry, attempt):
+        if self.bounds is None:
+            return entry.get("latencyMs", 0) * self.scale / 1000
+        # Seeded per request, not per call order
+        rng = random.Random(f"{self.seed}:{entry['fingerprint']}:{attempt}")
+        return rng.uniform(*self.bounds) / 1000
+
+
+class FixtureEngine:
+    def __init__(self, store, mode, latency=None):
+        if mode not in FIXTURE_MODES:
+            raise ValueError(f"OCR_FIXTURES_MODE must be one of {', '.join(FIXTURE_MODES)}")
+        self.store = store
+        self.mode = mode
+        self.latency = latency or LatencyModel()
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+
+    @classmethod
+    def from_env(cls):
+        """Create an engine from OCR_FIXTURES_* environment variables, or None when fixtures are off"""
+        mode = os.getenv("OCR_FIXTURES_MODE", "").lower()
+        if not mode:
+            return None
+        latency = LatencyModel(
+            os.getenv("OCR_FIXTURES_LATENCY", "recorded"),
+            scale=float(os.getenv("OCR_FIXTURES_LATENCY_SCALE", "1")),
+            seed=int(os.getenv("OCR_FIXTURES_SEED", "0")),
+        )
+        return cls(FixtureStore(os.getenv("OCR_FIXTURES_PATH", DEFAULT_FIXTURES_PATH)), mode, latency)
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    async def send(self, fingerprint, attempt, send_live):
+        """
+        Run one LLM attempt. send_live is a zero-argument coroutine function
+        making the real call; it is only used while recording.
+        """
+        if self.mode == "replay":
+            entry = self.store.get(fingerprint)
+            if entry is None:
+                self.stats["misses"] += 1
+                raise FixtureMissError(f"No recorded LLM response for fingerprint {fingerprint[:16]}")
+            await asyncio.sleep(self.latency.seconds(entry, attempt))
+            self.stats["replayed"] += 1
+            return entry["response"]
+
+        started = time.perf_counter()
+        response = await send_live()
+        self.store.put({
+            "fingerprint": fingerprint,
+            "response": response,
+            "latencyMs": round((time.perf_counter() - started) * 1000, 1),
+            "recordedAt": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        })
+        self.stats["recorded"] += 1
+        return response
+
+
+def load_expected(path):
+    expected = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                expected[os.path.normpath(entry["filePath"])] = entry["medicines"]
+    return expected
+
+
+def score_document(predicted, expected, normalize):
+    """(true positives, predicted, expected, exact name+dosage matches) for one document"""
+    predicted_names = {normalize(m.get("name", "")) for m in predicted} - {""}
+    expected_names = {normalize(m.get("name", "")) for m in expected} - {""}
+    expected_doses = {(normalize(m.get("name", "")), "".join(str(m.get("dosage", "")).lower().split())) for m in expected}
+    exact = sum(
+        1 for m in predicted
+        if (normalize(m.get("name", "")), "".join(str(m.get("dosage", "")).lower().split())) in expected_doses
+    )
+    return len(predicted_names & expected_names), len(predicted_names), len(expected_names), exact
+
+
+async def run_bench(args):
+    # Configure the processor before it is imported
+    os.environ["OCR_FIXTURES_MODE"] = "replay"
+    os.environ["OCR_FIXTURES_LATENCY"] = args.latency
+    os.environ.setdefault("OCR_BACKEND", "llm")
+    if args.fixtures:
+        os.environ["OCR_FIXTURES_PATH"] = args.fixtures
+    if not args.with_cache:
+        os.environ["OCR_CACHE_DISABLED"] = "1"
+        # Dedup is opt-in (OCR_DEDUP_ENABLED), but an inherited
+        # OCR_DEDUP_ENABLED=1 would answer near-duplicates without replaying
+        # them; OCR_DEDUP_DISABLED overrides it
+        os.environ["OCR_DEDUP_DISABLED"] = "1"
+    import ocr_processor
+    from medicine_index import normalize_name
+
+    expected = load_expected(args.expected) if args.expected else {}
+    jobs = list(ocr_processor.iter_batch_jobs(args.source))
+    gate = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    totals = {"documents": 0, "succeeded": 0, "failed": 0, "scored": 0, "truePositives": 0, "predicted": 0, "expected": 0, "exact": 0}
+
+    async def one(job):
+        async with gate:
+            started = time.perf_counter()
+            result = await ocr_processor.process_batch_job(job)
+            latencies.append(time.perf_counter() - started)
+        totals["documents"] += 1
+        totals["succeeded" if result.get("success") else "failed"] += 1
+        truth = expected.get(os.path.normpath(job.get("filePath") or ""))
+        if truth is not None:
+            tp, predicted, wanted, exact = score_document(result.get("medicines", []), truth, normalize_name)
+            totals["scored"] += 1
+            totals["truePositives"] += tp
+            totals["predicted"] += predicted
+            totals["expected"] += wanted
+            totals["exact"] += exact
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(job) for job in jobs))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda pct: round(latencies[min(len(latencies) - 1, int(pct / 100 * len(latencies)))] * 1000, 1) if latencies else None
+    precision = totals["truePositives"] / totals["predicted"] if totals["predicted"] else None
+    recall = totals["truePositives"] / totals["expected"] if totals["expected"] else None
+    f1 = 2 * precision * recall / (precision + recall) if precision and recall else None
+    return {
+        **{key: totals[key] for key in ("documents", "succeeded", "failed", "scored")},
+        "concurrency": args.concurrency,
+        "latency": args.latency,
+        "elapsedSeconds": round(elapsed, 3),
+        "documentsPerSecond": round(len(jobs) / elapsed, 2) if elapsed else None,
+        "p50Ms": ms(50),
+        "p95Ms": ms(95),
+        "p99Ms": ms(99),
+        "namePrecision": round(precision, 4) if precision is not None else None,
+        "nameRecall": round(recall, 4) if recall is not None else None,
+        "nameF1": round(f1, 4) if f1 is not None else None,
+        "exactMatches": totals["exact"],
+        "fixtures": ocr_processor.llm_fixtures.stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline OCR benchmarks over recorded LLM fixtures")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("bench", help="Replay a corpus and report throughput and accuracy")
+    bench.add_argument("source", help="Directory, glob pattern or JSONL manifest of prescriptions")
+    bench.add_argument("--expected", help="JSON lines of expected medicines per filePath")
+    bench.add_argument("--fixtures", help=f"Fixture store (default OCR_FIXTURES_PATH or {DEFAULT_FIXTURES_PATH})")
+    bench.add_argument("--concurrency", type=int, default=8)
+    bench.add_argument("--latency", default="recorded", help='"recorded", "<ms>" or "<min>-<max>"')
+    bench.add_argument("--with-cache", action="store_true", help="Keep the result cache and near-duplicate index on")
+    stats = commands.add_parser("stats", help="Summarize the fixture store")
+    stats.add_argument("--fixtures")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        path = args.fixtures or os.getenv("OCR_FIXTURES_PATH", DEFAULT_FIXTURES_PATH)
+        store = FixtureStore(path)
+        latencies = sorted(entry.get("latencyMs", 0) for entry in store.entries.values())
+        print(json.dumps({
+            "path": path,
+            "fixtures": len(store.entries),
+            "bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+            "medianLatencyMs": latencies[len(latencies) // 2] if latencies else None,
+        }))
+        return 0
+
+    print(json.dumps(asyncio.run(run_bench(args))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Memory bounds for OCR jobs.
+
+The LLM integration reads the upload into memory, base64-encodes it and
+wraps it in a JSON request body, so each in-flight upload briefly costs
+several times its size. UploadMemoryBudget admits uploads only while their
+estimated footprint fits OCR_MAX_INFLIGHT_UPLOAD_MB, which caps the worker's
+peak RSS regardless of concurrency. A single upload larger than the budget
+still runs, alone.
+
+spool_stream() copies an input stream (stdin or an inherited descriptor) to a
+temporary file in fixed-size chunks, so streamed input never sits in memory
+whole.
+"""
+import os
+import shutil
+import asyncio
+import tempfile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Raw bytes + base64 text (4/3) + JSON request body holding the base64 (4/3)
+UPLOAD_FOOTPRINT_FACTOR = 1 + 4 / 3 + 4 / 3
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
+def upload_footprint(sent_bytes):
+    return int(sent_bytes * UPLOAD_FOOTPRINT_FACTOR)
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None when unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class UploadMemoryBudget:
+    def __init__(self, capacity_bytes):
+        self.capacity = capacity_bytes
+        self.in_use = 0
+        self.peak = 0
+        self._condition = asyncio.Condition()
+
+    @classmethod
+    def from_env(cls):
+        megabytes = float(os.getenv("OCR_MAX_INFLIGHT_UPLOAD_MB", "256"))
+        return cls(int(megabytes * 1024 * 1024)) if megabytes > 0 else None
+
+    async def acquire(self, amount):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_use == 0 or self.in_use + amount <= self.capacity)
+            self.in_use += amount
+            self.peak = max(self.peak, self.in_use)
+
+    async def release(self, amount):
+        async with self._condition:
+            self.in_use -= amount
+            self._condition.notify_all()
+
+
+def spool_stream(stream, suffix=""):
+    """Copy a binary stream to a temporary file chunk by chunk; returns its path"""
+    fd, path = tempfile.mkstemp(prefix="ocr_input_", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(stream, out, SPOOL_CHUNK_SIZE)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
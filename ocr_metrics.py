@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Per-job stage timings and OpenMetrics histograms for the OCR processor.
+
+A JobTimings object travels with one OCR job and accumulates how long each
+stage took (PDF pages running in parallel add up, so stage totals can
+exceed the wall-clock time) plus payload sizes, token estimates and LLM
+attempt counts. One-shot mode returns it as the "timings" block of the
+result; in server mode every finished job is folded into OcrMetrics, which
+renders Prometheus/OpenMetrics histograms.
+
+The LLM integration does not report usage, so token counts are estimates:
+~4 characters per text token and OpenAI's high-detail tiling rule for
+images.
+"""
+import time
+import math
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STAGES = ["startup", "read", "dedup", "local", "preprocess", "upload", "memoryWait", "model", "parse", "match", "pharmacies"]
+
+# Upper bounds; the last bucket is +Inf
+SECONDS_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+BYTES_BUCKETS = [16_384, 65_536, 262_144, 1_048_576, 4_194_304, 16_777_216]
+TOKENS_BUCKETS = [100, 250, 500, 1000, 2500, 5000, 10000]
+COUNT_BUCKETS = [1, 2, 3, 5, 8]
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_text_tokens(text):
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def estimate_image_tokens(width, height):
+    """OpenAI high-detail image cost: fit in 2048x2048, shortest side to 768, 170 per 512px tile plus 85"""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+class JobTimings:
+    def __init__(self):
+        self.stages = {}
+        self.values = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add(self, name, value):
+        """Accumulate a size or count; pages of one PDF add up"""
+        self.values[name] = self.values.get(name, 0) + value
+
+    def as_dict(self, total_seconds=None):
+        result = {
+            "stagesMs": {name: round(self.stages[name] * 1000, 2) for name in STAGES if name in self.stages},
+            **self.values,
+        }
+        if total_seconds is not None:
+            result["totalMs"] = round(total_seconds * 1000, 2)
+        return result
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels=""):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f"{name}_bucket{{{labels + ',' if labels else ''}{le}}} {cumulative}")
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {round(self.sum, 6)}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class OcrMetrics:
+    """Process-wide aggregate of finished jobs"""
+
+    def __init__(self, startup_seconds=0.0):
+        self._lock = threading.Lock()
+        self.startup_seconds = startup_seconds
+        self.jobs = {}
+        self.stage_seconds = {stage: Histogram(SECONDS_BUCKETS) for stage in STAGES if stage != "startup"}
+        self.job_seconds = Histogram(SECONDS_BUCKETS)
+        self.payload_bytes = {"original": Histogram(BYTES_BUCKETS), "sent": Histogram(BYTES_BUCKETS)}
+        self.tokens = {"prompt": Histogram(TOKENS_BUCKETS), "completion": Histogram(TOKENS_BUCKETS)}
+        # Provider-reported usage, when the pooled transport is in use
+        self.usage = {"prompt": Histogram(TOKENS_BUCKETS), "cachedPrompt": Histogram(TOKENS_BUCKETS), "completion": Histogram(TOKENS_BUCKETS)}
+        self.ttft_seconds = Histogram(SECONDS_BUCKETS)
+        self.attempts = Histogram(COUNT_BUCKETS)
+        self.retries_total = 0
+
+    def observe(self, timings, total_seconds, outcome):
+        """outcome is "success", "cached" or "error" """
+        with self._lock:
+            self.jobs[outcome] = self.jobs.get(outcome, 0) + 1
+            self.job_seconds.observe(total_seconds)
+            for stage, seconds in timings.stages.items():
+                if stage in self.stage_seconds:
+                    self.stage_seconds[stage].observe(seconds)
+            values = timings.values
+            if "originalBytes" in values:
+                self.payload_bytes["original"].observe(values["originalBytes"])
+            if "sentBytes" in values:
+                self.payload_bytes["sent"].observe(values["sentBytes"])
+            if "promptTokensEstimate" in values:
+                self.tokens["prompt"].observe(values["promptTokensEstimate"])
+            if "completionTokensEstimate" in values:
+                self.tokens["completion"].observe(values["completionTokensEstimate"])
+            for kind, histogram in self.usage.items():
+                name = f"{kind}Tokens"
+                if name in values:
+                    histogram.observe(values[name])
+            if "ttftMs" in values:
+                self.ttft_seconds.observe(values["ttftMs"] / 1000)
+            if "llmAttempts" in values:
+                self.attempts.observe(values["llmAttempts"])
+                self.retries_total += values.get("llmRetries", 0)
+
+    def render(self):
+        """Render in Prometheus/OpenMetrics text format"""
+        with self._lock:
+            lines = [
+                "# TYPE ocr_startup_seconds gauge",
+                f"ocr_startup_seconds {round(self.startup_seconds, 6)}",
+                "# TYPE ocr_jobs counter",
+            ]
+            lines += [f'ocr_jobs_total{{outcome="{outcome}"}} {count}' for outcome, count in sorted(self.jobs.items())]
+            lines.append("# TYPE ocr_job_seconds histogram")
+            lines += self.job_seconds.render("ocr_job_seconds")
+            lines.append("# TYPE ocr_stage_seconds histogram")
+            for stage, histogram in self.stage_seconds.items():
+                lines += histogram.render("ocr_stage_seconds", f'stage="{stage}"')
+            lines.append("# TYPE ocr_payload_bytes histogram")
+            for kind, histogram in self.payload_bytes.items():
+                lines += histogram.render("ocr_payload_bytes", f'kind="{kind}"')
+            lines.append("# TYPE ocr_tokens_estimate histogram")
+            for kind, histogram in self.tokens.items():
+                lines += histogram.render("ocr_tokens_estimate", f'kind="{kind}"')
+            lines.append("# TYPE ocr_tokens histogram")
+            for kind, histogram in self.usage.items():
+                lines += histogram.render("ocr_tokens", f'kind="{kind}"')
+            lines.append("# TYPE ocr_llm_ttft_seconds histogram")
+            lines += self.ttft_seconds.render("ocr_llm_ttft_seconds")
+            lines.append("# TYPE ocr_llm_attempts histogram")
+            lines += self.attempts.render("ocr_llm_attempts")
+            lines += ["# TYPE ocr_llm_retries counter", f"ocr_llm_retries_total {self.retries_total}"]
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(port, render):
+    """Expose render() at http://0.0.0.0:<port>/metrics from a daemon thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = (render() + "# EOF\n").encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # stdout carries the JSON-lines protocol
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
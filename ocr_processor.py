@@ -1,8 +1,17 @@
 #!/usr/bin/env python3
+import time
+
+# Environment and import load is reported as the "startup" stage
+PROCESS_STARTED = time.perf_counter()
+
 import os
 import sys
 import json
 import asyncio
+import hashlib
+import glob
+import argparse
+import mimetypes
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -15,114 +24,785 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Failed to import emergentintegrations: {str(e)}"}))
     sys.exit(1)
 
-async def extract_medicines_from_prescription(file_path: str, mime_type: str):
+from ocr_prompts import SYSTEM_PROMPT, USER_PROMPT
+from ocr_cache import OcrResultCache, hash_file, cache_key
+from ocr_dedup import NearDuplicateIndex, image_fingerprint
+from llm_client import ResilientLlmClient
+from llm_transport import OpenAiChatClient
+from ocr_fixtures import FixtureEngine, request_fingerprint
+from pharmacy_match import match_prescription
+from llm_json import parse_ocr_response, IncrementalMedicineParser
+from image_preprocess import preprocess_image
+from pdf_pages import PdfPageSource, is_available as pdf_pages_available
+from medicine_index import MedicineNameIndex
+from ocr_backends import LocalOcrBackend, BackendRouter
+from ocr_memory import UploadMemoryBudget, upload_footprint, peak_rss_bytes, spool_stream
+from ocr_metrics import JobTimings, OcrMetrics, estimate_text_tokens, estimate_image_tokens, serve_metrics
+import prisma_db
+
+MODEL_PROVIDER = "openai"
+MODEL_NAME = "gpt-4o"
+
+# Changes whenever the prompt or model changes, so stale cached results are not reused
+PROMPT_VERSION = hashlib.sha256(f"{MODEL_PROVIDER}/{MODEL_NAME}\0{SYSTEM_PROMPT}\0{USER_PROMPT}".encode()).hexdigest()[:16]
+
+# Image pre-processing preset (see image_preprocess.PRESETS); "off" disables it
+PREPROCESS_PRESET = os.getenv('OCR_PREPROCESS_PRESET', 'balanced')
+
+# Maximum number of pages of one PDF processed at the same time
+PDF_PAGE_CONCURRENCY = int(os.getenv('OCR_PDF_PAGE_CONCURRENCY', '4'))
+
+# Map OCR'd names onto catalogue names; the index is refreshed at most this often
+MEDICINE_MATCHING = os.getenv('OCR_MEDICINE_MATCHING', '1').lower() in ('1', 'true', 'yes')
+MEDICINE_INDEX_REFRESH_SECONDS = float(os.getenv('OCR_MEDICINE_INDEX_REFRESH_SECONDS', '60'))
+CANONICAL_NAME_MIN_SCORE = 0.75
+
+# Return matchingPharmacies with every result unless a job says otherwise
+MATCH_PHARMACIES = os.getenv('OCR_MATCH_PHARMACIES', '').lower() in ('1', 'true', 'yes')
+
+medicine_index = None
+medicine_index_refreshed_at = 0.0
+
+result_cache = OcrResultCache.from_env()
+llm_client = ResilientLlmClient.from_env()
+# Pooled keep-alive client when OCR_LLM_BASE_URL names an OpenAI-compatible endpoint
+llm_transport = OpenAiChatClient.from_env(MODEL_NAME, llm_client.max_concurrency, f"prescription_ocr_{PROMPT_VERSION}")
+# Record or replay LLM responses (OCR_FIXTURES_MODE) for offline benchmarks
+llm_fixtures = FixtureEngine.from_env()
+near_duplicates = NearDuplicateIndex.from_env(f"{PROMPT_VERSION}:{PREPROCESS_PRESET}")
+# Caps the memory held by in-flight uploads (raw + base64 + request body)
+upload_budget = UploadMemoryBudget.from_env()
+
+def expected_llm_seconds():
+    """Median observed LLM latency, used against OCR_LATENCY_BUDGET_MS"""
+    return llm_client.latency.percentile(50)
+
+ocr_router = BackendRouter.from_env(LocalOcrBackend(lambda: get_medicine_index() if MEDICINE_MATCHING else None), expected_llm_seconds)
+
+STARTUP_SECONDS = time.perf_counter() - PROCESS_STARTED
+ocr_metrics = OcrMetrics(STARTUP_SECONDS)
+
+def no_events(event):
+    pass
+
+def get_medicine_index():
+    """Load the catalogue name index once and refresh it incrementally"""
+    global medicine_index, medicine_index_refreshed_at
+    now = time.monotonic()
+    if medicine_index is not None and now - medicine_index_refreshed_at < MEDICINE_INDEX_REFRESH_SECONDS:
+        return medicine_index
+
+    conn = prisma_db.connect(readonly=True)
+    try:
+        if medicine_index is None:
+            index = MedicineNameIndex()
+            index.load(conn)
+            medicine_index = index
+        else:
+            medicine_index.refresh(conn)
+    finally:
+        conn.close()
+    medicine_index_refreshed_at = now
+    return medicine_index
+
+def match_catalogue_names(medicines):
     """
-    Extract medicine information from prescription using Emergent LLM
+    Annotate medicines in place with fuzzy catalogue matches and, for
+    confident matches, a canonicalName the pharmacy search can use.
     """
+    if not MEDICINE_MATCHING or not medicines or not os.path.exists(prisma_db.database_path()):
+        return medicines
     try:
-        # Get the API key from environment
-        api_key = os.getenv('EMERGENT_LLM_KEY')
-        if not api_key:
-            return {
-                "success": False,
-                "error": "EMERGENT_LLM_KEY not found in environment variables"
-            }
+        index = get_medicine_index()
+    except Exception:
+        # Matching is best-effort; OCR results are still useful without it
+        return medicines
 
-        # Check if file exists
-        if not os.path.exists(file_path):
-            return {
-                "success": False,
-                "error": f"File not found: {file_path}"
-            }
+    for medicine in medicines:
+        if not isinstance(medicine, dict):
+            continue
+        name = medicine.get("name") or medicine.get("medicine_name")
+        if not name:
+            continue
+        matches = index.lookup(name)
+        medicine["catalogMatches"] = matches
+        if matches and matches[0]["score"] >= CANONICAL_NAME_MIN_SCORE:
+            medicine["canonicalName"] = matches[0]["name"]
+        else:
+            medicine.pop("canonicalName", None)
+    return medicines
 
-        # Initialize the chat with GPT-4o for best OCR performance
-        chat = LlmChat(
-            api_key=api_key,
-            session_id="prescription_ocr_" + str(hash(file_path)),
-            system_message="""You are a medical prescription OCR expert. Analyze the prescription image/document and extract medicine information accurately.
-
-Extract the following information for each medicine:
-1. Medicine name (exact spelling)
-2. Dosage (strength/concentration)
-3. Frequency (how often to take)
-4. Duration (how long to take)
-5. Instructions (special notes like "after meals", "before sleep", etc.)
-
-Return the data in this exact JSON format:
-{
-  "medicines": [
-    {
-      "name": "Medicine Name",
-      "dosage": "500mg",
-      "frequency": "Twice daily",
-      "duration": "5 days",
-      "instructions": "Take after meals"
+def catalogue_spellings(medicines):
+    """
+    Every catalogue spelling of each canonicalName, so the pharmacy match
+    finds all SKUs of a medicine. Read here, on the event loop, because the
+    index is only refreshed from it.
+    """
+    if medicine_index is None:
+        return {}
+    return {
+        medicine["canonicalName"]: medicine_index.spellings(medicine["canonicalName"])
+        for medicine in medicines
+        if isinstance(medicine, dict) and medicine.get("canonicalName")
     }
-  ],
-  "extractedText": "Full extracted text from prescription"
-}
 
-Be very careful with medicine names - they must be spelled correctly. If you're unsure about a medicine name, include it anyway but add a note in instructions.
-If the prescription is unclear or you cannot read certain parts, mention this in the extractedText field."""
-        ).with_model("openai", "gpt-4o")
+async def ocr_single_file(api_key: str, file_path: str, mime_type: str, emit=no_events, timings=None, on_medicine=None):
+    """
+    Send one image/document to the LLM and parse the medicines out of the
+    response. Raises if the LLM call fails. Stage timings, sizes and attempt
+    counts are added to timings when given.
+
+    on_medicine, when given, is called on the event loop with each medicine
+    as soon as its object completes in the streamed response (pooled
+    transport only). A retried or hedged attempt streams too, so callers
+    de-duplicate; the returned list is authoritative.
+    """
+    timings = timings if timings is not None else JobTimings()
+
+    # Shrink large photos (grayscale, crop, deskew, downscale) before upload
+    emit({"event": "progress", "stage": "preprocessing"})
+    with timings.stage("preprocess"):
+        # Decoding, thresholding and deskewing are CPU-bound; keep them off the event loop
+        try:
+            upload_path, upload_mime_type, preprocessing = await asyncio.to_thread(preprocess_image, file_path, mime_type, PREPROCESS_PRESET)
+        except Exception as e:
+            # Files Pillow cannot read still go to the LLM as uploaded
+            size = os.path.getsize(file_path)
+            upload_path, upload_mime_type = file_path, mime_type
+            preprocessing = {"preset": PREPROCESS_PRESET, "originalBytes": size, "processedBytes": size, "temporary": False,
+                             "error": str(e)}
 
+    with timings.stage("upload"):
         # Create file content for image analysis
         file_content = FileContentWithMimeType(
-            file_path=file_path,
-            mime_type=mime_type
+            file_path=upload_path,
+            mime_type=upload_mime_type
         )
 
         # Create user message
         user_message = UserMessage(
-            text="Please analyze this prescription and extract all medicine information. Return only the JSON response as specified.",
+            text=USER_PROMPT,
             file_contents=[file_content]
         )
 
-        # Send the message and get response
-        response = await chat.send_message(user_message)
-        
-        # Try to parse the JSON response
+    prompt_tokens = estimate_text_tokens(SYSTEM_PROMPT) + estimate_text_tokens(USER_PROMPT)
+    image_size = preprocessing.get("processedSize") or preprocessing.get("originalSize")
+    if image_size:
+        prompt_tokens += estimate_image_tokens(*image_size)
+    timings.add("originalBytes", preprocessing["originalBytes"])
+    timings.add("sentBytes", preprocessing["processedBytes"])
+
+    # Every attempt, including retries and hedges, goes through send_once
+    attempts = 0
+    usage = None
+    document_hash = hash_file(file_path)
+    # Stable across processes and runs for the same document
+    session_id = f"prescription_ocr_{document_hash[:16]}"
+
+    async def send_live(attempt):
+        nonlocal usage
+        if llm_transport is not None:
+            on_delta = None
+            if on_medicine is not None:
+                parser = IncrementalMedicineParser()
+                loop = asyncio.get_running_loop()
+
+                def on_delta(text):
+                    # Called on the transport thread
+                    for medicine in parser.feed(text):
+                        loop.call_soon_threadsafe(on_medicine, medicine)
+            reply = await llm_transport.acomplete(SYSTEM_PROMPT, USER_PROMPT, upload_path, upload_mime_type, on_delta)
+            usage = {**(reply["usage"] or {}), "ttftSeconds": reply["ttftSeconds"]}
+            return reply["content"]
+        # Initialize the chat with GPT-4o for best OCR performance; each
+        # attempt (retry or hedge) gets its own chat so histories don't mix
+        chat = LlmChat(
+            api_key=api_key,
+            session_id=f"{session_id}_{attempt}",
+            system_message=SYSTEM_PROMPT
+        ).with_model(MODEL_PROVIDER, MODEL_NAME)
+        return await chat.send_message(user_message)
+
+    async def send_once():
+        nonlocal attempts
+        attempts += 1
+        attempt = attempts
+        if llm_fixtures is not None:
+            # The preset decides which bytes the LLM saw, so it is part of the key
+            fingerprint = request_fingerprint(f"{PROMPT_VERSION}:{PREPROCESS_PRESET}", document_hash, mime_type)
+            return await llm_fixtures.send(fingerprint, attempt, lambda: send_live(attempt))
+        return await send_live(attempt)
+
+    # Send the message with deadlines, retries and rate limiting
+    emit({"event": "progress", "stage": "llm", "sentBytes": preprocessing["processedBytes"]})
+    footprint = upload_footprint(preprocessing["processedBytes"]) if upload_budget is not None else 0
+    try:
+        if footprint:
+            # Wait until the raw, base64 and request-body copies fit the budget
+            with timings.stage("memoryWait"):
+                await upload_budget.acquire(footprint)
         try:
-            # Clean the response - remove markdown formatting if present
-            clean_response = response.strip()
-            if clean_response.startswith('```json'):
-                clean_response = clean_response[7:]
-            if clean_response.endswith('```'):
-                clean_response = clean_response[:-3]
-            clean_response = clean_response.strip()
-            
-            ocr_data = json.loads(clean_response)
-            
+            with timings.stage("model"):
+                response = await llm_client.call(send_once)
+        finally:
+            if footprint:
+                await upload_budget.release(footprint)
+    finally:
+        if preprocessing["temporary"]:
+            os.remove(upload_path)
+        timings.add("llmAttempts", attempts)
+        timings.add("llmRetries", max(0, attempts - 1))
+
+    payload = {"originalBytes": preprocessing["originalBytes"], "sentBytes": preprocessing["processedBytes"]}
+    timings.add("promptTokensEstimate", prompt_tokens)
+    timings.add("completionTokensEstimate", estimate_text_tokens(response))
+    if usage is not None:
+        # Reported by the provider through the pooled transport
+        for name in ("promptTokens", "cachedPromptTokens", "completionTokens"):
+            if name in usage:
+                timings.add(name, usage[name])
+        if usage["ttftSeconds"] is not None:
+            timings.add("ttftMs", round(usage["ttftSeconds"] * 1000, 2))
+
+    # Find, repair and validate the JSON object anywhere in the response
+    with timings.stage("parse"):
+        parsed = parse_ocr_response(response)
+    if parsed is None:
+        # If JSON parsing fails, return the raw response
+        return {
+            "medicines": [],
+            "extractedText": response,
+            "note": "Could not parse structured data, raw OCR response provided",
+            "payload": payload
+        }
+
+    with timings.stage("match"):
+        match_catalogue_names(parsed["medicines"])
+
+    result = {
+        "medicines": parsed["medicines"],
+        "extractedText": parsed["extractedText"] if parsed["extractedText"] is not None else response,
+        "payload": payload
+    }
+    if parsed["warnings"] or parsed["repaired"]:
+        result["parseWarnings"] = parsed["warnings"] + (["response was truncated"] if parsed["truncated"] else [])
+    return result
+
+def find_near_duplicate(file_path):
+    """Fingerprint an image and look it up; returns (fingerprint, duplicate or None)"""
+    try:
+        fingerprint = image_fingerprint(file_path)
+    except Exception:
+        # Unreadable images go to OCR as usual
+        return None, None
+    return fingerprint, near_duplicates.lookup(fingerprint)
+
+def emit_parsed(emit, result, emitted=None):
+    """Emit each parsed medicine not already streamed (keys in emitted), then the extracted text"""
+    for medicine in result["medicines"]:
+        key = medicine_key(medicine) if isinstance(medicine, dict) else None
+        if emitted is not None and key in emitted:
+            continue
+        emit({"event": "medicine", "medicine": medicine})
+    emit({"event": "text", "extractedText": result["extractedText"]})
+
+def medicine_streamer(emit, emitted, **fields):
+    """on_medicine callback emitting each medicine once per job, keyed by medicine_key"""
+    def on_medicine(medicine):
+        key = medicine_key(medicine)
+        if key[0] and key not in emitted:
+            emitted.add(key)
+            emit({"event": "medicine", **fields, "medicine": medicine})
+    return on_medicine
+
+def medicine_key(medicine):
+    """Normalized (name, dosage) used to de-duplicate medicines across pages"""
+    name = " ".join(str(medicine.get("name") or medicine.get("medicine_name") or "").lower().split())
+    dosage = "".join(str(medicine.get("dosage") or "").lower().split())
+    return name, dosage
+
+def merge_medicines(page_medicines):
+    """
+    Merge per-page medicine lists in page order, keeping the first occurrence
+    of each medicine and filling its missing fields from later duplicates.
+    """
+    merged = {}
+    for medicines in page_medicines:
+        for medicine in medicines:
+            if not isinstance(medicine, dict):
+                continue
+            key = medicine_key(medicine)
+            if not key[0]:
+                continue
+            if key not in merged:
+                merged[key] = dict(medicine)
+            else:
+                existing = merged[key]
+                for field, value in medicine.items():
+                    if value and not existing.get(field):
+                        existing[field] = value
+    return list(merged.values())
+
+async def ocr_pdf_pages(api_key: str, source: PdfPageSource, emit=no_events, timings=None):
+    """
+    Run OCR on every page of a PDF concurrently (bounded by
+    OCR_PDF_PAGE_CONCURRENCY) and merge the results. A failing page is
+    reported in "pages" instead of failing the whole document.
+    """
+    timings = timings if timings is not None else JobTimings()
+    semaphore = asyncio.Semaphore(PDF_PAGE_CONCURRENCY)
+    emitted = set()
+    emit({"event": "progress", "stage": "pages", "pageCount": source.page_count})
+
+    async def run_page(index):
+        async with semaphore:
+            # Pages are written out lazily, only once a slot is free, and
+            # rasterized off the event loop while other pages are with the LLM
+            try:
+                with timings.stage("read"):
+                    page_path, page_mime_type = await asyncio.to_thread(source.write_page, index)
+            except Exception as e:
+                emit({"event": "page", "page": index + 1, "error": f"Could not read page: {e}"})
+                return {"error": f"Could not read page: {e}"}
+            try:
+                page = await ocr_single_file(api_key, page_path, page_mime_type, timings=timings,
+                                             on_medicine=medicine_streamer(emit, emitted, page=index + 1))
+            except Exception as e:
+                emit({"event": "page", "page": index + 1, "error": str(e)})
+                return {"error": str(e)}
+            finally:
+                os.remove(page_path)
+
+        # Medicines the stream did not already surface go out now, once each
+        emit({"event": "page", "page": index + 1, "medicinesCount": len(page["medicines"])})
+        for medicine in page["medicines"]:
+            key = medicine_key(medicine) if isinstance(medicine, dict) else None
+            if key and key[0] and key not in emitted:
+                emitted.add(key)
+                emit({"event": "medicine", "page": index + 1, "medicine": medicine})
+        return page
+
+    page_results = await asyncio.gather(*(run_page(i) for i in range(source.page_count)))
+
+    pages = []
+    for index, page in enumerate(page_results, 1):
+        summary = {"page": index}
+        if "error" in page:
+            summary["error"] = page["error"]
+        else:
+            summary["medicinesCount"] = len(page["medicines"])
+            if page.get("note"):
+                summary["note"] = page["note"]
+        pages.append(summary)
+
+    succeeded = [page for page in page_results if "error" not in page]
+    if not succeeded:
+        raise RuntimeError(f"All {source.page_count} PDF pages failed: {page_results[0]['error']}")
+
+    return {
+        "medicines": merge_medicines(page["medicines"] for page in succeeded),
+        # Keep per-page text in page order
+        "extractedText": "\n\n".join(
+            f"--- Page {index} ---\n{page['extractedText']}"
+            for index, page in enumerate(page_results, 1) if "error" not in page
+        ),
+        "pages": pages,
+        "payload": {
+            "originalBytes": os.path.getsize(source.file_path),
+            "sentBytes": sum(page["payload"]["sentBytes"] for page in succeeded)
+        }
+    }
+
+async def ocr_with_llm(api_key: str, file_path: str, mime_type: str, emit, timings):
+    """LLM pipeline: multi-page PDFs are split and processed page by page in parallel"""
+    source = None
+    if mime_type == "application/pdf" and pdf_pages_available():
+        try:
+            source = PdfPageSource(file_path)
+        except Exception:
+            # Encrypted or damaged PDFs go to the LLM whole, as before splitting
+            source = None
+        if source is not None and source.page_count < 2:
+            source.close()
+            source = None
+
+    if source is not None:
+        try:
+            result = await ocr_pdf_pages(api_key, source, emit, timings)
+        finally:
+            source.close()
+        emit({"event": "text", "extractedText": result["extractedText"]})
+    else:
+        emitted = set()
+        result = await ocr_single_file(api_key, file_path, mime_type, emit, timings, medicine_streamer(emit, emitted))
+        emit_parsed(emit, result, emitted)
+    return result
+
+async def extract_medicines_from_prescription(file_path: str, mime_type: str, on_event=None, timings=None, match_pharmacies=None):
+    """
+    Extract medicine information from prescription using Emergent LLM
+
+    on_event, when given, is called with incremental events as they become
+    available: {"event": "progress", ...}, {"event": "page", ...},
+    {"event": "medicine", "medicine": {...}} and {"event": "text", ...}.
+    Over the pooled OCR_LLM_BASE_URL transport medicine events go out while the
+    response is still streaming; otherwise once the response is parsed.
+
+    With match_pharmacies (default OCR_MATCH_PHARMACIES) the result also
+    lists the approved pharmacies stocking the medicines, matched against
+    the database directly; the match is never cached since stock changes.
+
+    The result carries a "timings" block with per-stage milliseconds,
+    payload sizes, estimated token counts and LLM attempts; the job is also
+    added to the process-wide ocr_metrics histograms.
+    """
+    timings = timings if timings is not None else JobTimings()
+    started = time.perf_counter()
+    result = await run_extraction(file_path, mime_type, on_event or no_events, timings)
+    if result.get("success") and (MATCH_PHARMACIES if match_pharmacies is None else match_pharmacies):
+        with timings.stage("pharmacies"):
+            try:
+                result["matchingPharmacies"] = await asyncio.to_thread(
+                    match_prescription, result["medicines"], None, catalogue_spellings(result["medicines"]))
+            except Exception as e:
+                # The OCR result is still good without the pharmacy list
+                result["matchingPharmacies"] = []
+                result["pharmacyMatchError"] = str(e)
+    total_seconds = time.perf_counter() - started
+
+    outcome = "cached" if result.get("cached") else "success" if result.get("success") else "error"
+    ocr_metrics.observe(timings, total_seconds, outcome)
+    timings.values["peakRssBytes"] = peak_rss_bytes()
+    return {**result, "timings": timings.as_dict(total_seconds)}
+
+async def run_extraction(file_path: str, mime_type: str, emit, timings):
+    """Cache lookup, PDF splitting and OCR behind extract_medicines_from_prescription"""
+    try:
+        # Get the API key from environment; without it only the local engine can run
+        api_key = os.getenv('EMERGENT_LLM_KEY')
+        if not api_key and llm_fixtures is not None and llm_fixtures.replaying:
+            # Replayed responses need no credentials
+            api_key = "fixture-replay"
+        if not api_key and not ocr_router.can_run_local(mime_type):
             return {
-                "success": True,
-                "medicines": ocr_data.get("medicines", []),
-                "extractedText": ocr_data.get("extractedText", response)
+                "success": False,
+                "error": "EMERGENT_LLM_KEY not found in environment variables"
             }
-            
-        except json.JSONDecodeError:
-            # If JSON parsing fails, return the raw response
+
+        # Check if file exists
+        if not os.path.exists(file_path):
             return {
-                "success": True,
-                "medicines": [],
-                "extractedText": response,
-                "note": "Could not parse structured data, raw OCR response provided"
+                "success": False,
+                "error": f"File not found: {file_path}"
             }
 
+        # Serve repeat uploads of the same file from the result cache
+        key = None
+        if result_cache is not None:
+            with timings.stage("read"):
+                key = cache_key(hash_file(file_path), mime_type, f"{PROMPT_VERSION}:{PREPROCESS_PRESET}")
+            cached = result_cache.get(key)
+            if cached is not None:
+                with timings.stage("match"):
+                    match_catalogue_names(cached["medicines"])
+                emit_parsed(emit, cached)
+                return {"success": True, **cached, "cached": True}
+
+        # With OCR_DEDUP_ENABLED, re-photographs of an already processed
+        # prescription reuse its result
+        fingerprint = None
+        if near_duplicates is not None and near_duplicates.supports(mime_type):
+            with timings.stage("dedup"):
+                fingerprint, duplicate = await asyncio.to_thread(find_near_duplicate, file_path)
+            if duplicate is not None:
+                # Not written to the result cache: a wrong reuse must not
+                # become the permanent answer for this file
+                reused = duplicate["result"]
+                with timings.stage("match"):
+                    match_catalogue_names(reused["medicines"])
+                emit_parsed(emit, reused)
+                return {
+                    "success": True,
+                    **reused,
+                    "nearDuplicate": {"distance": duplicate["distance"], "correlation": duplicate["correlation"]},
+                }
+
+        async def llm_extract():
+            return await ocr_with_llm(api_key, file_path, mime_type, emit, timings)
+
+        # Clear prints are read locally; the LLM handles the rest
+        emit({"event": "progress", "stage": "routing"})
+        result = await ocr_router.extract(file_path, mime_type, llm_extract if api_key else None, timings)
+        if result["backend"] == "local":
+            with timings.stage("match"):
+                match_catalogue_names(result["medicines"])
+            emit_parsed(emit, result)
+
+        # Only cache clean structured LLM results; local reads, raw fallbacks,
+        # repaired responses and partial PDFs should be retried
+        cacheable = result["backend"] == "llm" and not result.get("note") and not result.get("parseWarnings")
+        if cacheable and not any("error" in page for page in result.get("pages", [])):
+            entry = {"medicines": result["medicines"], "extractedText": result["extractedText"]}
+            if key is not None:
+                result_cache.put(key, entry)
+            if fingerprint is not None:
+                near_duplicates.add(fingerprint, entry)
+
+        return {"success": True, **result}
+
     except Exception as e:
         return {
             "success": False,
             "error": f"OCR processing failed: {str(e)}"
         }
 
+def render_metrics():
+    """OCR stage histograms, LLM client counters and cache counters as OpenMetrics text"""
+    text = ocr_metrics.render()
+    for name, value in llm_client.stats.items():
+        text += f"# TYPE ocr_llm_{name} counter\nocr_llm_{name}_total {value}\n"
+    for name, value in ocr_router.stats.items():
+        text += f"# TYPE ocr_router_{name} counter\nocr_router_{name}_total {value}\n"
+    if llm_fixtures is not None:
+        for name, value in llm_fixtures.stats.items():
+            text += f"# TYPE ocr_fixtures_{name} counter\nocr_fixtures_{name}_total {value}\n"
+    if llm_transport is not None:
+        for name, value in llm_transport.pool.stats.items():
+            text += f"# TYPE ocr_llm_connections_{name} counter\nocr_llm_connections_{name}_total {value}\n"
+    if upload_budget is not None:
+        text += f"# TYPE ocr_upload_budget_bytes gauge\nocr_upload_budget_bytes{{kind=\"capacity\"}} {upload_budget.capacity}\n"
+        text += f"ocr_upload_budget_bytes{{kind=\"inUse\"}} {upload_budget.in_use}\nocr_upload_budget_bytes{{kind=\"peak\"}} {upload_budget.peak}\n"
+    peak_rss = peak_rss_bytes()
+    if peak_rss is not None:
+        text += f"# TYPE ocr_peak_rss_bytes gauge\nocr_peak_rss_bytes {peak_rss}\n"
+    if result_cache is not None:
+        text += result_cache.render_metrics()
+    if near_duplicates is not None:
+        text += near_duplicates.render_metrics()
+    return text
+
+def write_line(payload):
+    """Write one JSON line to stdout and flush it immediately"""
+    sys.stdout.write(json.dumps(payload) + "\n")
+    sys.stdout.flush()
+
+async def handle_job(job, semaphore):
+    """
+    Run a single OCR job received in server mode and write its result line
+    """
+    job_id = job.get("id")
+    if job.get("command") == "cacheStats":
+        stats = result_cache.stats() if result_cache is not None else None
+        write_line({"id": job_id, "success": stats is not None, "cache": stats})
+        return
+    if job.get("command") == "metrics":
+        write_line({"id": job_id, "success": True, "metrics": render_metrics()})
+        return
+
+    # Streaming jobs get their incremental events tagged with the job id
+    on_event = (lambda event: write_line({"id": job_id, **event})) if job.get("stream") else None
+
+    async with semaphore:
+        try:
+            result = await extract_medicines_from_prescription(
+                job["filePath"], job["mimeType"], on_event, match_pharmacies=job.get("matchPharmacies")
+            )
+        except KeyError as e:
+            result = {"success": False, "error": f"Missing field in job: {str(e)}"}
+        except Exception as e:
+            # The caller waits for exactly one result line per job
+            result = {"success": False, "error": f"OCR processing failed: {str(e)}"}
+    write_line({"id": job_id, **result})
+
+async def serve():
+    """
+    Long-lived worker mode: read JSON-lines jobs from stdin and write one
+    JSON-lines result per job to stdout, tagged with the job id.
+
+    Each job looks like {"id": "...", "filePath": "...", "mimeType": "..."};
+    with "stream": true its incremental events (lines with an "event" key)
+    are written before the final result line.
+    {"id": "...", "command": "cacheStats"} returns the result cache counters
+    and {"id": "...", "command": "metrics"} the OpenMetrics text, which is
+    also served over HTTP at /metrics when OCR_METRICS_PORT is set.
+    The interpreter, environment and LLM integration stay loaded between jobs.
+    """
+    concurrency = int(os.getenv('OCR_WORKER_CONCURRENCY', '4'))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    metrics_port = os.getenv('OCR_METRICS_PORT')
+    if metrics_port:
+        serve_metrics(int(metrics_port), render_metrics)
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    pending = set()
+    write_line({"event": "ready", "concurrency": concurrency})
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            job = json.loads(line)
+        except json.JSONDecodeError as e:
+            write_line({"id": None, "success": False, "error": f"Invalid job line: {str(e)}"})
+            continue
+        if not isinstance(job, dict):
+            write_line({"id": None, "success": False, "error": "Invalid job line: expected a JSON object"})
+            continue
+
+        task = asyncio.create_task(handle_job(job, semaphore))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    # Drain in-flight jobs before exiting on stdin EOF
+    if pending:
+        await asyncio.gather(*pending)
+
+SUPPORTED_MIME_TYPES = {"image/jpeg", "image/jpg", "image/png", "application/pdf"}
+
+def guess_mime_type(file_path):
+    """Guess a prescription mime type from the file extension"""
+    mime_type, _ = mimetypes.guess_type(file_path)
+    return mime_type if mime_type in SUPPORTED_MIME_TYPES else None
+
+def iter_batch_jobs(source):
+    """
+    Yield {"id", "filePath", "mimeType"} jobs from a directory, a glob
+    pattern or a JSONL manifest.
+
+    Manifest lines need a "filePath" and may carry "id" and "mimeType";
+    directory and glob entries use the file path as id and infer the type.
+    """
+    if source.endswith(".jsonl") and os.path.isfile(source):
+        with open(source) as manifest:
+            for line_no, line in enumerate(manifest, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield {"id": f"{source}:{line_no}", "error": f"Invalid manifest line: {str(e)}"}
+                    continue
+                file_path = entry.get("filePath")
+                yield {
+                    "id": entry.get("id", file_path),
+                    "filePath": file_path,
+                    "mimeType": entry.get("mimeType") or (guess_mime_type(file_path) if file_path else None)
+                }
+        return
+
+    if os.path.isdir(source):
+        paths = (os.path.join(root, name) for root, _, names in os.walk(source) for name in sorted(names))
+    else:
+        paths = glob.iglob(source, recursive=True)
+
+    for file_path in paths:
+        mime_type = guess_mime_type(file_path)
+        if mime_type and os.path.isfile(file_path):
+            yield {"id": file_path, "filePath": file_path, "mimeType": mime_type}
+
+async def process_batch_job(job):
+    """Run one batch job, turning manifest problems into error results"""
+    if job.get("error"):
+        return {"success": False, "error": job["error"]}
+    if not job.get("filePath") or not job.get("mimeType"):
+        return {"success": False, "error": "Job needs a filePath and a supported mimeType"}
+    return await extract_medicines_from_prescription(job["filePath"], job["mimeType"])
+
+async def run_batch(argv):
+    """
+    Batch mode: fan prescriptions out over a bounded pool of asyncio workers
+    and stream one JSON result line per file as soon as it completes,
+    followed by a summary line.
+    """
+    parser = argparse.ArgumentParser(prog="ocr_processor.py --batch")
+    parser.add_argument("source", help="Directory, glob pattern or JSONL manifest of prescriptions")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv('OCR_BATCH_CONCURRENCY', '8')))
+    args = parser.parse_args(argv)
+
+    # Bounded queue keeps memory flat for very large backfills
+    queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    counts = {"total": 0, "succeeded": 0, "failed": 0}
+    started = time.monotonic()
+
+    async def worker():
+        while True:
+            job = await queue.get()
+            if job is None:
+                return
+            result = await process_batch_job(job)
+            counts["total"] += 1
+            counts["succeeded" if result.get("success") else "failed"] += 1
+            write_line({"id": job.get("id"), "filePath": job.get("filePath"), **result})
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, args.concurrency))]
+    for job in iter_batch_jobs(args.source):
+        await queue.put(job)
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+
+    write_line({"event": "done", **counts, "elapsedSeconds": round(time.monotonic() - started, 3)})
+
+USAGE = "Usage: python ocr_processor.py [--stream] <file_path> <mime_type> | --stdin <mime_type> | --fd <fd> <mime_type> | --serve | --batch <source>"
+
 async def main():
+    if len(sys.argv) == 2 and sys.argv[1] == "--serve":
+        await serve()
+        return
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "--batch":
+        await run_batch(sys.argv[2:])
+        return
+
+    # Input streamed on stdin or an inherited descriptor: spooled to a temp
+    # file in chunks, never held in memory whole
+    if len(sys.argv) >= 2 and sys.argv[1] in ("--stdin", "--fd"):
+        if sys.argv[1] == "--stdin" and len(sys.argv) == 3:
+            stream, mime_type = sys.stdin.buffer, sys.argv[2]
+        elif sys.argv[1] == "--fd" and len(sys.argv) == 4 and sys.argv[2].isdigit():
+            stream, mime_type = os.fdopen(int(sys.argv[2]), "rb"), sys.argv[3]
+        else:
+            print(json.dumps({"success": False, "error": USAGE}))
+            sys.exit(1)
+        input_path = spool_stream(stream, mimetypes.guess_extension(mime_type) or "")
+        try:
+            timings = JobTimings()
+            timings.record("startup", STARTUP_SECONDS)
+            result = await extract_medicines_from_prescription(input_path, mime_type, timings=timings)
+        finally:
+            os.remove(input_path)
+        print(json.dumps(result))
+        return
+
+    # Streaming one-shot mode: newline-delimited events, then the result
+    if len(sys.argv) == 4 and sys.argv[1] == "--stream":
+        timings = JobTimings()
+        timings.record("startup", STARTUP_SECONDS)
+        result = await extract_medicines_from_prescription(sys.argv[2], sys.argv[3], write_line, timings)
+        write_line({"event": "result", **result})
+        return
+
     if len(sys.argv) != 3:
-        print(json.dumps({"success": False, "error": "Usage: python ocr_processor.py <file_path> <mime_type>"}))
+        print(json.dumps({"success": False, "error": USAGE}))
         sys.exit(1)
     
     file_path = sys.argv[1]
     mime_type = sys.argv[2]
     
-    result = await extract_medicines_from_prescription(file_path, mime_type)
+    # A one-shot run pays interpreter and import startup on every call
+    timings = JobTimings()
+    timings.record("startup", STARTUP_SECONDS)
+    result = await extract_medicines_from_prescription(file_path, mime_type, timings=timings)
     print(json.dumps(result))
 
 if __name__ == "__main__":
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Durable prescription OCR queue consumer.
+
+The prescriptions table is the queue: UPLOADED rows are claimed with a
+lease (status PROCESSING, ocrLeaseOwner, ocrLeaseExpiresAt), processed by
+extract_medicines_from_prescription on a bounded pool of asyncio workers,
+and kept alive by a heartbeat that extends the lease of every in-flight
+job. Results are written back in batches, fenced on the lease owner so a
+worker whose lease expired can never overwrite a newer claim. Leases that
+expire (crashed or stuck workers, or an inline route run that never
+finished) are put back to UPLOADED. The process route leases the rows it
+processes inline, so PROCESSING rows without a lease can only be left over
+from before queue mode; they are requeued after --stale-after, and only
+when OCR_QUEUE_MODE=1, where the route no longer processes anything itself. After --max-attempts failures a
+prescription is REJECTED with the error in ocrData.
+
+Run several consumers (or --processes N) to scale throughput; the lease
+makes concurrent claims safe.
+
+Usage:
+    python ocr_queue.py [--workers 4] [--processes 1] [--lease-seconds 120] [--once]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import socket
+import asyncio
+import argparse
+import multiprocessing
+from datetime import datetime, timezone
+
+import prisma_db
+
+# Added to the prescriptions table when missing, matching prisma/schema.prisma
+LEASE_COLUMNS = {
+    "ocrLeaseOwner": "TEXT",
+    "ocrLeaseExpiresAt": "DATETIME",
+    "ocrAttempts": "INTEGER NOT NULL DEFAULT 0",
+}
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class PrescriptionQueue:
+    """Lease-based claims on the prescriptions table; use from one thread"""
+
+    def __init__(self, path=None, owner=None, lease_seconds=120.0, max_attempts=3, stale_seconds=900.0, reclaim_unleased=False):
+        self.conn = prisma_db.connect(path)
+        self.conn.isolation_level = None  # explicit BEGIN IMMEDIATE for claims
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_ms = int(lease_seconds * 1000)
+        self.max_attempts = max_attempts
+        self.stale_ms = int(stale_seconds * 1000)
+        self.reclaim_unleased = reclaim_unleased
+
+    def ensure_columns(self):
+        existing = {row[1] for row in self.conn.execute('PRAGMA table_info("prescriptions")')}
+        for column, definition in LEASE_COLUMNS.items():
+            if column not in existing:
+                self.conn.execute(f'ALTER TABLE "prescriptions" ADD COLUMN "{column}" {definition}')
+
+    def claim(self, limit):
+        """Atomically lease up to `limit` of the oldest UPLOADED prescriptions"""
+        if limit <= 0:
+            return []
+        now = prisma_db.now_ms()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(
+                'SELECT id, "filePath", "mimeType", "ocrAttempts" FROM prescriptions '
+                'WHERE status = \'UPLOADED\' ORDER BY "createdAt" LIMIT ?',
+                (limit,),
+            ).fetchall()
+            self.conn.executemany(
+                'UPDATE prescriptions SET status = \'PROCESSING\', "ocrLeaseOwner" = ?, "ocrLeaseExpiresAt" = ?, '
+                '"ocrAttempts" = "ocrAttempts" + 1 WHERE id = ?',
+                [(self.owner, now + self.lease_ms, row[0]) for row in rows],
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return [{"id": row[0], "filePath": row[1], "mimeType": row[2], "attempts": row[3] + 1} for row in rows]
+
+    def heartbeat(self, ids):
+        """Extend the leases this consumer still holds"""
+        if not ids:
+            return 0
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = self.conn.executemany(
+                'UPDATE prescriptions SET "ocrLeaseExpiresAt" = ? WHERE id = ? AND "ocrLeaseOwner" = ?',
+                [(prisma_db.now_ms() + self.lease_ms, job_id, self.owner) for job_id in ids],
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    def complete(self, outcomes):
+        """
+        Write finished jobs in one transaction. outcomes are
+        (job, status, ocr_data) with status PROCESSED, REJECTED or UPLOADED
+        (retry). Returns how many rows were still leased to this consumer.
+        """
+        if not outcomes:
+            return 0
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = self.conn.executemany(
+                'UPDATE prescriptions SET status = ?, "ocrData" = COALESCE(?, "ocrData"), "ocrLeaseOwner" = NULL, '
+                '"ocrLeaseExpiresAt" = NULL WHERE id = ? AND "ocrLeaseOwner" = ?',
+                [(status, ocr_data, job["id"], self.owner) for job, status, ocr_data in outcomes],
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    def requeue_expired(self):
+        """
+        Put expired leases back to UPLOADED, or REJECTED once out of
+        attempts. Returns (requeued, rejected).
+        """
+        now = prisma_db.now_ms()
+        # createdAt is the upload time, not when processing started: unleased
+        # rows are only safe to reclaim when nothing processes them inline
+        stale_before = now - self.stale_ms if self.reclaim_unleased else -1
+        expired = '''status = 'PROCESSING' AND (
+            ("ocrLeaseExpiresAt" IS NOT NULL AND "ocrLeaseExpiresAt" < ?)
+            OR ("ocrLeaseExpiresAt" IS NULL AND "createdAt" < ?))'''
+        error = json.dumps({"error": "OCR did not finish within the allowed attempts", "processedAt": iso_now()})
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rejected = self.conn.execute(
+                f'UPDATE prescriptions SET status = \'REJECTED\', "ocrData" = ?, "ocrLeaseOwner" = NULL, '
+                f'"ocrLeaseExpiresAt" = NULL WHERE {expired} AND "ocrAttempts" >= ?',
+                (error, now, stale_before, self.max_attempts),
+            ).rowcount
+            requeued = self.conn.execute(
+                f'UPDATE prescriptions SET status = \'UPLOADED\', "ocrLeaseOwner" = NULL, "ocrLeaseExpiresAt" = NULL WHERE {expired}',
+                (now, stale_before),
+            ).rowcount
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return requeued, rejected
+
+    def close(self):
+        self.conn.close()
+
+
+def iso_now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def outcome_for(job, result, max_attempts):
+    """Map an OCR result to the (job, status, ocrData) the queue writes back"""
+    if result.get("success"):
+        return job, "PROCESSED", json.dumps({
+            "medicines": result.get("medicines", []),
+            "extractedText": result.get("extractedText", ""),
+            "matchingPharmacies": result.get("matchingPharmacies", []),
+            "processedAt": iso_now(),
+        })
+    if job["attempts"] < max_attempts:
+        return job, "UPLOADED", None
+    return job, "REJECTED", json.dumps({"error": result.get("error", "OCR failed"), "processedAt": iso_now()})
+
+
+async def consume(args, stop):
+    # Imported here so every --processes child loads the LLM integration itself
+    from ocr_processor import extract_medicines_from_prescription
+
+    queue = PrescriptionQueue(args.db, lease_seconds=args.lease_seconds, max_attempts=args.max_attempts,
+                              stale_seconds=args.stale_after, reclaim_unleased=os.getenv("OCR_QUEUE_MODE") == "1")
+    queue.ensure_columns()
+    counts = {"claimed": 0, "processed": 0, "retried": 0, "rejected": 0, "lostLeases": 0, "requeued": 0}
+    in_flight = {}
+    finished = []
+    last_flush = last_heartbeat = last_requeue = 0.0
+
+    async def run_job(job):
+        file_path = job["filePath"] if os.path.isabs(job["filePath"]) else os.path.join(args.root, job["filePath"])
+        try:
+            result = await extract_medicines_from_prescription(file_path, job["mimeType"], match_pharmacies=True)
+        except Exception as e:
+            result = {"success": False, "error": f"OCR processing failed: {str(e)}"}
+        finished.append(outcome_for(job, result, args.max_attempts))
+
+    def flush():
+        nonlocal last_flush
+        batch = finished[:]
+        written = queue.complete(batch)
+        # Only once written: a failed write keeps the results for the next flush
+        del finished[:len(batch)]
+        for _, status, _ in batch:
+            counts[{"PROCESSED": "processed", "UPLOADED": "retried", "REJECTED": "rejected"}[status]] += 1
+        counts["lostLeases"] += len(batch) - written
+        last_flush = time.monotonic()
+
+    try:
+        while True:
+            now = time.monotonic()
+            if now - last_requeue >= args.lease_seconds / 2:
+                requeued, rejected = queue.requeue_expired()
+                counts["requeued"] += requeued
+                counts["rejected"] += rejected
+                last_requeue = now
+
+            claimed = []
+            if not stop.is_set():
+                claimed = queue.claim(args.workers - len(in_flight))
+                counts["claimed"] += len(claimed)
+                for job in claimed:
+                    in_flight[job["id"]] = asyncio.create_task(run_job(job))
+
+            if in_flight:
+                done, _ = await asyncio.wait(in_flight.values(), timeout=args.poll_interval, return_when=asyncio.FIRST_COMPLETED)
+                for job_id in [job_id for job_id, task in in_flight.items() if task in done]:
+                    del in_flight[job_id]
+            elif stop.is_set() or (args.once and not claimed):
+                break
+            else:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=args.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            now = time.monotonic()
+            if finished and (len(finished) >= args.batch_size or now - last_flush >= args.flush_interval or not in_flight):
+                flush()
+            if in_flight and now - last_heartbeat >= args.lease_seconds / 3:
+                queue.heartbeat(list(in_flight))
+                last_heartbeat = now
+    finally:
+        if finished:
+            flush()
+        queue.close()
+
+    print(json.dumps({"event": "done", "owner": queue.owner, **counts}), flush=True)
+    return counts
+
+
+def run_consumer(args):
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            # Stop claiming, finish in-flight jobs, flush, exit
+            loop.add_signal_handler(sig, stop.set)
+        await consume(args, stop)
+
+    asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consume UPLOADED prescriptions and run OCR on them")
+    parser.add_argument("--db", help="SQLite database path (defaults to DATABASE_URL / prisma/dev.db)")
+    parser.add_argument("--root", default=os.getenv("OCR_UPLOAD_ROOT", APP_ROOT), help="Directory prescription filePaths are relative to")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("OCR_QUEUE_WORKERS", "4")), help="Concurrent jobs per process")
+    parser.add_argument("--processes", type=int, default=1, help="Consumer processes to run")
+    parser.add_argument("--lease-seconds", type=float, default=120.0)
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--stale-after", type=float, default=900.0, help="Requeue unleased PROCESSING rows older than this many seconds (OCR_QUEUE_MODE=1 only)")
+    parser.add_argument("--batch-size", type=int, default=20, help="Results written per transaction")
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="Maximum seconds a finished result waits to be written")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_consumer(args)
+        return 0
+
+    children = [multiprocessing.Process(target=run_consumer, args=(args,)) for _ in range(args.processes)]
+    for child in children:
+        child.start()
+
+    def forward(signum, frame):
+        for child in children:
+            if child.pid:
+                os.kill(child.pid, signum)
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+    for child in children:
+        child.join()
+    return 0 if all(child.exitcode == 0 for child in children) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
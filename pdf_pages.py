@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Lazy page splitting for multi-page prescription PDFs.
+
+Pages are materialised one at a time into temporary files so only the pages
+currently being processed are held on disk. PyMuPDF rasterizes pages to PNG
+(so the image pre-processing pipeline applies); pypdf is used as a fallback
+to split pages into single-page PDFs. Without either, callers fall back to
+sending the whole document.
+
+write_page may be called from worker threads; access to the open document
+is serialised because neither library's document objects are thread-safe.
+"""
+import os
+import tempfile
+import threading
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = None
+
+RASTER_DPI = 200
+
+
+def is_available():
+    return fitz is not None or PdfReader is not None
+
+
+class PdfPageSource:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        if fitz is not None:
+            self._doc = fitz.open(file_path)
+            if self._doc.needs_pass:
+                self._doc.close()
+                raise ValueError("PDF is encrypted")
+            self.page_count = self._doc.page_count
+        elif PdfReader is not None:
+            self._doc = PdfReader(file_path)
+            if self._doc.is_encrypted:
+                raise ValueError("PDF is encrypted")
+            self.page_count = len(self._doc.pages)
+        else:
+            raise RuntimeError("PDF page splitting needs PyMuPDF or pypdf")
+
+    def write_page(self, index):
+        """
+        Write page `index` (0-based) to a temporary file and return
+        (path, mime_type). The caller deletes the file.
+        """
+        with self._lock:
+            return self._write_page(index)
+
+    def _write_page(self, index):
+        if fitz is not None:
+            fd, path = tempfile.mkstemp(prefix="ocr_page_", suffix=".png")
+            os.close(fd)
+            pixmap = self._doc.load_page(index).get_pixmap(dpi=RASTER_DPI)
+            pixmap.save(path)
+            return path, "image/png"
+
+        writer = PdfWriter()
+        writer.add_page(self._doc.pages[index])
+        fd, path = tempfile.mkstemp(prefix="ocr_page_", suffix=".pdf")
+        with os.fdopen(fd, "wb") as out:
+            writer.write(out)
+        return path, "application/pdf"
+
+    def close(self):
+        if fitz is not None:
+            self._doc.close()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Pharmacy matching for OCR'd prescriptions, straight from the database.
+
+Replaces the route's loopback POST /api/search/medicines: one read-only
+query joins the requested names against in-stock, active medicines of
+approved pharmacies, with every filter in SQL, and the rows are grouped
+per pharmacy in one pass. Names that were matched to the catalogue
+(canonicalName) are looked up by equality on medicines.name, which uses
+the @@index([name]) index, together with every other catalogue spelling
+of the same medicine ("Paracetamol" and "Paracetamol 500mg Tablets"), so
+no SKU is lost to the exact match; raw OCR spellings fall back to the
+substring match the API route used.
+
+Each result has the route's shape: pharmacy, availableMedicines (each
+with its prescriptionMatch), matchedCount (requested medicines the
+pharmacy stocks), coveragePercentage and totalValue, the price of the
+cheapest matching product for every covered medicine. Results are sorted
+by coverage, then by total value.
+
+Usage:
+    python pharmacy_match.py <medicine name> [<medicine name> ...]
+    python pharmacy_match.py --self-test
+"""
+import sys
+import json
+import sqlite3
+import argparse
+
+import prisma_db
+from medicine_index import MedicineNameIndex
+
+
+def requested_names(medicines):
+    """(name, exact) pairs for OCR medicines, de-duplicated, catalogue names exact"""
+    seen = set()
+    names = []
+    for medicine in medicines:
+        canonical = medicine.get("canonicalName")
+        name = (canonical or medicine.get("name") or medicine.get("medicine_name") or "").strip()
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append((name, bool(canonical)))
+    return names
+
+
+def like_pattern(name):
+    escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def find_matching_pharmacies(conn, names, spellings=None):
+    """
+    Match (name, exact) pairs against the catalogue in one query and group
+    the hits per pharmacy. spellings maps an exact name to the other
+    catalogue names stored under the same normalized name; each is matched
+    by equality too.
+    """
+    if not names:
+        return []
+
+    spellings = spellings or {}
+    exact = [(i, spelling) for i, (name, is_exact) in enumerate(names) if is_exact
+             for spelling in sorted({name, *spellings.get(name, ())})]
+    fuzzy = [(i, like_pattern(name)) for i, (name, is_exact) in enumerate(names) if not is_exact]
+    columns = '''m.id, m.name, m.description, m.price, m.unit, m.stock, p.id, p.name, p.address, p.phone'''
+    filters = '''m."isActive" = 1 AND m.stock > 0 AND p."isApproved" = 1'''
+    branches = []
+    params = []
+    if exact:
+        values = ", ".join("(?, ?)" for _ in exact)
+        branches.append(
+            f'SELECT w.position, {columns} FROM (SELECT column1 AS position, column2 AS name FROM (VALUES {values})) w '
+            f'JOIN medicines m ON m.name = w.name JOIN pharmacies p ON p.id = m."pharmacyId" WHERE {filters}'
+        )
+        params += [value for pair in exact for value in pair]
+    if fuzzy:
+        values = ", ".join("(?, ?)" for _ in fuzzy)
+        branches.append(
+            f'SELECT w.position, {columns} FROM (SELECT column1 AS position, column2 AS pattern FROM (VALUES {values})) w '
+            f"JOIN medicines m ON m.name LIKE w.pattern ESCAPE '\\' JOIN pharmacies p ON p.id = m.\"pharmacyId\" WHERE {filters}"
+        )
+        params += [value for pair in fuzzy for value in pair]
+
+    groups = {}
+    for row in conn.execute(" UNION ALL ".join(branches), params):
+        position, medicine_id, name, description, price, unit, stock, pharmacy_id, pharmacy_name, address, phone = row
+        group = groups.get(pharmacy_id)
+        if group is None:
+            group = groups[pharmacy_id] = {
+                "pharmacy": {"id": pharmacy_id, "name": pharmacy_name, "address": address, "phone": phone, "isApproved": True},
+                "availableMedicines": [],
+                "cheapest": {},
+                "seen": set(),
+            }
+        # A product can match several requested names; list it once
+        if medicine_id not in group["seen"]:
+            group["seen"].add(medicine_id)
+            group["availableMedicines"].append({
+                "id": medicine_id,
+                "name": name,
+                "description": description,
+                "price": price,
+                "unit": unit,
+                "stock": stock,
+                "prescriptionMatch": names[position][0],
+            })
+        group["cheapest"][position] = min(price, group["cheapest"].get(position, price))
+
+    results = []
+    for group in groups.values():
+        covered = len(group["cheapest"])
+        results.append({
+            "pharmacy": group["pharmacy"],
+            "availableMedicines": group["availableMedicines"],
+            "matchedCount": covered,
+            "totalValue": round(sum(group["cheapest"].values()), 2),
+            "coveragePercentage": round(covered / len(names) * 100),
+        })
+    results.sort(key=lambda result: (-result["coveragePercentage"], result["totalValue"]))
+    return results
+
+
+def match_prescription(medicines, path=None, spellings=None):
+    """Open a read-only connection and match an OCR medicines list"""
+    conn = prisma_db.connect(path, readonly=True)
+    try:
+        return find_matching_pharmacies(conn, requested_names(medicines), spellings)
+    finally:
+        conn.close()
+
+
+def run_self_test():
+    """Two SKU spellings of one drug must both match its canonical name, as with the substring match"""
+    conn = sqlite3.connect(":memory:")
+    conn.executescript('''
+        CREATE TABLE pharmacies (id TEXT, name TEXT, address TEXT, phone TEXT, "isApproved" INTEGER);
+        CREATE TABLE medicines (id TEXT, name TEXT, description TEXT, price REAL, unit TEXT, stock INTEGER,
+                                "isActive" INTEGER, "pharmacyId" TEXT, "updatedAt" INTEGER);
+        INSERT INTO pharmacies VALUES ('medplus', 'MedPlus', '1 Main St', '011', 1);
+        INSERT INTO medicines VALUES ('m1', 'Paracetamol', NULL, 2.5, 'tablet', 100, 1, 'medplus', 1),
+                                     ('m2', 'Paracetamol 500mg Tablets', NULL, 3.0, 'strip', 20, 1, 'medplus', 1),
+                                     ('m3', 'Amoxicillin 250mg', NULL, 5.0, 'capsule', 10, 1, 'medplus', 1);
+    ''')
+    index = MedicineNameIndex()
+    index.load(conn)
+    canonical = index.lookup("Paracetamol 500mg")[0]["name"]
+    names = [(canonical, True)]
+    exact = find_matching_pharmacies(conn, names, {canonical: index.spellings(canonical)})
+    substring = find_matching_pharmacies(conn, [("Paracetamol", False)])
+    found = sorted(medicine["id"] for medicine in exact[0]["availableMedicines"]) if exact else []
+    expected = sorted(medicine["id"] for medicine in substring[0]["availableMedicines"])
+    conn.close()
+    return {"canonicalName": canonical, "matched": found, "expected": expected, "passed": found == expected == ["m1", "m2"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find approved pharmacies stocking the given medicines")
+    parser.add_argument("names", nargs="*")
+    parser.add_argument("--db", help="SQLite database path (defaults to DATABASE_URL / prisma/dev.db)")
+    parser.add_argument("--exact", action="store_true", help="Treat names as catalogue names (equality match)")
+    parser.add_argument("--self-test", action="store_true", help="Check canonical matching against an in-memory catalogue")
+    args = parser.parse_args()
+
+    if args.self_test:
+        result = run_self_test()
+        print(json.dumps(result))
+        return 0 if result["passed"] else 1
+    if not args.names:
+        parser.error("give at least one name or --self-test")
+
+    medicines = [{"name": name, "canonicalName": name if args.exact else None} for name in args.names]
+    spellings = None
+    if args.exact:
+        index = MedicineNameIndex.from_database(args.db)
+        spellings = {name: index.spellings(name) for name in args.names}
+    print(json.dumps(match_prescription(medicines, args.db, spellings)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Helpers for opening the Prisma SQLite database from Python tools.
+
+The path comes from DATABASE_URL ("file:./dev.db"), resolved the way Prisma
+does it: relative paths are relative to the prisma/ schema directory.
+Prisma stores DateTime columns as epoch milliseconds and Boolean columns as
+0/1, which is what the helpers below read and write.
+"""
+import os
+import time
+import sqlite3
+
+PRISMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prisma")
+DEFAULT_DATABASE_PATH = os.path.join(PRISMA_DIR, "dev.db")
+
+
+def database_path(url=None):
+    """Resolve a Prisma SQLite DATABASE_URL (or the env var) to a file path"""
+    url = url or os.getenv("DATABASE_URL")
+    if not url:
+        return DEFAULT_DATABASE_PATH
+    if url.startswith("file:"):
+        url = url[len("file:"):]
+    path = url.split("?", 1)[0]
+    if not os.path.isabs(path):
+        path = os.path.normpath(os.path.join(PRISMA_DIR, path))
+    return path
+
+
+def connect(path=None, readonly=False, timeout=30.0):
+    """Open the database; read-only connections never take write locks"""
+    path = path or database_path()
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=timeout, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+    conn.execute("PRAGMA busy_timeout = %d" % int(timeout * 1000))
+    return conn
+
+
+def now_ms():
+    """Current time in Prisma's DateTime storage format"""
+    return int(time.time() * 1000)
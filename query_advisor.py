@@ -0,0 +1,681 @@
+#!/usr/bin/env python3
+"""
+Query-plan profiler and index advisor for the Prisma SQLite database.
+
+Apart from primary keys, @unique columns and @@index([name]) on medicines
+(for exact catalogue-name lookups) the schema declares no secondary
+indexes; the OCR queue's lease columns on prescriptions carry none either.
+The admin analytics aggregates (orders, lab bookings and appointments
+filtered by status and createdAt), the pharmacy dashboard counts and the
+substring medicine search therefore scan whole tables once the data grows.
+This tool replays a set of queries against a database, times them, reads
+EXPLAIN QUERY PLAN for full table scans, temporary B-trees and automatic
+indexes, and measures candidate indexes before proposing them as
+`@@index([...])` lines for prisma/schema.prisma.
+
+Queries come from one or more sources:
+
+  --log FILE      Prisma query logs. lib/db.ts logs ['query'], so the Next.js
+                  output contains "prisma:query SELECT ..." lines (without
+                  parameter values)
+  --queries FILE  JSON lines as emitted by prisma.$on('query', e), i.e.
+                  {"query": ..., "params": "[...]", "duration": ms}; "sql"
+                  is accepted for "query", and "count" weights a line
+  --builtin       the hot queries of the admin analytics, pharmacy
+                  dashboard, order/booking lists and medicine search routes,
+                  written the way Prisma generates them
+
+Identical statements are grouped and weighted by how often they occur.
+Parameters that were not captured are synthesised from the data: equality
+and IN placeholders get values sampled from the column, lower range bounds
+the --range-quantile of the column (a "recent" createdAt window), upper
+bounds the quantile above it, LIKE a substring of a sampled value, LIMIT 50
+when the query sorts (a page) and -1 otherwise (Prisma's aggregate
+sub-selects), OFFSET 0. Captured ISO timestamps become epoch milliseconds,
+which is how Prisma stores DateTime.
+
+Candidate indexes are built per table from the equality columns followed by
+one range column, the ORDER BY or the GROUP BY columns, from single columns
+and join keys, and from the columns of any automatic index SQLite chose;
+candidates already served by the leading columns of an existing index are
+skipped. Selection is greedy: every candidate is created inside a savepoint,
+the queries whose plan changes are re-timed, and the one saving the most
+weighted time (and speeding at least one query up by --min-speedup) is kept
+before the next round. The whole run is one transaction that is rolled back,
+so the database is left as it was, but it holds the write lock meanwhile;
+run it against a copy scaled up with synthetic_data.py, e.g.
+
+    cp prisma/dev.db /tmp/scaled.db
+    python synthetic_data.py --db /tmp/scaled.db --orders 300000 --lab-bookings 150000 --appointments 150000
+
+Prisma never runs ANALYZE, so neither does this tool: plans are the ones the
+application gets.
+
+Usage:
+    python query_advisor.py --builtin [--db /tmp/scaled.db] [--repeat 5] [--max-indexes 8] [--min-speedup 1.5]
+    python query_advisor.py --log next-dev.log [--queries captured.jsonl] [--db /tmp/scaled.db]
+    python query_advisor.py --builtin --explain-only
+    python query_advisor.py --builtin --emit-schema
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+from datetime import datetime, timezone
+
+import prisma_db
+
+SCHEMA_PATH = os.path.join(prisma_db.PRISMA_DIR, "schema.prisma")
+PAGE_LIMIT = 50
+
+# Hot route queries in Prisma's SQLite dialect; the route each one comes
+# from is the group name
+BUILTIN_QUERIES = [
+    ("admin/analytics", "SELECT `main`.`users`.`role`, COUNT(`main`.`users`.`id`) AS `_count$id` FROM `main`.`users` "
+     "WHERE `main`.`users`.`createdAt` >= ? GROUP BY `main`.`users`.`role` LIMIT ? OFFSET ?"),
+    ("admin/analytics", "SELECT SUM(`totalAmount`), SUM(`commissionAmount`), COUNT(`id`) FROM (SELECT `main`.`orders`.`totalAmount`, "
+     "`main`.`orders`.`commissionAmount`, `main`.`orders`.`id` FROM `main`.`orders` WHERE (`main`.`orders`.`status` = ? "
+     "AND `main`.`orders`.`createdAt` >= ?) LIMIT ? OFFSET ?) AS `sub`"),
+    ("admin/analytics", "SELECT SUM(`totalAmount`), SUM(`commissionAmount`), COUNT(`id`) FROM (SELECT `main`.`lab_bookings`.`totalAmount`, "
+     "`main`.`lab_bookings`.`commissionAmount`, `main`.`lab_bookings`.`id` FROM `main`.`lab_bookings` WHERE "
+     "(`main`.`lab_bookings`.`status` = ? AND `main`.`lab_bookings`.`createdAt` >= ?) LIMIT ? OFFSET ?) AS `sub`"),
+    ("admin/analytics", "SELECT SUM(`consultationFee`), SUM(`commissionAmount`), COUNT(`id`) FROM (SELECT `main`.`appointments`.`consultationFee`, "
+     "`main`.`appointments`.`commissionAmount`, `main`.`appointments`.`id` FROM `main`.`appointments` WHERE "
+     "(`main`.`appointments`.`status` = ? AND `main`.`appointments`.`createdAt` >= ?) LIMIT ? OFFSET ?) AS `sub`"),
+    ("admin/analytics", "SELECT DATE(createdAt) as date, SUM(totalAmount) as revenue, COUNT(*) as orders FROM orders "
+     "WHERE status = 'DELIVERED' AND createdAt >= ? GROUP BY DATE(createdAt) ORDER BY date DESC LIMIT 30"),
+    ("admin/analytics", "SELECT `main`.`orders`.`pharmacyId`, `main`.`orders`.`totalAmount`, `main`.`orders`.`commissionAmount` FROM `main`.`orders` "
+     "WHERE (`main`.`orders`.`status` = ? AND `main`.`orders`.`createdAt` >= ? AND `main`.`orders`.`pharmacyId` IN (?,?,?,?,?,?,?,?,?,?))"),
+    ("pharmacy/dashboard", "SELECT COUNT(*) AS `_count$_all` FROM (SELECT `main`.`orders`.`id` FROM `main`.`orders` "
+     "WHERE `main`.`orders`.`pharmacyId` = ? LIMIT ? OFFSET ?) AS `sub`"),
+    ("pharmacy/dashboard", "SELECT SUM(`totalAmount`) FROM (SELECT `main`.`orders`.`totalAmount` FROM `main`.`orders` "
+     "WHERE (`main`.`orders`.`pharmacyId` = ? AND `main`.`orders`.`status` = ?) LIMIT ? OFFSET ?) AS `sub`"),
+    ("pharmacy/dashboard", "SELECT COUNT(*) AS `_count$_all` FROM (SELECT `main`.`medicines`.`id` FROM `main`.`medicines` "
+     "WHERE `main`.`medicines`.`pharmacyId` = ? LIMIT ? OFFSET ?) AS `sub`"),
+    ("pharmacy/dashboard", "SELECT COUNT(*) AS `_count$_all` FROM (SELECT `main`.`orders`.`id` FROM `main`.`orders` "
+     "WHERE (`main`.`orders`.`pharmacyId` = ? AND `main`.`orders`.`createdAt` >= ? AND `main`.`orders`.`createdAt` < ?) LIMIT ? OFFSET ?) AS `sub`"),
+    ("pharmacy/dashboard", "SELECT SUM(`totalAmount`) FROM (SELECT `main`.`orders`.`totalAmount` FROM `main`.`orders` "
+     "WHERE (`main`.`orders`.`pharmacyId` = ? AND `main`.`orders`.`status` = ? AND `main`.`orders`.`createdAt` >= ?) LIMIT ? OFFSET ?) AS `sub`"),
+    ("pharmacy/dashboard", "SELECT COUNT(*) AS `_count$_all` FROM (SELECT `main`.`medicines`.`id` FROM `main`.`medicines` "
+     "WHERE (`main`.`medicines`.`pharmacyId` = ? AND `main`.`medicines`.`stock` <= ?) LIMIT ? OFFSET ?) AS `sub`"),
+    ("pharmacy/dashboard", "SELECT `main`.`orders`.`id`, `main`.`orders`.`status`, `main`.`orders`.`totalAmount`, `main`.`orders`.`createdAt` "
+     "FROM `main`.`orders` WHERE `main`.`orders`.`pharmacyId` = ? ORDER BY `main`.`orders`.`createdAt` DESC LIMIT ? OFFSET ?"),
+    ("pharmacy/dashboard", "SELECT `main`.`order_items`.`id`, `main`.`order_items`.`orderId`, `main`.`order_items`.`medicineId`, "
+     "`main`.`order_items`.`quantity` FROM `main`.`order_items` WHERE (`main`.`order_items`.`orderId`) IN (SELECT `t1`.`id` "
+     "FROM `main`.`orders` AS `t1` WHERE (`t1`.`pharmacyId` = ? AND `t1`.`status` = ?) AND `t1`.`id` IS NOT NULL) "
+     "ORDER BY `main`.`order_items`.`quantity` DESC LIMIT ? OFFSET ?"),
+    ("pharmacy/dashboard", "SELECT COUNT(*) AS `_count$_all` FROM (SELECT `main`.`orders`.`id` FROM `main`.`orders` "
+     "WHERE (`main`.`orders`.`pharmacyId` = ? AND `main`.`orders`.`status` IN (?,?)) LIMIT ? OFFSET ?) AS `sub`"),
+    ("pharmacy/orders", "SELECT `main`.`orders`.`id`, `main`.`orders`.`status`, `main`.`orders`.`totalAmount`, `main`.`orders`.`createdAt` "
+     "FROM `main`.`orders` WHERE (`main`.`orders`.`pharmacyId` = ? AND `main`.`orders`.`status` = ?) ORDER BY `main`.`orders`.`createdAt` DESC"),
+    ("orders", "SELECT `main`.`orders`.`id`, `main`.`orders`.`status`, `main`.`orders`.`totalAmount`, `main`.`orders`.`createdAt` "
+     "FROM `main`.`orders` WHERE `main`.`orders`.`patientId` = ? ORDER BY `main`.`orders`.`createdAt` DESC"),
+    ("lab-bookings", "SELECT `main`.`lab_bookings`.`id`, `main`.`lab_bookings`.`status`, `main`.`lab_bookings`.`scheduledDate` "
+     "FROM `main`.`lab_bookings` WHERE `main`.`lab_bookings`.`patientId` = ? ORDER BY `main`.`lab_bookings`.`createdAt` DESC"),
+    ("appointments", "SELECT `main`.`appointments`.`id`, `main`.`appointments`.`status`, `main`.`appointments`.`scheduledAt` "
+     "FROM `main`.`appointments` WHERE `main`.`appointments`.`patientId` = ? ORDER BY `main`.`appointments`.`createdAt` DESC"),
+    ("search/medicines", "SELECT `main`.`medicines`.`id`, `main`.`medicines`.`name`, `main`.`medicines`.`price`, `main`.`medicines`.`pharmacyId` "
+     "FROM `main`.`medicines` WHERE (`main`.`medicines`.`isActive` = ? AND `main`.`medicines`.`stock` > ? AND "
+     "(`main`.`medicines`.`name` LIKE ? OR `main`.`medicines`.`description` LIKE ?))"),
+]
+
+ANSI_PATTERN = re.compile(r"\x1b\[[0-9;]*m")
+LOG_PATTERN = re.compile(r"prisma:query\s+(.*\S)")
+ISO_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d+)?( UTC|Z|[+-]\d{2}:?\d{2})?$")
+
+# Against normalised SQL: identifier quotes and the "main." schema removed
+COLUMN = r"(?:(\w+)\.)?(\w+)"
+COMPARISON_PATTERN = re.compile(COLUMN + r"\)?\s*(=|==|>=|<=|>|<)\s*(\?|'[^']*'|-?\d+(?:\.\d+)?|" + COLUMN + ")")
+IN_PATTERN = re.compile(COLUMN + r"\)?\s+IN\s*\(", re.IGNORECASE)
+BETWEEN_PATTERN = re.compile(COLUMN + r"\s+BETWEEN\b", re.IGNORECASE)
+TABLE_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+CLAUSE_END = r"(?=\bLIMIT\b|\bOFFSET\b|\bHAVING\b|\bORDER\s+BY\b|\)|$)"
+ORDER_PATTERN = re.compile(r"\bORDER\s+BY\s+(.+?)" + CLAUSE_END, re.IGNORECASE)
+GROUP_PATTERN = re.compile(r"\bGROUP\s+BY\s+(.+?)" + CLAUSE_END, re.IGNORECASE)
+NOT_ALIASES = {"WHERE", "JOIN", "LEFT", "INNER", "CROSS", "ON", "GROUP", "ORDER", "LIMIT", "AS", "USING", "NATURAL"}
+
+# Text in front of a placeholder, for synthesising its value
+PLACEHOLDER_CONTEXT = [
+    ("limit", re.compile(r"\bLIMIT\s*$", re.IGNORECASE)),
+    ("offset", re.compile(r"\bOFFSET\s*$", re.IGNORECASE)),
+    ("like", re.compile(COLUMN + r"\s+LIKE\s*$", re.IGNORECASE)),
+    ("in", re.compile(COLUMN + r"\)?\s+IN\s*\(\s*(?:\?\s*,\s*)*$", re.IGNORECASE)),
+    ("compare", re.compile(COLUMN + r"\)?\s*(=|==|<>|!=|>=|<=|>|<)\s*$")),
+]
+PLAN_SCAN_PATTERN = re.compile(r"^SCAN (?:TABLE )?(?:main\.)?(\w+)(?: AS \w+)?$")
+PLAN_TEMP_PATTERN = re.compile(r"USE TEMP B-TREE FOR (.+)$")
+PLAN_AUTOMATIC_PATTERN = re.compile(r"^SEARCH (?:TABLE )?(?:main\.)?(\w+)(?: AS \w+)? USING AUTOMATIC (?:PARTIAL )?(?:COVERING )?INDEX \((.*)\)")
+
+
+def normalize_sql(sql):
+    """Statement text without quoting, schema prefix and IN-list length"""
+    sql = ANSI_PATTERN.sub("", sql).replace("`", "").replace('"', "")
+    sql = re.sub(r"\bmain\.", "", sql)
+    sql = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?...)", sql)
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def percentile_ms(ordered, pct):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] * 1000, 2)
+
+
+def parse_params(params):
+    """Prisma logs params as a JSON array string; ISO dates become epoch ms"""
+    if params is None:
+        return None
+    if isinstance(params, str):
+        try:
+            params = json.loads(params)
+        except ValueError:
+            return None
+    if not isinstance(params, list):
+        return None
+    values = []
+    for value in params:
+        if isinstance(value, str) and ISO_PATTERN.match(value):
+            stamp = value.replace(" UTC", "+00:00").replace("Z", "+00:00").replace(" ", "T", 1)
+            parsed = datetime.fromisoformat(stamp)
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            value = int(parsed.timestamp() * 1000)
+        elif isinstance(value, bool):
+            value = int(value)
+        values.append(value)
+    return values
+
+
+class QuerySet:
+    """Statements grouped by normalised text, with weights and captured params"""
+
+    def __init__(self):
+        self.queries = {}
+
+    def add(self, sql, source, params=None, duration_ms=None, count=1):
+        key = normalize_sql(sql)
+        if not key.upper().startswith(("SELECT", "WITH")):
+            return
+        entry = self.queries.get(key)
+        if entry is None:
+            entry = self.queries[key] = {"sql": sql, "key": key, "source": source, "count": 0, "params": [], "loggedMs": []}
+        entry["count"] += count
+        # IN lists of another length need their own statement text
+        if params is not None and len(params) == sql.count("?") and sql == entry["sql"]:
+            entry["params"].append(params)
+        if duration_ms is not None:
+            entry["loggedMs"].append(float(duration_ms))
+
+    def load_log(self, path):
+        with open(path, encoding="utf-8", errors="replace") as handle:
+            for line in handle:
+                match = LOG_PATTERN.search(ANSI_PATTERN.sub("", line))
+                if match:
+                    self.add(match.group(1), "log")
+
+    def load_jsonl(self, path):
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                event = json.loads(line)
+                sql = event.get("query") or event.get("sql")
+                if sql:
+                    self.add(sql, event.get("target") or "captured", parse_params(event.get("params")),
+                             event.get("duration"), int(event.get("count", 1)))
+
+    def load_builtin(self):
+        for route, sql in BUILTIN_QUERIES:
+            self.add(sql, route)
+
+    def entries(self):
+        return list(self.queries.values())
+
+
+class Catalog:
+    """Tables, columns and indexes of the database"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.columns = {}
+        for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"):
+            self.columns[table] = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+    def indexes(self, table):
+        """Column lists of the table's indexes, the primary key included"""
+        result = []
+        primary = [row[1] for row in sorted(self.conn.execute(f'PRAGMA table_info("{table}")'), key=lambda row: row[5]) if row[5]]
+        if primary:
+            result.append(primary)
+        for row in self.conn.execute(f'PRAGMA index_list("{table}")'):
+            columns = [info[2] for info in self.conn.execute(f'PRAGMA index_info("{row[1]}")')]
+            if columns and None not in columns:
+                result.append(columns)
+        return result
+
+    def covered(self, table, columns):
+        """An existing index starts with these columns"""
+        return any(index[:len(columns)] == list(columns) for index in self.indexes(table))
+
+
+class Statement:
+    """Tables and predicates of one normalised statement"""
+
+    def __init__(self, key, catalog):
+        self.catalog = catalog
+        self.aliases = {}
+        for table, alias in TABLE_PATTERN.findall(key):
+            if table not in catalog.columns:
+                continue
+            self.aliases[table] = table
+            if alias and alias.upper() not in NOT_ALIASES:
+                self.aliases[alias] = table
+        self.tables = sorted(set(self.aliases.values()))
+        self.equality, self.ranges, self.joins = [], [], []
+        self.order_by = self.group_by = []
+
+        for match in COMPARISON_PATTERN.finditer(key):
+            left = self.resolve(match.group(1), match.group(2))
+            right = self.resolve(match.group(5), match.group(6)) if match.group(6) else None
+            if not left:
+                continue
+            if right:
+                if right[0] != left[0]:
+                    self.joins.extend([left, right])
+            elif match.group(3) in ("=", "=="):
+                self.equality.append(left)
+            else:
+                self.ranges.append(left)
+        for match in IN_PATTERN.finditer(key):
+            column = self.resolve(match.group(1), match.group(2))
+            if column:
+                self.equality.append(column)
+        for match in BETWEEN_PATTERN.finditer(key):
+            column = self.resolve(match.group(1), match.group(2))
+            if column:
+                self.ranges.append(column)
+        match = ORDER_PATTERN.search(key)
+        if match:
+            self.order_by = self.column_list(match.group(1))
+        match = GROUP_PATTERN.search(key)
+        if match:
+            self.group_by = self.column_list(match.group(1))
+
+    def resolve(self, qualifier, name):
+        """(table, column) for a column reference, or None"""
+        if qualifier:
+            table = self.aliases.get(qualifier)
+            return (table, name) if table and name in self.catalog.columns[table] else None
+        owners = [table for table in self.tables if name in self.catalog.columns[table]]
+        return (owners[0], name) if len(owners) == 1 else None
+
+    def column_list(self, text):
+        columns = []
+        for item in text.split(","):
+            match = re.fullmatch(r"\s*" + COLUMN + r"(?:\s+(?:ASC|DESC))?\s*", item, re.IGNORECASE)
+            column = match and self.resolve(match.group(1), match.group(2))
+            if not column:
+                # Expressions and result aliases cannot be served by a plain index
+                return []
+            columns.append(column)
+        return columns
+
+    def candidates(self, plan):
+        """Index column lists worth measuring, as (table, columns) pairs"""
+        found = []
+
+        def unique(columns):
+            return list(dict.fromkeys(columns))
+
+        for table in self.tables:
+            equality = unique(column for owner, column in self.equality if owner == table)
+            ranges = unique(column for owner, column in self.ranges if owner == table and column not in equality)
+            order_by = [column for owner, column in self.order_by]
+            group_by = [column for owner, column in self.group_by]
+            if ranges:
+                found.append((table, equality + ranges[:1]))
+            if order_by and all(owner == table for owner, column in self.order_by):
+                found.append((table, equality + [column for column in order_by if column not in equality]))
+            if group_by and all(owner == table for owner, column in self.group_by):
+                found.append((table, equality + [column for column in group_by if column not in equality]))
+            if equality:
+                found.append((table, equality))
+            for column in equality + ranges[:1]:
+                found.append((table, [column]))
+            for owner, column in self.joins:
+                if owner == table:
+                    found.append((table, [column]))
+        for detail in plan:
+            match = PLAN_AUTOMATIC_PATTERN.match(detail)
+            if match and match.group(1) in self.aliases:
+                columns = [re.split(r"[=<>]", term.strip())[0] for term in match.group(2).split(" AND ")]
+                found.append((self.aliases[match.group(1)], columns))
+
+        result = []
+        for table, columns in found:
+            key = (table, tuple(columns))
+            if columns and columns != ["id"] and key not in result and not self.catalog.covered(table, columns):
+                result.append(key)
+        return result
+
+
+def plan_issues(plan, statement):
+    issues = []
+    for detail in plan:
+        match = PLAN_SCAN_PATTERN.match(detail)
+        if match and match.group(1) in statement.aliases:
+            issues.append(f"full scan of {statement.aliases[match.group(1)]}")
+        match = PLAN_TEMP_PATTERN.search(detail)
+        if match:
+            issues.append(f"temp b-tree for {match.group(1).lower()}")
+        if "AUTOMATIC" in detail:
+            issues.append("automatic index: " + detail)
+    return issues
+
+
+class ParamSampler:
+    """Plausible values for placeholders, drawn from the data itself"""
+
+    def __init__(self, conn, statement, seed, range_quantile):
+        self.conn = conn
+        self.statement = statement
+        self.rng = random.Random(seed)
+        self.range_quantile = range_quantile
+        self.samples = {}
+        self.quantiles = {}
+
+    def sample(self, table, column):
+        key = (table, column)
+        if key not in self.samples:
+            values = []
+            top = self.conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+            for _ in range(64 if top else 0):
+                row = self.conn.execute(f'SELECT "{column}" FROM "{table}" WHERE rowid >= ? AND "{column}" IS NOT NULL ORDER BY rowid LIMIT 1',
+                                        (self.rng.randint(1, top),)).fetchone()
+                if row:
+                    values.append(row[0])
+            self.samples[key] = values or [None]
+        return self.rng.choice(self.samples[key])
+
+    def quantile(self, table, column, fraction):
+        key = (table, column, fraction)
+        if key not in self.quantiles:
+            total = self.conn.execute(f'SELECT COUNT("{column}") FROM "{table}"').fetchone()[0]
+            row = self.conn.execute(f'SELECT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL ORDER BY "{column}" LIMIT 1 OFFSET ?',
+                                    (int(max(0, total - 1) * fraction),)).fetchone()
+            self.quantiles[key] = row[0] if row else None
+        return self.quantiles[key]
+
+    def params(self, sql):
+        values = []
+        position = sql.find("?")
+        has_order = re.search(r"\bORDER\s+BY\b", sql, re.IGNORECASE) is not None
+        while position != -1:
+            values.append(self.value(normalize_sql(sql[:position] + " "), has_order))
+            position = sql.find("?", position + 1)
+        return values
+
+    def value(self, before, has_order):
+        for kind, pattern in PLACEHOLDER_CONTEXT:
+            match = pattern.search(before)
+            if not match:
+                continue
+            if kind == "limit":
+                return PAGE_LIMIT if has_order else -1
+            if kind == "offset":
+                return 0
+            column = self.statement.resolve(match.group(1), match.group(2))
+            if not column:
+                return None
+            if kind == "like":
+                text = str(self.sample(*column) or "")
+                start = self.rng.randrange(max(1, len(text) - 3))
+                return f"%{text[start:start + 4]}%"
+            if kind == "compare" and match.group(3) in (">", ">="):
+                return self.quantile(*column, self.range_quantile)
+            if kind == "compare" and match.group(3) in ("<", "<="):
+                return self.quantile(*column, min(1.0, self.range_quantile + (1 - self.range_quantile) / 2))
+            return self.sample(*column)
+        return None
+
+
+class Profiler:
+    """Times and explains every query of a set against one connection"""
+
+    def __init__(self, conn, entries, repeat, seed, range_quantile):
+        self.conn = conn
+        self.catalog = Catalog(conn)
+        self.queries = []
+        for number, entry in enumerate(entries):
+            statement = Statement(entry["key"], self.catalog)
+            sampler = ParamSampler(conn, statement, seed + number, range_quantile)
+            params = list(entry["params"][:repeat])
+            while len(params) < repeat:
+                params.append(sampler.params(entry["sql"]))
+            self.queries.append(dict(entry, id=f"q{number + 1}", statement=statement, paramSets=params))
+
+    def explain(self, query):
+        return [row[3] for row in self.conn.execute("EXPLAIN QUERY PLAN " + query["sql"], query["paramSets"][0])]
+
+    def time(self, query):
+        # One untimed run so that every measurement sees a warm page cache
+        self.conn.execute(query["sql"], query["paramSets"][0]).fetchall()
+        latencies = []
+        for params in query["paramSets"]:
+            started = time.perf_counter()
+            self.conn.execute(query["sql"], params).fetchall()
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        return {"p50Ms": percentile_ms(latencies, 50), "p95Ms": percentile_ms(latencies, 95)}
+
+    def measure(self, query):
+        plan = self.explain(query)
+        return dict(self.time(query), plan=plan)
+
+
+def index_name(table, columns):
+    # Prisma's default name, so `prisma db push` creates the same index
+    return f"{table}_{'_'.join(columns)}_idx"
+
+
+def create_index(conn, table, columns):
+    started = time.perf_counter()
+    conn.execute('CREATE INDEX "{}" ON "{}" ({})'.format(index_name(table, columns), table, ", ".join(f'"{column}"' for column in columns)))
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def advise(profiler, max_indexes, min_speedup):
+    """Greedily pick the candidate indexes that save the most weighted time"""
+    conn = profiler.conn
+    current = {query["id"]: profiler.measure(query) for query in profiler.queries}
+    baseline = dict(current)
+    pool = []
+    for query in profiler.queries:
+        if plan_issues(current[query["id"]]["plan"], query["statement"]):
+            for candidate in query["statement"].candidates(current[query["id"]]["plan"]):
+                if candidate not in pool:
+                    pool.append(candidate)
+
+    selected = []
+    conn.execute("BEGIN")
+    try:
+        while pool and len(selected) < max_indexes:
+            results = []
+            for table, columns in pool:
+                conn.execute("SAVEPOINT candidate")
+                try:
+                    build_ms = create_index(conn, table, columns)
+                    name = index_name(table, columns)
+                    improved = {}
+                    for query in profiler.queries:
+                        if table not in query["statement"].tables:
+                            continue
+                        plan = profiler.explain(query)
+                        # An unchanged plan runs the same code; only re-time when the index is used
+                        if plan != current[query["id"]]["plan"] and any(name in detail for detail in plan):
+                            improved[query["id"]] = dict(profiler.time(query), plan=plan)
+                finally:
+                    conn.execute("ROLLBACK TO candidate")
+                    conn.execute("RELEASE candidate")
+                saved = 0.0
+                best_speedup = 0.0
+                for query in profiler.queries:
+                    after = improved.get(query["id"])
+                    if not after:
+                        continue
+                    before = current[query["id"]]["p50Ms"]
+                    saved += query["count"] * (before - after["p50Ms"])
+                    best_speedup = max(best_speedup, before / max(after["p50Ms"], 0.001))
+                results.append({"table": table, "columns": list(columns), "buildMs": build_ms, "savedMs": round(saved, 2),
+                                "bestSpeedup": round(best_speedup, 1), "improved": improved})
+
+            useful = [result for result in results if result["savedMs"] > 0 and result["bestSpeedup"] >= min_speedup]
+            if not useful:
+                break
+            best = max(useful, key=lambda result: result["savedMs"])
+            create_index(conn, best["table"], best["columns"])
+            current.update(best["improved"])
+            selected.append(best)
+            # Gains only shrink as indexes are added, so losers stay losers
+            pool = [(result["table"], tuple(result["columns"])) for result in useful
+                    if result is not best and not profiler.catalog.covered(result["table"], result["columns"])]
+    finally:
+        conn.execute("ROLLBACK")
+    return baseline, current, selected
+
+
+def prisma_models(path):
+    """table -> (model name, {column: field name}) from schema.prisma"""
+    models = {}
+    if not os.path.exists(path):
+        return models
+    with open(path, encoding="utf-8") as handle:
+        text = handle.read()
+    for match in re.finditer(r"^model\s+(\w+)\s*\{(.*?)^\}", text, re.MULTILINE | re.DOTALL):
+        model, body = match.group(1), match.group(2)
+        table = re.search(r'@@map\("([^"]+)"\)', body)
+        fields = {}
+        for line in body.splitlines():
+            field = re.match(r"\s*(\w+)\s+\w", line)
+            if field and not line.strip().startswith("@@"):
+                column = re.search(r'@map\("([^"]+)"\)', line)
+                fields[column.group(1) if column else field.group(1)] = field.group(1)
+        models[table.group(1) if table else model] = (model, fields)
+    return models
+
+
+def schema_line(models, table, columns):
+    model, fields = models.get(table, (table, {}))
+    return model, "@@index([{}])".format(", ".join(fields.get(column, column) for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile query plans and propose Prisma indexes")
+    parser.add_argument("--db", help="SQLite database path (defaults to DATABASE_URL / prisma/dev.db)")
+    parser.add_argument("--log", action="append", default=[], help="Prisma log with prisma:query lines")
+    parser.add_argument("--queries", action="append", default=[], help="JSON lines of captured query events")
+    parser.add_argument("--builtin", action="store_true", help="Include the built-in hot route queries")
+    parser.add_argument("--schema", default=SCHEMA_PATH, help="Prisma schema used to name models and fields")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query, each with its own parameters")
+    parser.add_argument("--range-quantile", type=float, default=0.9, help="Column quantile used for lower range bounds")
+    parser.add_argument("--max-indexes", type=int, default=8)
+    parser.add_argument("--min-speedup", type=float, default=1.5, help="Required p50 speedup of the best query an index helps")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--explain-only", action="store_true", help="Report plans and timings without trying indexes")
+    parser.add_argument("--emit-schema", action="store_true", help="Print only the proposed @@index lines per model")
+    args = parser.parse_args()
+
+    query_set = QuerySet()
+    for path in args.log:
+        query_set.load_log(path)
+    for path in args.queries:
+        query_set.load_jsonl(path)
+    if args.builtin:
+        query_set.load_builtin()
+    if not query_set.entries():
+        parser.error("no queries: pass --log, --queries or --builtin")
+    if args.repeat < 1 or not 0 <= args.range_quantile <= 1:
+        parser.error("--repeat must be positive and --range-quantile between 0 and 1")
+
+    path = args.db or prisma_db.database_path()
+    conn = prisma_db.connect(path)
+    # Transactions are managed explicitly; everything is rolled back
+    conn.isolation_level = None
+    started = time.perf_counter()
+    try:
+        profiler = Profiler(conn, query_set.entries(), args.repeat, args.seed, args.range_quantile)
+        if args.explain_only:
+            baseline = {query["id"]: profiler.measure(query) for query in profiler.queries}
+            current, selected = baseline, []
+        else:
+            baseline, current, selected = advise(profiler, args.max_indexes, args.min_speedup)
+    except sqlite3.Error as error:
+        print(f"Query replay failed: {error}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+    models = prisma_models(args.schema)
+    if args.emit_schema:
+        by_model = {}
+        for result in selected:
+            model, line = schema_line(models, result["table"], result["columns"])
+            by_model.setdefault(model, []).append(line)
+        for model, lines in by_model.items():
+            print(f"model {model} {{")
+            for line in lines:
+                print(f"  {line}")
+            print("}")
+        return 0
+
+    for query in profiler.queries:
+        before, after = baseline[query["id"]], current[query["id"]]
+        report = {
+            "query": query["id"],
+            "source": query["source"],
+            "count": query["count"],
+            "sql": query["key"],
+            "issues": plan_issues(before["plan"], query["statement"]),
+            "beforeP50Ms": before["p50Ms"],
+            "beforeP95Ms": before["p95Ms"],
+            "plan": before["plan"],
+        }
+        if query["loggedMs"]:
+            report["loggedP50Ms"] = percentile_ms(sorted(ms / 1000 for ms in query["loggedMs"]), 50)
+        if not args.explain_only:
+            report.update(afterP50Ms=after["p50Ms"], afterP95Ms=after["p95Ms"], afterPlan=after["plan"],
+                          speedup=round(before["p50Ms"] / max(after["p50Ms"], 0.001), 1))
+        print(json.dumps(report))
+
+    for result in selected:
+        model, line = schema_line(models, result["table"], result["columns"])
+        print(json.dumps({
+            "model": model,
+            "index": line,
+            "table": result["table"],
+            "columns": result["columns"],
+            "buildMs": result["buildMs"],
+            "savedMsPerRun": result["savedMs"],
+            "queries": {query_id: {"beforeP50Ms": baseline[query_id]["p50Ms"], "afterP50Ms": after["p50Ms"]}
+                        for query_id, after in result["improved"].items()},
+        }))
+
+    print(json.dumps({
+        "database": path,
+        "queries": len(profiler.queries),
+        "withIssues": sum(1 for query in profiler.queries if plan_issues(baseline[query["id"]]["plan"], query["statement"])),
+        "indexes": len(selected),
+        "totalBeforeMs": round(sum(query["count"] * baseline[query["id"]]["p50Ms"] for query in profiler.queries), 2),
+        "totalAfterMs": round(sum(query["count"] * current[query["id"]]["p50Ms"] for query in profiler.queries), 2),
+        "elapsedSeconds": round(time.perf_counter() - started, 1),
+    }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
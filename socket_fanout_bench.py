@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Socket.IO fan-out benchmark for delivery broadcasts.
+
+Connects thousands of simulated delivery partners, pharmacies and patients
+to the Node Socket.IO server (lib/socket.ts) and fires storms of delivery
+broadcasts. broadcastDeliveryRequest emits every request to the whole
+`delivery-partners` room, and the accept handler lets partners race each
+other, so each stage reports:
+
+  fan-out      broadcast -> new-delivery-request latency per partner, and
+               the time until the last partner had it
+  accept race  broadcast -> first delivery-accepted at the pharmacy room
+  duplicates   deliveries announced as accepted more than once, i.e.
+               assigned to several partners
+
+--partners takes a list of stage sizes (e.g. 500,1000,2000,5000): partners
+are added between stages and every stage runs the same storm, which shows
+where one Node instance stops keeping up. Messages that arrive after the
+--settle window count as not delivered. A fixed --accepts-per-broadcast
+partners accept each request at every stage, so the accept race has the
+same number of contenders as the fan-out grows.
+
+Nothing in the app calls initSocketIO yet: a stock `next dev` / `next start`
+serves no Socket.IO endpoint, so there is nothing to connect to until the
+app runs behind a custom server that attaches lib/socket.ts to its HTTP
+server. That server must run with SOCKET_BENCH=1, which enables the
+`bench-broadcast` event that calls broadcastDeliveryRequest without an
+order in the database.
+Until updateDeliveryPartner is backed by Prisma it routes every acceptance
+to the mock pharmacy and patient rooms, so observers join those
+(--accept-rooms).
+
+Partners are spread over --processes worker processes so that the clients
+are not the bottleneck; broadcasts carry their wall-clock send time, so run
+every process on one host. If loopLagP99Ms (how late the busiest client
+event loop runs) grows, the latencies include client-side delay: add
+processes. Each client holds one socket, so the open-files limit
+(ulimit -n) must exceed the clients per process.
+
+Needs the optional python-socketio package with its asyncio client
+(pip install "python-socketio[asyncio_client]").
+
+Usage:
+    python socket_fanout_bench.py --url http://localhost:3000 --partners 500,1000,2000,5000 [--processes 4] [--broadcasts 200] [--rate 50]
+"""
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import multiprocessing
+
+try:
+    import socketio
+except ImportError:
+    socketio = None
+
+
+def is_available():
+    return socketio is not None
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(pct / 100 * len(values)))] * 1000, 2)
+
+
+async def connect(args, register_event=None, payload=None):
+    client = socketio.AsyncClient(reconnection=False)
+    await client.connect(args.url, transports=[args.transport], socketio_path=args.path, wait_timeout=args.connect_timeout)
+    if register_event:
+        await client.emit(register_event, payload)
+    return client
+
+
+async def connect_many(args, factories):
+    """Connect clients with at most --connect-concurrency handshakes in flight; returns (clients, failures)"""
+    gate = asyncio.Semaphore(args.connect_concurrency)
+    clients = []
+    failures = 0
+
+    async def one(factory):
+        nonlocal failures
+        async with gate:
+            try:
+                clients.append(await factory())
+            except Exception:
+                failures += 1
+
+    await asyncio.gather(*(one(factory) for factory in factories))
+    return clients, failures
+
+
+class LoopLagMonitor:
+    """How late a 10 ms timer fires: client-side delay hidden in every latency"""
+
+    def __init__(self):
+        self.samples = []
+        self._task = None
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            self.samples.append(max(0.0, time.perf_counter() - started - 0.01))
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        return self.samples
+
+
+class PartnerWorker:
+    """Delivery partners of one worker process, driven over a pipe by the coordinator"""
+
+    def __init__(self, args, worker_index):
+        self.args = args
+        self.worker_index = worker_index
+        self.rng = random.Random(f"{args.seed}:{worker_index}")
+        self.clients = []
+        self.lag = LoopLagMonitor()
+        self.pending = set()
+        self.partner_total = 0
+        self.reset()
+
+    def reset(self):
+        self.received = {}          # delivery id -> receive latencies
+        self.acceptors = {}         # delivery id -> partner indexes that accept it
+        self.accepts_sent = 0
+        self.closed = 0
+        self.errors = 0
+
+    def partner_factory(self, index):
+        partner_id = f"bench-partner-{index}"
+
+        async def factory():
+            client = await connect(self.args)
+
+            @client.on("new-delivery-request")
+            async def on_request(data):
+                delivery_id = data.get("id")
+                self.received.setdefault(delivery_id, []).append(time.time() - data.get("sentAt", 0))
+                if index in self.accepting(delivery_id):
+                    task = asyncio.create_task(self.accept(client, partner_id, delivery_id))
+                    self.pending.add(task)
+                    task.add_done_callback(self.pending.discard)
+
+            @client.on("delivery-request-closed")
+            async def on_closed(data):
+                self.closed += 1
+
+            @client.on("error")
+            async def on_error(data):
+                self.errors += 1
+
+            await client.emit("register-delivery-partner", {"userId": f"bench-user-{partner_id}", "deliveryPartnerId": partner_id})
+            return client
+        return factory
+
+    def accepting(self, delivery_id):
+        """
+        The --accepts-per-broadcast partners that accept a delivery. Every
+        worker derives the same choice from the seed and delivery id, so the
+        race has that many contenders whatever the stage size.
+        """
+        if delivery_id not in self.acceptors:
+            rng = random.Random(f"{self.args.seed}:{delivery_id}")
+            count = min(self.args.accepts_per_broadcast, self.partner_total)
+            self.acceptors[delivery_id] = set(rng.sample(range(self.partner_total), count))
+        return self.acceptors[delivery_id]
+
+    async def accept(self, client, partner_id, delivery_id):
+        # Reaction time before tapping "accept"
+        await asyncio.sleep(self.rng.uniform(*self.args.accept_delay) / 1000)
+        try:
+            await client.emit("accept-delivery", {"deliveryId": delivery_id, "deliveryPartnerId": partner_id})
+            self.accepts_sent += 1
+        except Exception:
+            self.errors += 1
+
+    async def grow(self, total):
+        """Connect this worker's share (every processes-th index) of the first `total` partners"""
+        processes = self.args.processes
+        start = len(self.clients) * processes + self.worker_index
+        self.partner_total = total
+        clients, failures = await connect_many(self.args, (self.partner_factory(i) for i in range(start, total, processes)))
+        self.clients += clients
+        return {"connected": len(self.clients), "failures": failures}
+
+    def collect(self):
+        return {
+            "received": self.received,
+            "acceptsSent": self.accepts_sent,
+            "closed": self.closed,
+            "errors": self.errors,
+            "loopLag": self.lag.stop(),
+        }
+
+    async def serve(self, pipe):
+        loop = asyncio.get_running_loop()
+        while True:
+            command, value = await loop.run_in_executor(None, pipe.recv)
+            if command == "grow":
+                pipe.send(await self.grow(value))
+            elif command == "start":
+                self.reset()
+                self.lag.start()
+                pipe.send(None)
+            elif command == "collect":
+                pipe.send(self.collect())
+            elif command == "stop":
+                for task in list(self.pending):
+                    task.cancel()
+                await asyncio.gather(*(client.disconnect() for client in self.clients), return_exceptions=True)
+                pipe.send(None)
+                return
+
+
+def run_partner_worker(pipe, args, worker_index):
+    asyncio.run(PartnerWorker(args, worker_index).serve(pipe))
+
+
+class FanoutBench:
+    """Pharmacies, patients and acceptance observers; coordinates the partner workers"""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.pharmacies = []
+        self.patients = []
+        self.observers = []
+        self.workers = []
+        self.lag = LoopLagMonitor()
+        self.reset()
+
+    def reset(self):
+        self.sent = {}              # delivery id -> wall-clock send time
+        self.accepted = {}          # delivery id -> delivery-accepted latencies
+        self.assigned = {}          # delivery id -> delivery-assigned count
+
+    async def ask(self, command, value=None):
+        """Send a command to every worker and gather the replies"""
+        loop = asyncio.get_running_loop()
+        for process, pipe in self.workers:
+            pipe.send((command, value))
+        return await asyncio.gather(*(loop.run_in_executor(None, pipe.recv) for process, pipe in self.workers))
+
+    async def connect_observers(self):
+        pharmacy_id, patient_id = self.args.accept_rooms
+        pharmacy = await connect(self.args, "register-pharmacy", {"userId": "bench-observer-pharmacy", "pharmacyId": pharmacy_id})
+        patient = await connect(self.args, "register-patient", {"userId": "bench-observer-patient", "patientId": patient_id})
+
+        @pharmacy.on("delivery-accepted")
+        async def on_accepted(data):
+            delivery_id = data.get("deliveryId")
+            if delivery_id in self.sent:
+                self.accepted.setdefault(delivery_id, []).append(time.time() - self.sent[delivery_id])
+
+        @patient.on("delivery-assigned")
+        async def on_assigned(data):
+            delivery_id = data.get("deliveryId")
+            self.assigned[delivery_id] = self.assigned.get(delivery_id, 0) + 1
+
+        self.observers = [pharmacy, patient]
+
+    def delivery_request(self):
+        delivery_id = f"bench-{uuid.uuid4().hex[:16]}"
+        pharmacy = self.rng.randrange(self.args.pharmacies)
+        items = self.rng.randint(1, 4)
+        return {
+            "id": delivery_id,
+            "orderId": f"order-{delivery_id}",
+            "pharmacyId": f"bench-pharmacy-{pharmacy}",
+            "pickupAddress": f"{pharmacy} Main St, Colombo",
+            "deliveryAddress": f"{self.rng.randint(1, 999)} Lake Rd, Kandy",
+            "estimatedTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 5400)),
+            "deliveryFee": self.rng.choice([0, 2.99, 4.99]),
+            "orderItems": [{"medicine": {"name": f"Medicine {i}"}, "quantity": self.rng.randint(1, 3)} for i in range(items)],
+            "orderValue": round(self.rng.uniform(5, 120), 2),
+        }
+
+    async def storm(self):
+        """Emit --broadcasts requests at --rate per second (0: all at once) from random pharmacies"""
+        interval = 1 / self.args.rate if self.args.rate else 0
+        started = time.perf_counter()
+        for i in range(self.args.broadcasts):
+            if interval:
+                delay = started + i * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            request = self.delivery_request()
+            request["sentAt"] = self.sent[request["id"]] = time.time()
+            await self.rng.choice(self.pharmacies).emit("bench-broadcast", request)
+        return time.perf_counter() - started
+
+    def report(self, partners, samples):
+        received = {}
+        for sample in samples:
+            for delivery_id, latencies in sample["received"].items():
+                # Stragglers of the previous stage's storm are not this stage's
+                if delivery_id in self.sent:
+                    received.setdefault(delivery_id, []).extend(latencies)
+        fanout = [latency for latencies in received.values() for latency in latencies]
+        # A broadcast has reached everyone once its last partner got it
+        complete = [max(latencies) for latencies in received.values() if len(latencies) >= partners]
+        first_accept = [min(latencies) for latencies in self.accepted.values()]
+        resolved = len(self.accepted)
+        duplicated = sum(1 for latencies in self.accepted.values() if len(latencies) > 1)
+        broadcasts = len(self.sent)
+        expected = broadcasts * partners
+        return {
+            "partners": partners,
+            "broadcasts": broadcasts,
+            "expectedDeliveries": expected,
+            "deliveredMessages": len(fanout),
+            "deliveryRatio": round(len(fanout) / expected, 4) if expected else None,
+            "fanoutP50Ms": percentile(fanout, 50),
+            "fanoutP95Ms": percentile(fanout, 95),
+            "fanoutP99Ms": percentile(fanout, 99),
+            "fanoutMaxMs": percentile(fanout, 100),
+            "completeBroadcasts": len(complete),
+            "lastPartnerP50Ms": percentile(complete, 50),
+            "lastPartnerP99Ms": percentile(complete, 99),
+            "acceptsSent": sum(sample["acceptsSent"] for sample in samples),
+            "resolvedDeliveries": resolved,
+            "acceptResolutionP50Ms": percentile(first_accept, 50),
+            "acceptResolutionP99Ms": percentile(first_accept, 99),
+            "duplicateAssignments": sum(len(latencies) - 1 for latencies in self.accepted.values()),
+            "duplicateAssignmentRate": round(duplicated / resolved, 4) if resolved else None,
+            "patientAssignedEvents": sum(self.assigned.values()),
+            "closedEvents": sum(sample["closed"] for sample in samples),
+            "errors": sum(sample["errors"] for sample in samples),
+        }
+
+    async def run(self):
+        started = time.perf_counter()
+        context = multiprocessing.get_context("spawn")
+        for worker_index in range(self.args.processes):
+            pipe, child_pipe = context.Pipe()
+            process = context.Process(target=run_partner_worker, args=(child_pipe, self.args, worker_index), daemon=True)
+            process.start()
+            self.workers.append((process, pipe))
+
+        try:
+            pharmacies = (lambda i=i: connect(self.args, "register-pharmacy", {"userId": f"bench-user-pharmacy-{i}", "pharmacyId": f"bench-pharmacy-{i}"})
+                          for i in range(self.args.pharmacies))
+            patients = (lambda i=i: connect(self.args, "register-patient", {"userId": f"bench-user-patient-{i}", "patientId": f"bench-patient-{i}"})
+                        for i in range(self.args.patients))
+            self.pharmacies, pharmacy_failures = await connect_many(self.args, pharmacies)
+            self.patients, patient_failures = await connect_many(self.args, patients)
+            if not self.pharmacies:
+                raise RuntimeError(f"Could not connect to {self.args.url}")
+            await self.connect_observers()
+
+            for stage in sorted(set(self.args.partners)):
+                connect_started = time.perf_counter()
+                grown = await self.ask("grow", stage)
+                connect_seconds = time.perf_counter() - connect_started
+                partners = sum(worker["connected"] for worker in grown)
+                # Registrations carry no ack; give the server time to join the rooms
+                await asyncio.sleep(self.args.settle)
+
+                self.reset()
+                await self.ask("start")
+                self.lag.start()
+                storm_seconds = await self.storm()
+                await asyncio.sleep(self.args.settle)
+                samples = await self.ask("collect")
+
+                report = self.report(partners, samples)
+                report.update({
+                    "stage": stage,
+                    "connectSeconds": round(connect_seconds, 2),
+                    "connectFailures": sum(worker["failures"] for worker in grown) + pharmacy_failures + patient_failures,
+                    "broadcastsPerSecond": round(self.args.broadcasts / storm_seconds, 1) if storm_seconds else None,
+                    "loopLagP99Ms": max((percentile(lag, 99) or 0) for lag in [self.lag.stop()] + [sample["loopLag"] for sample in samples]),
+                })
+                print(json.dumps(report), flush=True)
+        finally:
+            await self.ask("stop")
+            await asyncio.gather(*(client.disconnect() for client in self.pharmacies + self.patients + self.observers),
+                                 return_exceptions=True)
+            for process, pipe in self.workers:
+                process.join(timeout=5)
+        return {"stages": len(self.args.partners), "elapsedSeconds": round(time.perf_counter() - started, 2)}
+
+
+def parse_range(value):
+    low, _, high = value.partition("-")
+    return (float(low), float(high or low))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket.IO delivery broadcast fan-out benchmark")
+    parser.add_argument("--url", default="http://localhost:3000")
+    parser.add_argument("--path", default="socket.io", help="Socket.IO endpoint path")
+    parser.add_argument("--transport", default="websocket", choices=["websocket", "polling"])
+    parser.add_argument("--partners", default="500,1000,2000", help="Comma-separated partner counts, one stage each")
+    parser.add_argument("--processes", type=int, default=max(1, multiprocessing.cpu_count() - 1), help="Worker processes for the partners")
+    parser.add_argument("--pharmacies", type=int, default=50)
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument("--broadcasts", type=int, default=200, help="Delivery requests per stage")
+    parser.add_argument("--rate", type=float, default=50, help="Broadcasts per second; 0 fires the whole storm at once")
+    parser.add_argument("--accepts-per-broadcast", type=int, default=10, help="Partners that accept each request")
+    parser.add_argument("--accept-delay", type=parse_range, default=(50, 500), help="Partner reaction time in ms, <ms> or <min>-<max>")
+    parser.add_argument("--accept-rooms", default="mock-pharmacy-id,mock-patient-id",
+                        help="pharmacyId,patientId that acceptances are announced to")
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds to wait after registering and after each storm")
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="Handshakes in flight per process")
+    parser.add_argument("--connect-timeout", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if not is_available():
+        parser.error('python-socketio is not installed (pip install "python-socketio[asyncio_client]")')
+    args.partners = [int(n) for n in args.partners.split(",")]
+    args.accept_rooms = args.accept_rooms.split(",", 1)
+    if len(args.accept_rooms) != 2:
+        parser.error("--accept-rooms takes pharmacyId,patientId")
+
+    print(json.dumps(asyncio.run(FanoutBench(args).run())))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Seeded synthetic data generator for large-scale benchmarks.
+
+Bulk-inserts reproducible volumes of pharmacies, medicines, patients,
+prescriptions, orders (with items), laboratories, lab tests, lab bookings,
+doctors and appointments into the Prisma SQLite database. Rows are streamed
+from generators into executemany in fixed-size batches, one transaction per
+batch, so millions of rows load in seconds without holding them in memory.
+
+Every generated id starts with "<tag>-", so a data set can be removed again
+with --reset. Only columns present in the live table are written, which keeps
+the generator working against databases migrated from older schemas.
+
+Synthetic accounts get the bcrypt hash of --password when the optional
+`bcrypt` package is installed; otherwise their password hash is unusable and
+they cannot sign in.
+
+Usage:
+    python synthetic_data.py [--pharmacies 200] [--skus 5000] [--patients 10000] [--orders 100000] [--seed 42]
+    python synthetic_data.py --reset [--tag syn]
+"""
+import sys
+import json
+import time
+import random
+import argparse
+from itertools import islice
+
+import prisma_db
+from medicine_index import synthetic_name
+
+try:
+    import bcrypt
+except ImportError:
+    bcrypt = None
+
+UNITS = ["tablet", "capsule", "ml", "mg", "sachet", "vial"]
+CITIES = ["Colombo", "Kandy", "Galle", "Jaffna", "Negombo", "Matara", "Kurunegala", "Anuradhapura"]
+STREETS = ["Main St", "Temple Rd", "Lake Rd", "Station Rd", "Hospital Rd", "Park Ave", "Hill St", "Church Rd"]
+LAB_TEST_NAMES = ["Complete Blood Count", "Lipid Profile", "HbA1c", "Fasting Blood Sugar", "Liver Function Test",
+                  "Kidney Function Test", "Thyroid Panel", "Vitamin D", "Urine Full Report", "ESR", "CRP", "Serum Creatinine"]
+SPECIALIZATIONS = ["General Practice", "Cardiology", "Dermatology", "Pediatrics", "Neurology", "Orthopedics", "Psychiatry", "ENT"]
+ORDER_STATUSES = ["PENDING", "CONFIRMED", "PROCESSING", "READY_FOR_DELIVERY", "OUT_FOR_DELIVERY", "DELIVERED", "CANCELLED"]
+LAB_STATUSES = ["BOOKED", "SAMPLE_COLLECTED", "IN_PROGRESS", "COMPLETED", "REPORT_READY"]
+APPOINTMENT_STATUSES = ["SCHEDULED", "CONFIRMED", "IN_PROGRESS", "COMPLETED", "CANCELLED", "NO_SHOW"]
+PRESCRIPTION_STATUSES = ["UPLOADED", "PROCESSING", "PROCESSED", "REJECTED"]
+COMMISSION_RATE = 0.05
+DAY_MS = 24 * 3600 * 1000
+
+
+def table_columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+
+
+def bulk_insert(conn, table, rows, batch_size):
+    """
+    Insert an iterable of dicts in executemany batches, one transaction per
+    batch. Keys missing from the live table are dropped. Returns the row count.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+    existing = table_columns(conn, table)
+    columns = [column for column in first if column in existing]
+    sql = 'INSERT INTO "%s" (%s) VALUES (%s)' % (
+        table, ", ".join(f'"{column}"' for column in columns), ", ".join("?" * len(columns)))
+
+    count = 0
+    pending = [first]
+    while pending:
+        pending.extend(islice(rows, batch_size - len(pending)))
+        with conn:
+            conn.executemany(sql, [tuple(row[column] for column in columns) for row in pending])
+        count += len(pending)
+        pending = list(islice(rows, batch_size))
+    return count
+
+
+class Generator:
+    def __init__(self, args, now):
+        self.args = args
+        self.tag = args.tag
+        self.now = now
+        if bcrypt is not None:
+            self.password_hash = bcrypt.hashpw(args.password.encode(), bcrypt.gensalt(10)).decode()
+        else:
+            self.password_hash = "!"
+        rng = random.Random(args.seed)
+        self.products = [synthetic_name(rng).capitalize() for _ in range(args.distinct_medicines)]
+        # Medicine prices are needed again when pricing order items
+        self.medicine_prices = [[round(rng.uniform(0.5, 80), 2) for _ in range(args.skus)] for _ in range(args.pharmacies)]
+        self.lab_test_prices = [[round(rng.uniform(5, 150), 2) for _ in range(args.tests_per_lab)] for _ in range(args.laboratories)]
+        self.doctor_fees = [round(rng.uniform(15, 120), 2) for _ in range(args.doctors)]
+
+    def rng(self, kind):
+        # Independent streams per table keep every table reproducible on its own
+        return random.Random(f"{self.args.seed}:{kind}")
+
+    def id(self, kind, *parts):
+        return "-".join([self.tag, kind] + [f"{part:06d}" for part in parts])
+
+    def past(self, rng, days=365):
+        return self.now - rng.randint(0, days * DAY_MS)
+
+    def address(self, rng):
+        return f"{rng.randint(1, 999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}"
+
+    def users(self, kind, role, count):
+        rng = self.rng(f"users:{kind}")
+        for i in range(count):
+            created = self.past(rng)
+            yield {
+                "id": self.user_id(kind, i),
+                "email": f"{self.tag}-{kind}-{i}@example.com",
+                "password": self.password_hash,
+                "name": f"Synthetic {kind.title()} {i}",
+                "role": role,
+                "isApproved": 1,
+                "createdAt": created,
+                "updatedAt": created,
+            }
+
+    def user_id(self, kind, i):
+        return self.id(f"user-{kind}", i)
+
+    def pharmacies(self):
+        rng = self.rng("pharmacies")
+        for i in range(self.args.pharmacies):
+            yield {
+                "id": self.id("pharmacy", i),
+                "userId": self.user_id("pharmacy", i),
+                "name": f"{rng.choice(CITIES)} Pharmacy {i}",
+                "address": self.address(rng),
+                "phone": f"+94{rng.randint(700000000, 799999999)}",
+                "license": f"PH{i:06d}",
+                "latitude": round(rng.uniform(5.9, 9.8), 6),
+                "longitude": round(rng.uniform(79.7, 81.9), 6),
+                "isApproved": 1 if rng.random() < 0.95 else 0,
+            }
+
+    def medicines(self):
+        rng = self.rng("medicines")
+        for p in range(self.args.pharmacies):
+            prices = self.medicine_prices[p]
+            for k in range(self.args.skus):
+                updated = self.past(rng)
+                yield {
+                    "id": self.id("medicine", p, k),
+                    "pharmacyId": self.id("pharmacy", p),
+                    "name": rng.choice(self.products),
+                    "description": None,
+                    "price": prices[k],
+                    "unit": rng.choice(UNITS),
+                    "stock": 0 if rng.random() < 0.1 else rng.randint(1, 500),
+                    "isActive": 1 if rng.random() < 0.95 else 0,
+                    "createdAt": updated - rng.randint(0, 30 * DAY_MS),
+                    "updatedAt": updated,
+                }
+
+    def patients(self):
+        rng = self.rng("patients")
+        for i in range(self.args.patients):
+            yield {
+                "id": self.id("patient", i),
+                "userId": self.user_id("patient", i),
+                "phone": f"+94{rng.randint(700000000, 799999999)}",
+                "address": self.address(rng),
+                "dateOfBirth": self.now - rng.randint(18 * 365, 85 * 365) * DAY_MS,
+                "emergencyContact": None,
+            }
+
+    def prescriptions(self):
+        rng = self.rng("prescriptions")
+        for i in range(self.args.prescriptions):
+            status = rng.choice(PRESCRIPTION_STATUSES)
+            ocr = None
+            if status == "PROCESSED":
+                ocr = json.dumps({"medicines": [{"name": rng.choice(self.products), "dosage": "500mg", "frequency": "twice daily"}
+                                                for _ in range(rng.randint(1, 4))]})
+            mime = rng.choice(["image/jpeg", "image/png", "application/pdf"])
+            yield {
+                "id": self.id("prescription", i),
+                "patientId": self.id("patient", rng.randrange(self.args.patients)),
+                "fileName": f"prescription-{i}.{mime.split('/')[1]}",
+                "filePath": f"/uploads/prescriptions/{self.tag}-{i}.{mime.split('/')[1]}",
+                "fileSize": rng.randint(50_000, 4_000_000),
+                "mimeType": mime,
+                "status": status,
+                "ocrData": ocr,
+                "createdAt": self.past(rng),
+            }
+
+    def orders_and_items(self):
+        """Yields (order, [items]) with totals computed from the item prices"""
+        rng = self.rng("orders")
+        for i in range(self.args.orders):
+            patient = rng.randrange(self.args.patients)
+            pharmacy = rng.randrange(self.args.pharmacies)
+            prices = self.medicine_prices[pharmacy]
+            order_id = self.id("order", i)
+            items = []
+            for n, sku in enumerate(rng.sample(range(self.args.skus), min(self.args.skus, rng.randint(1, self.args.max_items)))):
+                quantity = rng.randint(1, 30)
+                items.append({
+                    "id": self.id("item", i, n),
+                    "orderId": order_id,
+                    "medicineId": self.id("medicine", pharmacy, sku),
+                    "quantity": quantity,
+                    "unitPrice": prices[sku],
+                    "totalPrice": round(prices[sku] * quantity, 2),
+                })
+            total = round(sum(item["totalPrice"] for item in items), 2)
+            created = self.past(rng)
+            prescription = self.id("prescription", rng.randrange(self.args.prescriptions)) if self.args.prescriptions and rng.random() < 0.4 else None
+            order = {
+                "id": order_id,
+                "userId": self.user_id("patient", patient),
+                "patientId": self.id("patient", patient),
+                "pharmacyId": self.id("pharmacy", pharmacy),
+                "prescriptionId": prescription,
+                "orderType": "PRESCRIPTION_BASED" if prescription else "DIRECT",
+                "status": rng.choice(ORDER_STATUSES),
+                "totalAmount": total,
+                "commissionRate": COMMISSION_RATE,
+                "commissionAmount": round(total * COMMISSION_RATE, 2),
+                "netAmount": round(total * (1 - COMMISSION_RATE), 2),
+                "deliveryAddress": self.address(rng),
+                "specialInstructions": None,
+                "createdAt": created,
+                "updatedAt": created + rng.randint(0, 3 * DAY_MS),
+            }
+            yield order, items
+
+    def laboratories(self):
+        rng = self.rng("laboratories")
+        for i in range(self.args.laboratories):
+            yield {
+                "id": self.id("lab", i),
+                "userId": self.user_id("laboratory", i),
+                "name": f"{rng.choice(CITIES)} Diagnostics {i}",
+                "address": self.address(rng),
+                "phone": f"+94{rng.randint(700000000, 799999999)}",
+                "license": f"LAB{i:06d}",
+                "latitude": round(rng.uniform(5.9, 9.8), 6),
+                "longitude": round(rng.uniform(79.7, 81.9), 6),
+                "isApproved": 1,
+            }
+
+    def lab_tests(self):
+        rng = self.rng("lab_tests")
+        for lab in range(self.args.laboratories):
+            for t in range(self.args.tests_per_lab):
+                created = self.past(rng)
+                yield {
+                    "id": self.id("labtest", lab, t),
+                    "laboratoryId": self.id("lab", lab),
+                    "name": f"{LAB_TEST_NAMES[t % len(LAB_TEST_NAMES)]}" + (f" ({t // len(LAB_TEST_NAMES) + 1})" if t >= len(LAB_TEST_NAMES) else ""),
+                    "description": None,
+                    "price": self.lab_test_prices[lab][t],
+                    "duration": rng.choice(["24 hours", "48 hours", "3-5 days"]),
+                    "requirements": "Fasting 8-12 hours" if rng.random() < 0.2 else None,
+                    "isActive": 1,
+                    "createdAt": created,
+                    "updatedAt": created,
+                }
+
+    def lab_bookings(self):
+        rng = self.rng("lab_bookings")
+        for i in range(self.args.lab_bookings):
+            lab = rng.randrange(self.args.laboratories)
+            test = rng.randrange(self.args.tests_per_lab)
+            total = self.lab_test_prices[lab][test]
+            status = rng.choice(LAB_STATUSES)
+            scheduled = self.now + rng.randint(-180, 30) * DAY_MS
+            yield {
+                "id": self.id("labbooking", i),
+                "patientId": self.id("patient", rng.randrange(self.args.patients)),
+                "laboratoryId": self.id("lab", lab),
+                "labTestId": self.id("labtest", lab, test),
+                "status": status,
+                "scheduledDate": scheduled,
+                "sampleCollectedAt": scheduled if status != "BOOKED" else None,
+                "reportGeneratedAt": scheduled + DAY_MS if status == "REPORT_READY" else None,
+                "reportFilePath": None,
+                "totalAmount": total,
+                "commissionRate": COMMISSION_RATE,
+                "commissionAmount": round(total * COMMISSION_RATE, 2),
+                "netAmount": round(total * (1 - COMMISSION_RATE), 2),
+                "createdAt": scheduled - rng.randint(1, 14) * DAY_MS,
+                "updatedAt": scheduled,
+            }
+
+    def doctors(self):
+        rng = self.rng("doctors")
+        for i in range(self.args.doctors):
+            yield {
+                "id": self.id("doctor", i),
+                "userId": self.user_id("doctor", i),
+                "specialization": rng.choice(SPECIALIZATIONS),
+                "qualifications": "MBBS",
+                "experience": rng.randint(1, 35),
+                "consultationFee": self.doctor_fees[i],
+                "phone": f"+94{rng.randint(700000000, 799999999)}",
+                "address": self.address(rng),
+                "license": f"SLMC{i:06d}",
+                "isApproved": 1,
+            }
+
+    def appointments(self):
+        rng = self.rng("appointments")
+        for i in range(self.args.appointments):
+            doctor = rng.randrange(self.args.doctors)
+            fee = self.doctor_fees[doctor]
+            scheduled = self.now + rng.randint(-180 * 48, 30 * 48) * 30 * 60 * 1000
+            yield {
+                "id": self.id("appointment", i),
+                "patientId": self.id("patient", rng.randrange(self.args.patients)),
+                "doctorId": self.id("doctor", doctor),
+                "scheduledAt": scheduled,
+                "duration": 30,
+                "status": rng.choice(APPOINTMENT_STATUSES),
+                "consultationFee": fee,
+                "commissionRate": COMMISSION_RATE,
+                "commissionAmount": round(fee * COMMISSION_RATE, 2),
+                "netAmount": round(fee * (1 - COMMISSION_RATE), 2),
+                "meetingLink": None,
+                "notes": None,
+                "createdAt": scheduled - rng.randint(1, 14) * DAY_MS,
+                "updatedAt": scheduled,
+            }
+
+
+# Children before parents, so deleting in this order never violates a foreign key
+RESET_ORDER = ["order_items", "orders", "lab_bookings", "appointments", "prescriptions", "lab_tests", "medicines",
+               "patients", "pharmacies", "laboratories", "doctors", "users"]
+
+
+def reset(conn, tag):
+    counts = {}
+    with conn:
+        for table in RESET_ORDER:
+            counts[table] = conn.execute(f'DELETE FROM "{table}" WHERE id LIKE ?', (f"{tag}-%",)).rowcount
+    return counts
+
+
+def generate(conn, args):
+    generator = Generator(args, args.now or prisma_db.now_ms())
+    batch = args.batch_size
+    counts = {}
+    timings = {}
+
+    def load(table, rows):
+        started = time.perf_counter()
+        counts[table] = counts.get(table, 0) + bulk_insert(conn, table, rows, batch)
+        timings[table] = round(timings.get(table, 0) + time.perf_counter() - started, 2)
+
+    load("users", generator.users("pharmacy", "PHARMACY", args.pharmacies))
+    load("users", generator.users("patient", "PATIENT", args.patients))
+    load("users", generator.users("laboratory", "LABORATORY", args.laboratories))
+    load("users", generator.users("doctor", "DOCTOR", args.doctors))
+    load("pharmacies", generator.pharmacies())
+    load("patients", generator.patients())
+    load("laboratories", generator.laboratories())
+    load("doctors", generator.doctors())
+    load("medicines", generator.medicines())
+    load("prescriptions", generator.prescriptions())
+    load("lab_tests", generator.lab_tests())
+    load("lab_bookings", generator.lab_bookings())
+    load("appointments", generator.appointments())
+
+    # Orders and their items come from one stream; each batch of orders is
+    # written before the items that reference it
+    orders, items = [], []
+    for order, order_items in generator.orders_and_items():
+        orders.append(order)
+        items.extend(order_items)
+        if len(orders) >= batch:
+            load("orders", orders)
+            load("order_items", items)
+            orders, items = [], []
+    load("orders", orders)
+    load("order_items", items)
+    return counts, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic HealthMate data")
+    parser.add_argument("--db", help="SQLite database path (defaults to DATABASE_URL / prisma/dev.db)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tag", default="syn", help="Id prefix identifying this data set")
+    parser.add_argument("--reset", action="store_true", help="Delete rows previously generated with --tag and exit")
+    parser.add_argument("--pharmacies", type=int, default=200)
+    parser.add_argument("--skus", type=int, default=5000, help="Medicines per pharmacy")
+    parser.add_argument("--distinct-medicines", type=int, default=20000, help="Distinct medicine names across the catalogue")
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--prescriptions", type=int, default=20000)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--max-items", type=int, default=5, help="Maximum items per order")
+    parser.add_argument("--laboratories", type=int, default=20)
+    parser.add_argument("--tests-per-lab", type=int, default=30)
+    parser.add_argument("--lab-bookings", type=int, default=50000)
+    parser.add_argument("--doctors", type=int, default=100)
+    parser.add_argument("--appointments", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--password", default="test123", help="Password for synthetic accounts (needs bcrypt)")
+    parser.add_argument("--now", type=int, help="Epoch ms that generated dates are relative to (default: current time)")
+    args = parser.parse_args()
+
+    conn = prisma_db.connect(args.db)
+    try:
+        if args.reset:
+            print(json.dumps({"deleted": reset(conn, args.tag)}))
+            return 0
+
+        if min(args.pharmacies, args.skus, args.patients, args.laboratories, args.tests_per_lab, args.doctors) < 1:
+            parser.error("pharmacies, skus, patients, laboratories, tests-per-lab and doctors must be at least 1")
+
+        # Bulk loading only: if the process dies mid-run the rollback journal
+        # still protects existing data, but an OS crash or power loss can
+        # corrupt the whole database file. Back it up before loading into a
+        # database that matters.
+        conn.execute("PRAGMA synchronous = OFF")
+        started = time.perf_counter()
+        counts, timings = generate(conn, args)
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.close()
+
+    total = sum(counts.values())
+    print(json.dumps({
+        "seed": args.seed,
+        "tag": args.tag,
+        "rows": counts,
+        "seconds": timings,
+        "totalRows": total,
+        "elapsedSeconds": round(elapsed, 2),
+        "rowsPerSecond": round(total / elapsed) if elapsed else None,
+    }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())